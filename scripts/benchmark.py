@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for DocStripper
+Times cleaning hot paths on synthetic pdftotext -layout style documents
+
+Usage:
+    python scripts/benchmark.py                 # run all benchmarks
+    python scripts/benchmark.py tables clean    # run selected benchmarks
+    python scripts/benchmark.py --pages 500 --output bench_output.txt
+    python scripts/benchmark.py memory --memory-budget 4   # peak memory, in-memory vs chunked
+    python scripts/benchmark.py document                   # line filter peak memory, list vs Document
+    python scripts/benchmark.py adversarial                # worst-case inputs vs complexity budgets
+    python scripts/benchmark.py scaling --workers 1,2,4     # thread pool vs process pool throughput
+    python scripts/benchmark.py startup --startup-budget 200 # import time and CLI start-up on a tiny file
+
+Exits with status 1 if an adversarial case grows faster than its budget, or if
+start-up exceeds its budget or loads a module that should be deferred.
+"""
+import argparse
+import math
+import random
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from tool import DocStripper, EditScript, FilterStage, Lexicon, StageContext, TextCleaner
+
+
+ALL_ON: Dict[str, Any] = dict(merge_lines=True, normalize_ws=True, normalize_unicode=True,
+                              dehyphenate=True, remove_headers=True)
+
+WORDS = ("the report covers quarterly revenue growth across regional markets while "
+         "operating costs remained stable and the board approved additional investment "
+         "in infrastructure and staff training programs").split()
+
+
+# Adversarial inputs: name -> (builder taking a size n, allowed growth exponent, cleaning path).
+# Each case is timed at n and 4n lines; time(4n) / time(n) must stay below 4 ** exponent.
+# The path is 'plain' (clean_text), 'edits' (recording an EditScript, as --diff, --offset-map
+# and --chunks do) or 'lexicon' (lexicon-aware dehyphenation).
+ADVERSARIAL_CASES = {
+    'giant_line': (lambda n: " ".join(WORDS[i % len(WORDS)] for i in range(n * 10)), 1.3, 'plain'),
+    'long_paragraph': (lambda n: "\n".join(" ".join(WORDS[(i + k) % len(WORDS)] for k in range(8))
+                                           for i in range(n)), 1.3, 'plain'),
+    'space_lines': (lambda n: "\n".join(" " * 120 for _ in range(n)), 1.3, 'plain'),
+    'dense_table': (lambda n: "\n".join("  ".join(f"{(i * 7 + c) % 9973:>6}" for c in range(12))
+                                        for i in range(n)), 1.3, 'plain'),
+    'punctuation_runs': (lambda n: "\n".join("-=" * 100 for _ in range(n)), 1.3, 'plain'),
+    # A letter run no line-end hyphen follows directly: each of its letters could start the left word
+    'letter_run_joins': (lambda n: "a" * (n * 10) + " x-\nfoo", 1.3, 'edits'),
+    'letter_run_lexicon': (lambda n: "a" * (n * 10) + " x-\nfoo", 1.3, 'lexicon'),
+}
+
+
+def make_layout_document(pages=200, seed=0):
+    """Build text shaped like `pdftotext -layout` output: headers, prose, wide tables, page numbers"""
+    rng = random.Random(seed)
+    out = []
+    for page in range(1, pages + 1):
+        out.append("ACME Corp Annual Report 2024" + " " * 30 + "CONFIDENTIAL")
+        out.append("")
+        for _ in range(rng.randint(2, 4)):
+            for _ in range(rng.randint(3, 8)):
+                # Justified layout text: irregular multi-space gaps between words
+                words = [rng.choice(WORDS) for _ in range(rng.randint(8, 14))]
+                line = "".join(w + " " * rng.choice((1, 1, 1, 2, 3)) for w in words).rstrip()
+                if rng.random() < 0.1:
+                    line += " inter-"
+                out.append("    " + line)
+            out[-1] += "."
+            out.append("")
+        rows = rng.randint(5, 60)
+        # Ragged header row, then aligned numeric columns
+        out.append("  Region        Q1 Revenue     Q2   Revenue      Growth")
+        for row in range(rows):
+            out.append("  {:<12}  {:>10}  {:>10}  {:>10}".format(
+                f"Region {row}", rng.randint(1000, 99999), rng.randint(1000, 99999),
+                f"{rng.uniform(-9, 9):.1f}%"))
+        out.append("")
+        out.append(" " * 40 + f"Page {page} of {pages}")
+        out.append("\f")
+    return "\n".join(out)
+
+
+def legacy_detect_table_block(ds, lines, start_idx):
+    """Reference copy of the original 10-line-window detector (compares every row to the first)"""
+    if start_idx >= len(lines) - 2:
+        return False, start_idx
+    check_lines = lines[start_idx:min(start_idx + 10, len(lines))]
+    consecutive_table_lines = 0
+    space_patterns = []
+    for line in check_lines:
+        if not line.strip():
+            break
+        gaps = [m.start() for m in re.finditer(r' {2,}', line)]
+        if len(gaps) >= ds.TABLE_MIN_SPACE_COLUMNS:
+            space_patterns.append(gaps)
+            consecutive_table_lines += 1
+        else:
+            break
+    if consecutive_table_lines >= ds.MIN_TABLE_CONSECUTIVE_LINES:
+        similar_positions = 0
+        first_pattern = space_patterns[0]
+        for pattern in space_patterns[1:]:
+            matches = 0
+            for pos in first_pattern:
+                for pos2 in pattern:
+                    if abs(pos - pos2) <= ds.TABLE_POSITION_TOLERANCE:
+                        matches += 1
+                        break
+            if matches >= ds.TABLE_MIN_SPACE_COLUMNS:
+                similar_positions += 1
+        if similar_positions >= ds.TABLE_MIN_SPACE_COLUMNS:
+            return True, start_idx + consecutive_table_lines
+    return False, start_idx
+
+
+def legacy_table_sweep(ds, lines):
+    """Flag table lines the way merge_broken_lines used to: re-detect at every line past a block"""
+    flags = bytearray(len(lines))
+    table_block_end = -1
+    for i in range(len(lines)):
+        if i >= table_block_end:
+            is_table, end_idx = legacy_detect_table_block(ds, lines, i)
+            if is_table:
+                table_block_end = end_idx
+        if i < table_block_end:
+            flags[i] = 1
+    return flags
+
+
+def legacy_merge_broken_lines(ds, text):
+    """Reference copy of the original merge loop (re-checks the whole accumulated line each step)"""
+    lines = text.split('\n')
+    merged_lines = []
+    lines_merged = 0
+    in_table = ds.detect_table_lines(lines)
+    for i in range(len(lines)):
+        if in_table[i]:
+            merged_lines.append(lines[i])
+            continue
+        if merged_lines:
+            prev_line = merged_lines[-1]
+            current_line = lines[i]
+            if not prev_line.strip() or not current_line.strip():
+                merged_lines.append(current_line)
+                continue
+            prev_ends_with_punct = bool(re.search(r'[.!?]\s*$', prev_line))
+            next_is_list = (i < len(lines) - 1 and lines[i + 1].strip() and ds.is_list_marker(lines[i + 1]))
+            current_is_list = current_line.strip() and ds.is_list_marker(current_line)
+            prev_is_header = ds.is_header_footer(prev_line.strip()) or ds.is_page_number(prev_line.strip())
+            current_is_header = ds.is_header_footer(current_line.strip()) or ds.is_page_number(current_line.strip())
+            if (not prev_ends_with_punct and not current_is_list and not next_is_list
+                    and not prev_is_header and not current_is_header):
+                merged_lines[-1] = prev_line.rstrip() + ' ' + current_line.lstrip()
+                lines_merged += 1
+                continue
+        merged_lines.append(lines[i])
+    return '\n'.join(merged_lines), lines_merged
+
+
+def legacy_filter_lines(ds, text):
+    """The line filter as it was before Document: a str per line, a reason list, a kept-line copy"""
+    lines = text.split('\n')
+    keep = bytearray(len(lines))
+    reasons: List[Optional[str]] = [None] * len(lines)
+    prev_stripped = None
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped:
+            reasons[i] = 'empty'
+        elif ds.is_punctuation_only(stripped):
+            reasons[i] = 'punctuation'
+        elif ds.is_page_number(stripped):
+            reasons[i] = 'page_number'
+        elif ds.is_header_footer(stripped):
+            reasons[i] = 'header'
+        elif stripped == prev_stripped:
+            reasons[i] = 'duplicate'
+        else:
+            keep[i] = 1
+            prev_stripped = stripped
+    kept = [line for line, flag in zip(lines, keep) if flag]
+    return '\n'.join(kept)
+
+
+def document_filter_lines(ds, text):
+    """The current line filter over a Document: flags in a bytearray, one join of kept runs"""
+    ctx = StageContext(text)
+    FilterStage(remove_headers=True).run(ds, ctx)
+    return ctx.text
+
+
+def timed(func, *args, repeat=3):
+    """Best-of-N wall time and the last result"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def peak_memory(func, *args):
+    """Run func once under tracemalloc; returns (peak bytes above baseline, result)"""
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        result = func(*args)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+    return peak, result
+
+
+def bench_tables(args, report):
+    """Table detection on layout-mode output: legacy windowed detector vs bitmask sweep"""
+    ds = DocStripper(dry_run=True)
+    text = make_layout_document(args.pages)
+    lines = text.split('\n')
+    mb = len(text.encode('utf-8')) / 1e6
+
+    legacy_time, legacy_flags = timed(legacy_table_sweep, ds, lines, repeat=args.repeat)
+    new_time, new_flags = timed(ds.detect_table_lines, lines, repeat=args.repeat)
+    report('tables', 'legacy window', legacy_time, mb, f"{sum(legacy_flags)} table lines")
+    report('tables', 'bitmask sweep', new_time, mb, f"{sum(new_flags)} table lines")
+
+
+
+def bench_merge(args, report):
+    """Line merging on one long unpunctuated paragraph and on layout text: legacy loop vs fragment buffer"""
+    ds = DocStripper(dry_run=True)
+    build = ADVERSARIAL_CASES['long_paragraph'][0]
+    for label, text in (('paragraph', build(args.paragraph_lines)),
+                        ('layout', make_layout_document(args.pages))):
+        mb = len(text.encode('utf-8')) / 1e6
+        legacy_time, legacy = timed(legacy_merge_broken_lines, ds, text, repeat=args.repeat)
+        new_time, merged = timed(ds.merge_broken_lines, text, True, repeat=args.repeat)
+        assert merged == legacy, f"merge output differs from the legacy loop on {label}"
+        report('merge', f"{label} legacy", legacy_time, mb, f"{legacy[1]} lines merged")
+        report('merge', f"{label} fragments", new_time, mb, f"{legacy_time / new_time:.1f}x faster")
+
+
+def bench_clean(args, report):
+    """End-to-end clean_text on layout-mode output with all options on"""
+    ds = DocStripper(dry_run=True)
+    text = make_layout_document(args.pages)
+    mb = len(text.encode('utf-8')) / 1e6
+    elapsed, (cleaned, _) = timed(lambda: ds.clean_text(text, **ALL_ON), repeat=args.repeat)
+    report('clean', 'all options', elapsed, mb, f"{len(cleaned)} chars out")
+    elapsed, _ = timed(lambda: ds.clean_text(text), repeat=args.repeat)
+    report('clean', 'defaults', elapsed, mb)
+
+
+def bench_memory(args, report):
+    """Peak traced memory cleaning one large file, whole vs chunked under --memory-budget"""
+    text = make_layout_document(args.pages)
+    mb = len(text.encode('utf-8')) / 1e6
+    budget = int(args.memory_budget * 1024 * 1024)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "large.txt"
+        path.write_text(text, encoding='utf-8')
+        for variant, memory_budget in (('whole file', None), ('chunked', budget)):
+            ds = DocStripper(dry_run=True, quiet=True, memory_budget=memory_budget)
+            elapsed, _ = timed(ds.process_file, path, repeat=args.repeat)
+            peak, _ = peak_memory(ds.process_file, path)
+            report('memory', variant, elapsed, mb, f"peak {peak / 1e6:.2f} MB")
+
+
+def bench_document(args, report):
+    """Line filtering time and peak memory: list of line strings vs Document offsets and flags"""
+    ds = DocStripper(dry_run=True)
+    text = make_layout_document(args.pages * 5)
+    mb = len(text.encode('utf-8')) / 1e6
+    for variant, func in (('list of lines', legacy_filter_lines), ('document', document_filter_lines)):
+        elapsed, result = timed(func, ds, text, repeat=args.repeat)
+        peak, _ = peak_memory(func, ds, text)
+        assert result == legacy_filter_lines(ds, text), f"{variant} output differs"
+        report('document', variant, elapsed, mb, f"peak {peak / 1e6:.2f} MB ({peak / len(text):.2f} B/char)")
+
+
+def bench_adversarial(args, report):
+    """Worst-case inputs timed at two sizes against a growth budget, plus the per-file CPU cap"""
+    over_budget = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        lexicon = Lexicon.compile(WORDS + ["foo", "xfoo"], Path(tmp) / "words.dslex")
+        cleaners = {'plain': DocStripper(dry_run=True), 'edits': DocStripper(dry_run=True),
+                    'lexicon': DocStripper(dry_run=True, lexicon=lexicon)}
+        for name, (build, exponent, path) in ADVERSARIAL_CASES.items():
+            over_budget += _adversarial_case(args, report, name, build, exponent, cleaners[path],
+                                             path == 'edits')
+    return over_budget
+
+
+def _adversarial_case(args, report, name, build, exponent, ds, record_edits):
+    """Time one adversarial case at both sizes; returns 1 if it grew faster than its budget"""
+    small, large = args.adversarial_lines, 4 * args.adversarial_lines
+
+    def clean(text, **options):
+        return ds.clean_text(text, edits=EditScript() if record_edits else None, **options, **ALL_ON)
+
+    small_time, _ = timed(lambda: clean(build(small)), repeat=args.repeat)
+    text = build(large)
+    mb = len(text.encode('utf-8')) / 1e6
+    large_time, _ = timed(lambda: clean(text), repeat=args.repeat)
+    growth = math.log(max(large_time, 1e-9) / max(small_time, 1e-9), 4)
+    ok = growth <= exponent
+    report('adversary', name, large_time, mb,
+           f"growth n^{growth:.2f} (budget n^{exponent:.2f}) {'ok' if ok else 'OVER BUDGET'}")
+    if large_time > args.cpu_cap:
+        capped_time, (_, stats) = timed(lambda: clean(text, max_cpu_seconds=args.cpu_cap), repeat=args.repeat)
+        report('adversary', f"{name} capped", capped_time, mb,
+               f"cap {args.cpu_cap}s, {stats['cpu_cap_skipped_stages']} stage(s) skipped")
+    return int(not ok)
+
+
+_CLEANER = TextCleaner()  # One per process-pool worker
+
+
+def _clean_document(text):
+    """Process-pool task: clean with a per-process TextCleaner"""
+    return len(_CLEANER.clean(text).text)
+
+
+def bench_scaling(args, report):
+    """Throughput of one shared TextCleaner in a thread pool vs a process pool, by worker count"""
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    cleaner = TextCleaner()
+    docs = [make_layout_document(max(1, args.pages // 20), seed=i) for i in range(args.documents)]
+    mb = sum(len(doc.encode('utf-8')) for doc in docs) / 1e6
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    expected = [len(cleaner.clean(doc).text) for doc in docs]
+    baseline = None
+    for workers in args.workers:
+        for kind, executor in (('threads', ThreadPoolExecutor), ('processes', ProcessPoolExecutor)):
+            with executor(max_workers=workers) as pool:
+                task = (lambda doc: len(cleaner.clean(doc).text)) if kind == 'threads' else _clean_document
+                list(pool.map(task, docs[:workers]))  # warm up workers
+                elapsed, sizes = timed(lambda: list(pool.map(task, docs)), repeat=args.repeat)
+            assert sizes == expected, f"{kind} output differs from a sequential run"
+            if baseline is None:
+                baseline = elapsed
+            report('scaling', f"{kind} x{workers}", elapsed, mb,
+                   f"{baseline / elapsed:.2f}x vs 1 thread{'' if gil else ' (free-threaded)'}")
+
+
+# Modules only some paths need (PDF, DOCX, logging/undo, CLI parsing); importing tool must not load them
+DEFERRED_MODULES = ('argparse', 'json', 'subprocess', 'shutil', 'datetime', 'hashlib',
+                    'zipfile', 'xml.etree.ElementTree', 'asyncio', 'concurrent.futures')
+
+
+def _run_python(argv, stdin=b'', cwd=None, env=None):
+    """Run a fresh interpreter; return (wall seconds, completed process)"""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable] + argv, input=stdin, capture_output=True, cwd=cwd, env=env)
+    return time.perf_counter() - start, proc
+
+
+def bench_startup(args, report):
+    """Cost of `import tool` (-X importtime) and of cleaning a tiny file from a cold interpreter"""
+    _run_python(['-c', 'import tool'], cwd=ROOT)  # refresh tool's cached bytecode
+    import_us = []
+    for _ in range(args.repeat):
+        _, proc = _run_python(['-X', 'importtime', '-c', 'import tool'], cwd=ROOT)
+        # Last line: "import time: <self us> | <cumulative us> | tool"
+        import_us.append(int(proc.stderr.decode().strip().splitlines()[-1].split('|')[1]))
+    probe = f"import sys, tool; print(' '.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    loaded = _run_python(['-c', probe], cwd=ROOT)[1].stdout.decode().split()
+    over_budget = int(bool(loaded))
+    report('startup', 'import tool', min(import_us) / 1e6, 0,
+           f"eagerly loaded: {', '.join(loaded)}" if loaded else 'heavy imports deferred')
+
+    tiny = b"Page 1 of 1\nA short note that ends here.\n"
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    with tempfile.TemporaryDirectory() as tmp:
+        bare = min(_run_python(['-c', 'pass'], cwd=tmp)[0] for _ in range(args.repeat))
+        for variant, argv in (('python tool.py', [str(ROOT / 'tool.py')]), ('python -m tool', ['-m', 'tool'])):
+            elapsed = min(_run_python(argv + ['-', '--stdout', '--quiet'], stdin=tiny, cwd=tmp, env=env)[0]
+                          for _ in range(args.repeat))
+            overhead = (elapsed - bare) * 1000
+            ok = overhead <= args.startup_budget
+            over_budget += int(not ok)
+            report('startup', variant, elapsed, len(tiny) / 1e6,
+                   f"{overhead:.0f} ms over bare interpreter (budget {args.startup_budget:g} ms) "
+                   f"{'ok' if ok else 'OVER BUDGET'}")
+    return over_budget
+
+
+BENCHMARKS = {
+    'tables': bench_tables,
+    'merge': bench_merge,
+    'clean': bench_clean,
+    'memory': bench_memory,
+    'document': bench_document,
+    'adversarial': bench_adversarial,
+    'scaling': bench_scaling,
+    'startup': bench_startup,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DocStripper benchmarks')
+    parser.add_argument('names', nargs='*', metavar='NAME',
+                        help=f"Benchmarks to run (default: all): {', '.join(BENCHMARKS)}")
+    parser.add_argument('--pages', type=int, default=200, help='Pages in synthetic documents')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is kept)')
+    parser.add_argument('--memory-budget', type=float, default=4, metavar='MB',
+                        help='Budget for the chunked variant of the memory benchmark (default: 4)')
+    parser.add_argument('--paragraph-lines', type=int, default=4000, metavar='N',
+                        help='Lines in the unpunctuated paragraph of the merge benchmark (default: 4000)')
+    parser.add_argument('--adversarial-lines', type=int, default=2000, metavar='N',
+                        help='Base size of adversarial inputs; each is also run at 4N (default: 2000)')
+    parser.add_argument('--cpu-cap', type=float, default=0.25, metavar='S',
+                        help='CPU cap for the capped adversarial runs (default: 0.25)')
+    parser.add_argument('--documents', type=int, default=64, metavar='N',
+                        help='Documents cleaned per run in the scaling benchmark (default: 64)')
+    parser.add_argument('--workers', type=lambda v: [int(n) for n in v.split(',')], default=[1, 2, 4],
+                        metavar='N,N', help='Worker counts for the scaling benchmark (default: 1,2,4)')
+    parser.add_argument('--startup-budget', type=float, default=200, metavar='MS',
+                        help='Allowed CLI start-up time over a bare interpreter, tiny file (default: 200)')
+    parser.add_argument('--output', help='Also write results to this file')
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    rows = []
+
+    def report(bench, variant, seconds, mb, note=''):
+        rate = mb / seconds if seconds > 0 else float('inf')
+        row = f"{bench:<10} {variant:<22} {seconds * 1000:10.1f} ms {rate:9.2f} MB/s  {note}"
+        print(row)
+        rows.append(row)
+
+    header = f"{'benchmark':<10} {'variant':<22} {'time':>13} {'rate':>14}"
+    print(header)
+    failures = 0
+    for name in args.names or BENCHMARKS:
+        failures += BENCHMARKS[name](args, report) or 0
+
+    if args.output:
+        Path(args.output).write_text(header + "\n" + "\n".join(rows) + "\n", encoding='utf-8')
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
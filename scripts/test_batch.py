@@ -0,0 +1,850 @@
+#!/usr/bin/env python3
+"""
+Batch-run tests for DocStripper
+Tests the batch runners and run-level features against the sequential process_file path
+"""
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tool import (
+    DocStripper, AsyncPipeline, DirectoryWatcher, ProgressReporter, RunAccumulator, TextCleaner,
+    ThreadPoolRunner, UndoLog, WorkQueue, compression_of, detect_compression, undo_last_operation)
+
+
+SAMPLE = "Page 1\nHello world\nthis is auto-\nmatic.\n\n---\nDone.\n"
+
+
+def make_files(tmpdir, count=5, content=SAMPLE):
+    """Create numbered .txt files with the given content"""
+    paths = []
+    for i in range(count):
+        path = Path(tmpdir) / f"doc{i}.txt"
+        path.write_text(content + f"File {i}.\n", encoding='utf-8')
+        paths.append(path)
+    return paths
+
+
+def test_async_pipeline_matches_sequential():
+    """Test that the asyncio pipeline writes the same output as process_file"""
+    print("Testing async pipeline output...")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        seq_dir = Path(tmpdir) / "seq"
+        async_dir = Path(tmpdir) / "async"
+        seq_dir.mkdir()
+        async_dir.mkdir()
+        seq_paths = make_files(seq_dir)
+        async_paths = make_files(async_dir)
+
+        seq = DocStripper()
+        for path in seq_paths:
+            assert seq.process_file(path)
+
+        stripper = DocStripper()
+        pipeline = AsyncPipeline(stripper, queue_size=2, io_workers=2, cpu_workers=0)
+        assert pipeline.run(async_paths) == len(async_paths)
+
+        for seq_path, async_path in zip(seq_paths, async_paths):
+            assert seq_path.read_text() == async_path.read_text(), f"Output differs for {async_path.name}"
+            assert Path(str(async_path) + '.bak').exists(), "Backup not written"
+
+        assert stripper.stats['files_processed'] == len(async_paths)
+        assert stripper.stats['dehyphenated_tokens'] == seq.stats['dehyphenated_tokens']
+        assert len(stripper.undo_data) == len(async_paths)
+
+        # Writes finish out of input order, so printing them is refused
+        root = Path(__file__).resolve().parents[1]
+        proc = subprocess.run([sys.executable, str(root / 'tool.py'), '--async', '--stdout', str(seq_paths[0])],
+                              capture_output=True, text=True, cwd=tmpdir)
+        assert proc.returncode == 2 and '--stdout' in proc.stderr, proc.stderr
+
+    print("  ✓ Async pipeline output matches sequential run")
+
+
+def test_async_pipeline_process_pool():
+    """Test cleaning in worker processes and the queue-depth readout"""
+    print("Testing async pipeline with process pool...")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = make_files(tmpdir, count=4)
+        missing = Path(tmpdir) / "missing.xyz"
+        missing.write_text("unsupported")
+
+        stripper = DocStripper(dry_run=True)
+        pipeline = AsyncPipeline(stripper, queue_size=1, io_workers=1, cpu_workers=2)
+        assert pipeline.run(paths + [missing]) == len(paths)
+        assert pipeline.failure_count == 1, "Unsupported file should be counted as failure"
+
+        depths = pipeline.queue_stats()
+        assert set(depths) == {'read', 'clean', 'write'}
+        for depth in depths.values():
+            assert depth['max'] <= depth['capacity'], "Queue exceeded its bound"
+
+    print("  ✓ Process pool cleaning working")
+
+
+def test_resume_from_checkpoint():
+    """Test that a resumed run skips completed files and undoes as one unit"""
+    print("Testing checkpoint resume...")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cwd = os.getcwd()
+        os.chdir(tmpdir)
+        try:
+            paths = make_files(tmpdir, count=3)
+            originals = [p.read_text() for p in paths]
+            checkpoint = Path(tmpdir) / ".strip-checkpoint"
+
+            # First run is "killed" after one file: no save_log
+            first = DocStripper()
+            first.log_file = Path(tmpdir) / ".strip-log"
+            first.enable_checkpoint(checkpoint)
+            assert first.process_file(paths[0])
+            assert checkpoint.exists(), "Checkpoint not written incrementally"
+            cleaned_first = paths[0].read_text()
+
+            second = DocStripper()
+            second.log_file = Path(tmpdir) / ".strip-log"
+            assert second.enable_checkpoint(checkpoint, resume=True) == 1
+            for path in paths:
+                assert second.process_file(path)
+            assert second.stats['files_skipped_resume'] == 1
+            assert second.stats['files_processed'] == 2
+            assert paths[0].read_text() == cleaned_first, "Completed file cleaned twice"
+            assert Path(str(paths[0]) + '.bak').read_text() == originals[0], "Backup overwritten"
+            second.save_log()
+            assert not checkpoint.exists(), "Checkpoint not removed after save_log"
+
+            log_entries = list(UndoLog(Path(tmpdir) / ".strip-log"))
+            assert len(log_entries) == 1, "Resumed run should be a single undo entry"
+            assert len(log_entries[0]['operations']) == 3
+
+            assert undo_last_operation()
+            for path, original in zip(paths, originals):
+                assert path.read_text() == original, f"{path.name} not restored"
+        finally:
+            os.chdir(cwd)
+
+    print("  ✓ Checkpoint resume working")
+
+
+def test_changed_file_is_recleaned_on_resume():
+    """Test that a completed file edited after the crash is cleaned again, keeping its backup"""
+    print("Testing resume with a modified file...")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = make_files(tmpdir, count=1)
+        original = paths[0].read_text()
+        checkpoint = Path(tmpdir) / ".strip-checkpoint"
+
+        first = DocStripper()
+        first.enable_checkpoint(checkpoint)
+        assert first.process_file(paths[0])
+        paths[0].write_text("Edited after the crash\n\n\nmore text.\n")
+
+        second = DocStripper()
+        second.enable_checkpoint(checkpoint, resume=True)
+        assert not second.is_completed(paths[0]), "Modified file treated as done"
+        assert second.process_file(paths[0])
+        assert Path(str(paths[0]) + '.bak').read_text() == original, "Backup overwritten"
+        assert len(second.undo_data) == 1
+        assert second.undo_data[0]['size'] == paths[0].stat().st_size
+
+    print("  ✓ Modified files re-cleaned without clobbering backups")
+
+
+def test_progress_reporting_and_quiet():
+    """Test the status line counts and that quiet runs print nothing per file"""
+    print("Testing progress reporting...")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = make_files(tmpdir, count=3)
+        missing = Path(tmpdir) / "missing.txt"
+        total_bytes = sum(p.stat().st_size for p in paths)
+
+        stream = io.StringIO()
+        progress = ProgressReporter(stream=stream, interval=0)
+        progress.start(paths + [missing])
+        assert progress.total_files == 4 and progress.total_bytes == total_bytes
+
+        stripper = DocStripper(dry_run=True, quiet=True)
+        captured = io.StringIO()
+        with contextlib.redirect_stdout(captured):
+            for path in paths:
+                progress.advance(path, stripper.process_file(path))
+            progress.advance(missing, False)
+        assert captured.getvalue() == '', "Quiet run printed per-file output"
+        assert stripper.stats['files_processed'] == 3
+
+        lines = stream.getvalue().splitlines()
+        assert len(lines) == 4, "Non-terminal stream should get one line per redraw"
+        assert lines[-1].startswith("4/4 files") and "errors: 1" in lines[-1]
+        assert progress.done_bytes == total_bytes
+
+        # The async runner reports through the same hook
+        stream = io.StringIO()
+        progress = ProgressReporter(stream=stream, interval=0)
+        progress.start(paths)
+        pipeline = AsyncPipeline(DocStripper(dry_run=True, quiet=True), cpu_workers=0, progress=progress)
+        assert pipeline.run(paths) == 3
+        assert progress.done_files == 3 and progress.errors == 0
+
+    print("  ✓ Progress reporting working")
+
+
+def test_memory_budget_streams_large_file():
+    """Test that a file over the memory budget is cleaned in chunks with the same result"""
+    print("Testing memory budget fallback...")
+
+    paragraph = "This line was broken by the\nextractor and needs auto-\nmatic repair.\n\n"
+    content = "".join(f"Section {i}\n{paragraph}" for i in range(4000))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        whole_path = Path(tmpdir) / "whole.txt"
+        chunked_path = Path(tmpdir) / "chunked.txt"
+        whole_path.write_text(content, encoding='utf-8')
+        chunked_path.write_text(content, encoding='utf-8')
+
+        budget = 1024 * 1024
+        whole = DocStripper(quiet=True, profile=True)
+        chunked = DocStripper(quiet=True, memory_budget=budget, profile=True)
+        assert chunked.needs_streaming(chunked_path)
+        assert not whole.needs_streaming(chunked_path), "No budget should mean no streaming"
+        with contextlib.redirect_stderr(io.StringIO()):
+            assert whole.process_file(whole_path)
+            assert chunked.process_file(chunked_path)
+
+        assert chunked_path.read_text() == whole_path.read_text(), "Chunked output differs"
+        assert Path(str(chunked_path) + '.bak').read_text() == content, "Backup not written"
+        assert not Path(str(chunked_path) + '.tmp').exists(), "Temporary file left behind"
+        assert chunked.stats['files_streamed'] == 1
+        assert chunked.stats['dehyphenated_tokens'] == whole.stats['dehyphenated_tokens']
+        assert chunked.undo_data[0]['size'] == chunked_path.stat().st_size
+
+        record = chunked.profile_records[0]
+        assert record['streamed'] and 0 < record['peak_bytes'] < budget
+        assert whole.profile_records[0]['peak_bytes'] > budget, "Whole-file path should exceed the budget"
+
+    print("  ✓ Memory budget fallback working")
+
+
+def test_streaming_without_blank_lines_matches_whole_file():
+    """Test that chunks of a document with no blank lines are not cut mid-paragraph"""
+    print("Testing chunked cleaning without blank lines...")
+
+    paragraph = ("The committee reviewed the quarterly\nfigures and found the auto-\nmatic "
+                 "adjustments were applied\nconsistently across every region.\n")
+    content = "".join(f"Item {i} opens a paragraph that\ncontinues here. " + paragraph for i in range(3000))
+    assert '\n\n' not in content
+    stripper = DocStripper(quiet=True, memory_budget=1024 * 1024, remove_headers=False)
+    expected = stripper.clean(content).text
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "long.txt"
+        path.write_text(content, encoding='utf-8')
+        assert stripper.needs_streaming(path)
+        chunks = list(stripper.iter_chunks(io.StringIO(content), stripper.MIN_STREAM_CHUNK))
+        assert len(chunks) > 1 and '\n'.join(chunks) == content
+        assert stripper.process_file(path)
+        assert stripper.stats['files_streamed'] == 1
+        assert path.read_text(encoding='utf-8') == expected, "Streamed output differs from the whole-file path"
+
+    print("  ✓ Streamed output matches without blank lines")
+
+
+def test_verified_partial_undo():
+    """Test undo preview, glob-limited undo, edited-file protection and old-format logs"""
+    print("Testing verified undo...")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_file = Path(tmpdir) / ".strip-log"
+        paths = make_files(tmpdir, count=4)
+        originals = [p.read_text() for p in paths]
+        stripper = DocStripper(quiet=True)
+        stripper.log_file = log_file
+        for path in paths:
+            assert stripper.process_file(path)
+        stripper.save_log()
+        cleaned = [p.read_text() for p in paths]
+        paths[3].write_text("Edited by hand after cleaning.\n")
+
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            assert undo_last_operation(dry_run=True, log_file=log_file)
+        assert [p.read_text() for p in paths[:3]] == cleaned[:3], "Dry run restored files"
+
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            assert undo_last_operation(patterns=[str(paths[0])], log_file=log_file)
+        assert paths[0].read_text() == originals[0]
+        assert paths[1].read_text() == cleaned[1], "Unmatched file restored"
+        assert len(list(UndoLog(log_file))[-1]['operations']) == 3
+
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            assert undo_last_operation(workers=2, log_file=log_file)
+        assert [p.read_text() for p in paths[1:3]] == originals[1:3]
+        assert paths[3].read_text() == "Edited by hand after cleaning.\n", "Edited file clobbered"
+        remaining = list(UndoLog(log_file))[-1]['operations']
+        assert [op['file'] for op in remaining] == [str(paths[3])]
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert undo_last_operation(force=True, log_file=log_file)
+        assert paths[3].read_text() == originals[3]
+        assert list(UndoLog(log_file)) == []
+
+        # A file whose backup is missing stays in the log and can be retried
+        stripper = DocStripper(quiet=True)
+        stripper.log_file = log_file
+        for path in paths[:2]:
+            assert stripper.process_file(path)
+        stripper.save_log()
+        backup = Path(str(paths[1]) + '.bak')
+        saved = backup.read_bytes()
+        backup.unlink()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            assert undo_last_operation(log_file=log_file)
+        assert paths[0].read_text() == originals[0]
+        remaining = list(UndoLog(log_file))[-1]['operations']
+        assert [op['file'] for op in remaining] == [str(paths[1])]
+        backup.write_bytes(saved)
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert undo_last_operation(log_file=log_file)
+        assert paths[1].read_text() == originals[1]
+        assert list(UndoLog(log_file)) == []
+
+        # A journal written as one JSON array is still undoable
+        paths[0].write_text("cleaned\n")
+        Path(str(paths[0]) + '.bak').write_text("original\n")
+        log_file.write_text(json.dumps([{'timestamp': 't', 'operations': [
+            {'file': str(paths[0]), 'backup': str(paths[0]) + '.bak'}], 'stats': {}}], indent=2))
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert undo_last_operation(log_file=log_file)
+        assert paths[0].read_text() == "original\n"
+        assert log_file.read_text() == ''
+
+    print("  ✓ Verified undo working")
+
+
+def test_thread_pool_shares_one_cleaner():
+    """Test that threads sharing a cleaner and a stripper match a sequential run"""
+    print("Testing thread-pool batch mode...")
+
+    from concurrent.futures import ThreadPoolExecutor
+    cleaner = TextCleaner()
+    texts = [SAMPLE * (i + 1) + f"File {i}.\n" for i in range(16)]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(cleaner.clean, texts))
+    for text, result in zip(texts, results):
+        cleaned, stats = cleaner.clean_text(text, **cleaner.cleaning_options())
+        assert result.text == cleaned and result.stats == stats and result.changed
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        seq_dir = Path(tmpdir) / "seq"
+        thread_dir = Path(tmpdir) / "threads"
+        seq_dir.mkdir()
+        thread_dir.mkdir()
+        seq = DocStripper(quiet=True)
+        for path in make_files(seq_dir, count=12):
+            assert seq.process_file(path)
+
+        stripper = DocStripper(quiet=True)
+        paths = make_files(thread_dir, count=12)
+        runner = ThreadPoolRunner(stripper, workers=4)
+        assert runner.run(paths + [thread_dir / "missing.txt"]) == 12
+        assert runner.failure_count == 1
+        for path in paths:
+            assert path.read_text() == (seq_dir / path.name).read_text()
+        assert stripper.stats == seq.stats
+        assert sorted(op['file'] for op in stripper.undo_data) == sorted(map(str, paths))
+
+    # Totals from another run (e.g. a worker process) fold in under the lock
+    total = RunAccumulator()
+    total.add({'lines_removed': 2, 'cpu_cap_exceeded': 1})
+    total.merge(seq.stats, seq.undo_data)
+    assert total.stats['files_processed'] == 13 and total.stats['files_cpu_capped'] == 1
+    assert total.stats['lines_removed'] == seq.stats['lines_removed'] + 2
+    assert len(total.undo_data) == 12
+
+    print("  ✓ Thread-pool batch mode working")
+
+
+def test_compressed_files_round_trip():
+    """Test that gzip/bz2/xz inputs are cleaned in their own format, converted with compress, and undone"""
+    print("Testing compressed input and output...")
+
+    import bz2
+    import gzip
+    import lzma
+    text = "".join(f"Page {i}\nHello world {i}\nthis is auto-\nmatic {i}.\n\n" for i in range(40))
+    expected = TextCleaner().clean(text).text
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp = Path(tmpdir)
+        inputs = {tmp / "a.txt.gz": gzip, tmp / "b.txt.bz2": bz2, tmp / "c.txt.xz": lzma,
+                  tmp / "d.txt": gzip}  # Detected by magic bytes, not by name
+        for path, module in inputs.items():
+            path.write_bytes(module.compress(text.encode('utf-8')))
+        plain = tmp / "e.txt"
+        plain.write_text(text, encoding='utf-8')
+
+        stripper = DocStripper(quiet=True)
+        stripper.log_file = tmp / ".strip-log"
+        for path, module in inputs.items():
+            assert stripper.process_file(path)
+            assert module.decompress(path.read_bytes()).decode('utf-8') == expected, path.name
+        converter = DocStripper(quiet=True, compress='xz', compress_level=1)
+        converter.log_file = stripper.log_file
+        assert converter.process_file(plain)
+        assert not plain.exists()
+        assert lzma.decompress((tmp / "e.txt.xz").read_bytes()).decode('utf-8') == expected
+
+        # Chunked cleaning streams through the decompressor and compressor
+        streamed = tmp / "f.txt.gz"
+        streamed.write_bytes(gzip.compress(text.encode('utf-8')))
+        chunker = DocStripper(quiet=True, memory_budget=1)
+        chunker.log_file = stripper.log_file
+        assert chunker.process_file(streamed)
+        assert chunker.stats['files_streamed'] == 1
+        assert gzip.decompress(streamed.read_bytes()).decode('utf-8').count('automatic') == 40
+
+        stripper.save_log()
+        converter.save_log()
+        assert undo_last_operation(log_file=stripper.log_file)  # Undo the conversion
+        assert plain.read_text(encoding='utf-8') == text and not (tmp / "e.txt.xz").exists()
+        assert undo_last_operation(log_file=stripper.log_file)  # Hashes match the decompressed text
+        for path, module in inputs.items():
+            assert module.decompress(path.read_bytes()).decode('utf-8') == text, path.name
+
+    print("  ✓ Compressed files cleaned, converted and restored")
+
+
+def test_text_starting_with_bz2_magic_is_plain():
+    """Test that text opening with "BZh" is not taken for bzip2, and undecodable look-alikes read as text"""
+    print("Testing text that starts like a bz2 stream...")
+
+    import bz2
+    assert compression_of(bz2.compress(b'')) == 'bz2' and compression_of(bz2.compress(b'text')) == 'bz2'
+    text = "BZh is how a bzip2 stream starts.\nSome text wraps here,\nand ends here.\n"
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp = Path(tmpdir)
+        path = tmp / "bzh.txt"
+        path.write_text(text, encoding='utf-8')
+        assert detect_compression(path) is None
+        stripper = DocStripper(quiet=True)
+        stripper.log_file = tmp / ".strip-log"
+        assert stripper.process_file(path)
+        assert path.read_text(encoding='utf-8') == TextCleaner().clean(text).text
+
+        # A full bz2 signature followed by text: decompression fails, so it is read as is
+        lookalike = tmp / "lookalike.txt"
+        lookalike.write_text("BZh91AY&SY is a bzip2 block signature.\n", encoding='utf-8')
+        assert detect_compression(lookalike) == 'bz2'
+        assert stripper.read_text_file(lookalike) == "BZh91AY&SY is a bzip2 block signature.\n"
+
+    print("  ✓ Text starting with BZh read as plain text")
+
+
+def test_work_queue_across_processes():
+    """Test that several worker processes share a queue directory, each file cleaned exactly once"""
+    print("Testing shared-directory work queue...")
+
+    root = Path(__file__).resolve().parents[1]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp = Path(tmpdir)
+        paths = make_files(tmp, count=24)
+        originals = {path: path.read_text() for path in paths}
+        queue = WorkQueue(tmp / "queue", lease_seconds=1, worker_id="deadhost.1")
+        assert queue.add(paths) == 24
+        assert queue.add(paths[:3]) == 0  # Already queued
+
+        # A worker that claimed a file and died: its lease is never renewed
+        claimed = queue.claim()
+        assert claimed is not None
+        lease, dead_file = claimed
+        os.utime(lease, (0, 0))
+
+        workers = [subprocess.Popen([sys.executable, str(root / 'tool.py'), '--queue', str(tmp / "queue"),
+                                     '--lease', '1', '--quiet'],
+                                    cwd=tmpdir, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                   for _ in range(3)]
+        outputs = [worker.communicate(timeout=120) for worker in workers]
+        assert all(worker.returncode == 0 for worker in workers), outputs
+
+        cleaner = TextCleaner()
+        for path, original in originals.items():
+            assert path.read_text() == cleaner.clean(original).text, f"{path.name} not cleaned"
+            # A second pass would have backed up already-cleaned text
+            assert Path(str(path) + '.bak').read_text() == original, f"{path.name} cleaned twice"
+        assert not any(queue.pending.iterdir()) and not any(queue.leased.iterdir())
+        results = [json.loads(p.read_text()) for p in queue.done.iterdir()]
+        assert len(results) == 24 and all(r['ok'] for r in results)
+        assert any(r['file'] == str(dead_file) for r in results)
+
+        buf = io.StringIO()
+        with contextlib.redirect_stdout(buf):
+            queue.print_report()
+        report = buf.getvalue()
+        assert "Files processed: 24" in report and "Files failed: 0" in report
+        assert len(list(queue.workers.glob('*.json'))) == 3
+
+    print("  ✓ Work queue shared across processes")
+
+
+def test_work_queue_lost_lease_skips_write():
+    """Test that a worker whose lease was reclaimed mid-clean leaves the file to its new holder"""
+    print("Testing writes after a lost lease...")
+
+    class StallingStripper(DocStripper):
+        """Outlives its lease on the first file it reads: another worker reclaims it"""
+        stalled = False
+
+        def read_document(self, file_path):
+            if not self.stalled:
+                self.stalled = True
+                for lease in other.leased.iterdir():
+                    os.utime(lease, (0, 0))
+                assert other.reclaim_expired() == 1
+            return super().read_document(file_path)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp = Path(tmpdir)
+        path, = make_files(tmp, count=1)
+        original = path.read_text()
+        queue = WorkQueue(tmp / "queue", lease_seconds=60, worker_id="slow.1")
+        other = WorkQueue(tmp / "queue", lease_seconds=60, worker_id="other.1")
+        assert queue.add([path]) == 1 and queue.add([path]) == 0
+
+        stripper = StallingStripper(quiet=True)
+        stripper.log_file = tmp / ".strip-log"
+        with contextlib.redirect_stderr(io.StringIO()):
+            assert queue.run(stripper) == 1  # Skipped once, then reclaimed and cleaned by itself
+        assert queue.failure_count == 1 and len(stripper.undo_data) == 1
+        assert path.read_text() == TextCleaner().clean(original).text
+        assert Path(str(path) + '.bak').read_text() == original
+        assert stripper.write_guard is None
+
+        # confirm renames the lease, so a reclaimed one cannot be confirmed
+        assert queue.add([tmp / "late.txt"]) == 1
+        claimed = queue.claim()
+        assert claimed is not None
+        lease, _ = claimed
+        renewed = queue.confirm(lease)
+        assert renewed is not None and not lease.exists()
+        os.utime(renewed, (0, 0))
+        assert other.reclaim_expired() == 1 and queue.confirm(renewed) is None
+
+    print("  ✓ Lost leases skip the write")
+
+
+def test_lean_startup_and_stdin():
+    """Test that importing tool defers heavy modules and that '-' reads stdin"""
+    print("Testing start-up imports and stdin...")
+
+    root = Path(__file__).resolve().parents[1]
+    deferred = ('argparse', 'json', 'subprocess', 'shutil', 'zipfile', 'xml.etree.ElementTree')
+    probe = f"import sys, tool; print(' '.join(m for m in {deferred!r} if m in sys.modules))"
+    loaded = subprocess.run([sys.executable, '-c', probe], cwd=root,
+                            capture_output=True, text=True, check=True).stdout.split()
+    assert loaded == [], f"import tool loaded {loaded}"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        proc = subprocess.run([sys.executable, str(root / 'tool.py'), '-', '--stdout', '--quiet'],
+                              input=SAMPLE, capture_output=True, text=True, cwd=tmpdir)
+        assert proc.returncode == 0, proc.stderr
+        assert DocStripper().clean(SAMPLE).text in proc.stdout
+        assert not (Path(tmpdir) / '.strip-log').exists()
+
+    print("  ✓ Start-up imports deferred, stdin read")
+
+
+def test_docx_header_parts_and_paragraphs():
+    """Test that DOCX header/footer parts are removed exactly and w:p paragraphs kept"""
+    print("Testing DOCX header parts and paragraphs...")
+
+    import zipfile
+    ns = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+    def paragraph(*runs):
+        return '<w:p>' + ''.join(f'<w:r><w:t xml:space="preserve">{run}</w:t></w:r>' for run in runs) + '</w:p>'
+
+    body = ''.join([
+        paragraph('Introduction'),
+        paragraph('The first ', 'paragraph is split ', 'across runs.'),
+        paragraph('Confidential - ', 'internal use'),
+        '<w:tbl><w:tr><w:tc>' + paragraph('Table cell') + '</w:tc></w:tr></w:tbl>',
+        paragraph('Closing remarks'),
+    ])
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / 'report.docx'
+        with zipfile.ZipFile(path, 'w') as docx:
+            docx.writestr('word/document.xml', f'<w:document {ns}><w:body>{body}</w:body></w:document>')
+            docx.writestr('word/header1.xml', f'<w:hdr {ns}>{paragraph("ACME Corp")}</w:hdr>')
+            docx.writestr('word/footer1.xml', f'<w:ftr {ns}>{paragraph("Confidential - internal use")}</w:ftr>')
+
+        stripper = DocStripper(dry_run=True)
+        text, headers = stripper.read_document(path)
+        assert text == ("Introduction\n\nThe first paragraph is split across runs.\n\n"
+                        "Confidential - internal use\n\nTable cell\n\nClosing remarks"), text
+        assert headers == {'ACME Corp', 'Confidential - internal use'}, headers
+        assert stripper.extract_text_from_docx(path) == text
+
+        result = stripper.clean(text, headers=headers)
+        # Paragraphs are not merged across their blank lines; only the footer text goes
+        assert result.text == ("Introduction\nThe first paragraph is split across runs.\n"
+                               "Table cell\nClosing remarks"), result.text
+        assert result.stats['repeating_headers_footers_removed'] == 1
+        assert result.stats['merged_lines'] == 0
+
+    print("  ✓ DOCX headers removed exactly, paragraphs kept")
+
+
+def test_incremental_append_only():
+    """Test that cleaning appended text run by run matches cleaning the whole file"""
+    print("Testing incremental cleaning of a growing file...")
+
+    pages = []
+    for page in range(1, 7):
+        pages.append(f"Hearing Transcript - Committee Session\n\n"
+                     f"Speaker {page} opened the discussion of item {page} and the broken\n"
+                     f"line continues here with a hyphen-\nated word.\n\n"
+                     f"Item {page} was noted.\nItem {page} was noted.\n\nPage {page}\n")
+    data = "\f".join(pages).encode('utf-8')
+    expected = DocStripper(dry_run=True).clean(data.decode('utf-8')).text
+    assert 'Hearing Transcript' not in expected  # Removed as a repeating header
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source = Path(tmpdir) / 'hearing.txt'
+        output, state = DocStripper.incremental_paths(source)
+        source.write_bytes(b'')
+        # Appends cut mid-line, each cleaned by a fresh process-like stripper
+        for start in range(0, len(data), 97):
+            with open(source, 'ab') as f:
+                f.write(data[start:start + 97])
+            assert DocStripper(quiet=True, incremental=True).process_file(source)
+        assert output.read_text(encoding='utf-8') != expected  # The last line is still held back
+        written = output.read_bytes()
+
+        # Output written after the state was saved (an interrupted run) is redone
+        with open(output, 'ab') as f:
+            f.write(b'\npartial')
+        assert DocStripper(quiet=True, incremental=True, incremental_final=True).process_file(source)
+        assert output.read_text(encoding='utf-8') == expected
+        assert output.read_bytes().startswith(written)
+        assert source.read_bytes() == data  # The source is never modified
+
+        # A replaced source starts the output over
+        source.write_text("Fresh start.\n", encoding='utf-8')
+        assert DocStripper(quiet=True, incremental=True, incremental_final=True).process_file(source)
+        assert output.read_text(encoding='utf-8') == "Fresh start."
+        assert state.exists() and not (Path(tmpdir) / '.strip-log').exists()
+
+    print("  ✓ Incremental output matches a full clean across restarts")
+
+
+def test_incremental_single_pass_matches_clean_text():
+    """Test that one final incremental run over a form-feed document matches clean_text"""
+    print("Testing a single incremental pass over a paged document...")
+
+    options: Dict[str, Any] = dict(merge_lines=True, normalize_ws=True, dehyphenate=True)
+    pages = []
+    for page in range(1, 6):
+        # Whitespace normalization turns these form feeds into spaces before page detection
+        pages.append(f"Revenue for region {page} rose\nagainst the prior quarter.\n"
+                     f"Northwind Traders quarterly report.\n")
+    text = "\f".join(pages)
+    expected, _ = TextCleaner().clean_text(text, **options)
+    assert expected.count("Northwind Traders") == 5  # One page once the form feeds are spaces
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source = Path(tmpdir) / 'report.txt'
+        source.write_text(text, encoding='utf-8')
+        stripper = DocStripper(quiet=True, incremental=True, incremental_final=True, **options)
+        assert stripper.process_file(source)
+        output = DocStripper.incremental_paths(source)[0]
+        assert output.read_text(encoding='utf-8') == expected
+
+    print("  ✓ Single incremental pass matches clean_text")
+
+
+def test_watch_debounce_and_own_writes():
+    """Test that --watch waits for files to settle and ignores its own writes"""
+    print("Testing watch mode...")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir) / 'drop'
+        (root / 'nested').mkdir(parents=True)
+        log_file = Path(tmpdir) / '.strip-log'
+
+        def make_stripper():
+            stripper = DocStripper(quiet=True)
+            stripper.log_file = log_file
+            return stripper
+
+        watcher = DirectoryWatcher(root, make_stripper(), settle=1.0)
+        doc = root / 'nested' / 'report.txt'
+        doc.write_text("Report  body\n\n\nPage 1\n", encoding='utf-8')
+        (root / 'notes.csv').write_text("a,b\n", encoding='utf-8')
+        assert watcher.poll(now=0.0) == []
+        with open(doc, 'a', encoding='utf-8') as f:
+            f.write("Still being copied.\n")  # Changed again: the settle timer restarts
+        assert watcher.poll(now=0.8) == []
+        assert watcher.poll(now=1.5) == []
+        ready = watcher.poll(now=2.0)
+        assert ready == [doc.resolve()], ready
+        assert watcher.process(ready) == 1
+        assert doc.read_text(encoding='utf-8') == "Report body\nStill being copied."
+        assert (root / 'nested' / 'report.txt.bak').exists()
+        assert watcher.poll(now=10.0) == [] and not watcher.pending  # Its own write is not a change
+        assert len(list(UndoLog(log_file))) == 1
+
+        # A restarted watcher only picks up what changed while it was down
+        restarted = DirectoryWatcher(root, make_stripper(), settle=0.0)
+        assert restarted.poll(now=0.0) == [] and not restarted.pending
+        other = root / 'other.txt'
+        other.write_text("One\n\nTwo.\n", encoding='utf-8')
+        restarted.poll(now=0.0)
+        assert restarted.poll(now=0.1) == [other.resolve()]
+        assert restarted.metrics_snapshot()['watched_files'] == 1  # other.txt is indexed once processed
+
+    print("  ✓ Changed files cleaned once settled, own writes ignored")
+
+
+def test_already_clean_files_are_not_rewritten():
+    """Test that files cleaning would not change get no backup and no rewrite"""
+    print("Testing the already-clean pre-scan...")
+
+    cleaner = TextCleaner()
+    assert not cleaner.needs_cleaning("Hello world.\nSecond line here.")
+    for dirty in ("Hello world.\n", "a\n\nb.", "Page 2\nText.", "one  two.", "auto-\nmatic.",
+                  "\u201cQuoted.\u201d", "broken\nline.", "Same.\nSame."):
+        assert cleaner.needs_cleaning(dirty), dirty
+    assert not TextCleaner(merge_lines=False).needs_cleaning("broken\nline.")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        clean = Path(tmpdir) / 'clean.txt'
+        clean.write_text("Hello world.\nSecond line here.", encoding='utf-8')
+        # Table gutters fail the pre-scan, but cleaning leaves them as they are
+        table = Path(tmpdir) / 'table.txt'
+        table.write_text("Name    Qty    Price\nPen     2      1.50\nInk     10     4.00", encoding='utf-8')
+        crlf = Path(tmpdir) / 'crlf.txt'
+        crlf.write_bytes(b"Hello world.\r\nSecond line here.")
+        dirty = make_files(tmpdir, count=1)[0]
+        mtimes = {path: path.stat().st_mtime_ns for path in (clean, table)}
+
+        stripper = DocStripper(quiet=True)
+        stripper.log_file = Path(tmpdir) / '.strip-log'
+        for path in (clean, table, crlf, dirty):
+            assert stripper.process_file(path)
+        assert stripper.stats['files_skipped_clean'] == 2
+        assert stripper.stats['files_processed'] == 4
+        for path, mtime in mtimes.items():
+            assert path.stat().st_mtime_ns == mtime
+            assert not path.with_suffix('.txt.bak').exists()
+        # Only the line endings differ, but the rewrite still normalizes them
+        assert crlf.read_bytes() == b"Hello world.\nSecond line here."
+        assert dirty.with_suffix('.txt.bak').exists()
+
+        # A second run finds every file clean, through the async pipeline too
+        again = DocStripper(quiet=True)
+        AsyncPipeline(again).run([clean, table, crlf, dirty])
+        assert again.stats['files_skipped_clean'] == 4
+        assert not again.undo_data
+
+    print("  ✓ Already-clean files are left untouched")
+
+
+def test_async_pipeline_skips_already_clean_files():
+    """Test that --async runs the pre-scan before its clean and write stages"""
+    print("Testing the already-clean pre-scan in the async pipeline...")
+
+    class CountingStripper(DocStripper):
+        cleaned = 0
+
+        def clean_text(self, *args, **kwargs):
+            self.cleaned += 1
+            return super().clean_text(*args, **kwargs)
+
+    root = Path(__file__).resolve().parents[1]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        clean = Path(tmpdir) / 'clean.txt'
+        clean.write_text("Hello world.\nSecond line here.", encoding='utf-8')
+        dirty = make_files(tmpdir, count=1)[0]
+        mtime = clean.stat().st_mtime_ns
+
+        stripper = CountingStripper(quiet=True)
+        stripper.log_file = Path(tmpdir) / '.strip-log'
+        assert AsyncPipeline(stripper, cpu_workers=0).run([clean, dirty]) == 2
+        assert stripper.cleaned == 1  # Only the dirty file reached the clean stage
+        assert stripper.stats['files_skipped_clean'] == 1 and stripper.stats['files_processed'] == 2
+        assert len(stripper.undo_data) == 1
+
+        proc = subprocess.run([sys.executable, str(root / 'tool.py'), '--async', str(clean)],
+                              capture_output=True, text=True, cwd=tmpdir)
+        assert proc.returncode == 0, proc.stderr
+        assert "Already clean, left as is" in proc.stdout
+        assert clean.stat().st_mtime_ns == mtime and not clean.with_suffix('.txt.bak').exists()
+        assert clean.read_text(encoding='utf-8') == "Hello world.\nSecond line here."
+
+    print("  ✓ Async pipeline leaves already-clean files untouched")
+
+
+def run_all_batch_tests():
+    """Run all batch tests"""
+    print("=" * 60)
+    print("DocStripper Batch Test Suite")
+    print("=" * 60)
+
+    tests = [
+        test_async_pipeline_matches_sequential,
+        test_async_pipeline_process_pool,
+        test_resume_from_checkpoint,
+        test_changed_file_is_recleaned_on_resume,
+        test_progress_reporting_and_quiet,
+        test_memory_budget_streams_large_file,
+        test_streaming_without_blank_lines_matches_whole_file,
+        test_verified_partial_undo,
+        test_thread_pool_shares_one_cleaner,
+        test_compressed_files_round_trip,
+        test_text_starting_with_bz2_magic_is_plain,
+        test_work_queue_across_processes,
+        test_work_queue_lost_lease_skips_write,
+        test_lean_startup_and_stdin,
+        test_docx_header_parts_and_paragraphs,
+        test_incremental_append_only,
+        test_incremental_single_pass_matches_clean_text,
+        test_watch_debounce_and_own_writes,
+        test_already_clean_files_are_not_rewritten,
+        test_async_pipeline_skips_already_clean_files,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test_func in tests:
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"  ✗ Test failed: {e}")
+            failed += 1
+        except Exception as e:
+            print(f"  ✗ Unexpected error: {e}")
+            import traceback
+            traceback.print_exc()
+            failed += 1
+
+    print("\n" + "=" * 60)
+    if failed == 0:
+        print(f"✅ All {passed} batch tests passed!")
+        return 0
+    else:
+        print(f"❌ {failed} test(s) failed, {passed} passed")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_batch_tests())
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+Cleaning-engine tests for DocStripper
+Tests optional clean_text outputs and alternative cleaning paths
+"""
+import contextlib
+import io
+import json
+import pickle
+import re
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tool import (DocStripper, Document, EditScript, OffsetMap, CleaningOptions, Lexicon,
+                  LineStage, TextStage)
+
+
+ALL_ON: Dict[str, Any] = dict(merge_lines=True, normalize_ws=True, normalize_unicode=True,
+                              dehyphenate=True, remove_headers=True)
+
+SAMPLE = ("Page 1\nCONFIDENTIAL\nHello world\nthis is auto-\nmatic.\n"
+          "keep me.\nkeep me.\n\n\n---\nDone  now.\n12\nend\n")
+
+
+def apply_unified(original, diff):
+    """Apply a unified diff produced by EditScript.render to the original text"""
+    lines = original.split('\n')
+    result = []
+    pos = 0
+    for line in diff.split('\n')[2:]:
+        match = re.match(r'^@@ -(\d+),(\d+) \+\d+,\d+ @@$', line)
+        if match:
+            start = int(match.group(1)) - (1 if int(match.group(2)) else 0)
+            result.extend(lines[pos:start])
+            pos = start
+        elif not line:
+            continue
+        elif line[0] == ' ':
+            result.append(lines[pos])
+            pos += 1
+        elif line[0] == '-':
+            pos += 1
+        elif line[0] == '+':
+            result.append(line[1:])
+    result.extend(lines[pos:])
+    return '\n'.join(result)
+
+
+def test_edit_script_reasons():
+    """Test that drops, merges and dehyphenation are recorded with reasons"""
+    print("Testing edit script provenance...")
+
+    ds = DocStripper(dry_run=True)
+    edits = EditScript()
+    cleaned, _ = ds.clean_text(SAMPLE, edits=edits, **ALL_ON)
+
+    drops = {(start, end): reason for op, start, end, reason in edits.ops if op == 'drop'}
+    assert drops[(0, 2)] == 'header', "Consecutive header drops should coalesce into one op"
+    assert drops[(6, 7)] == 'duplicate'
+    assert drops[(7, 9)] == 'empty'
+    assert drops[(11, 12)] == 'page_number'
+    kinds = {(op, start, end) for op, start, end, _ in edits.ops if op != 'drop'}
+    assert ('dehyphenate', 3, 5) in kinds
+    assert ('merge', 2, 5) in kinds
+    assert len(edits.line_origins) == len(cleaned.split('\n'))
+    assert edits.line_origins[0] == (2, 5)
+
+    annotated = edits.render(SAMPLE, cleaned, mode='annotated')
+    assert '[page_number]' in annotated
+    assert '=> Hello world this is automatic.' in annotated
+
+    print("  ✓ Edit script provenance working")
+
+
+def test_unified_diff_round_trip():
+    """Test that the rendered unified diff turns the original into the cleaned text"""
+    print("Testing unified diff rendering...")
+
+    ds = DocStripper(dry_run=True)
+    body = "\n".join(f"Sentence number {i}." for i in range(30))
+    samples = [
+        SAMPLE,
+        "Page 1\n" + body + "\nPage 2\n" + body.replace("Sentence", "Line"),
+        "Already clean.",
+    ]
+    for sample in samples:
+        edits = EditScript()
+        cleaned, _ = ds.clean_text(sample, edits=edits, **ALL_ON)
+        diff = edits.render(sample, cleaned)
+        if cleaned == sample:
+            assert diff == '', "Unchanged text should render an empty diff"
+        else:
+            assert diff.startswith('--- original\n+++ cleaned\n@@ ')
+            assert apply_unified(sample, diff) == cleaned, "Diff does not reproduce cleaned text"
+
+    print("  ✓ Unified diff rendering working")
+
+
+def test_offset_map_lookup():
+    """Test that cleaned offsets map back to the right original characters"""
+    print("Testing offset map...")
+
+    ds = DocStripper(dry_run=True)
+    original = "Page 1\nThe  quick \u201cfox\u201d\nwaits\u2026 then jumps.\n\nEnd of auto-\nmatic text.\n"
+    edits = EditScript()
+    cleaned, _ = ds.clean_text(original, edits=edits, **ALL_ON)
+    assert cleaned == 'The quick "fox" waits... then jumps.\nEnd of automatic text.'
+    offset_map = OffsetMap.from_edits(original, cleaned, edits)
+
+    assert len(offset_map) < len(cleaned), "Map should be run-length, not per character"
+    for word in ('quick', 'fox', 'then jumps', 'End', 'matic text'):
+        start = cleaned.index(word)
+        orig_start, orig_end = offset_map.span(start, start + len(word))
+        assert original[orig_start:orig_end] == word, f"{word!r} mapped to {original[orig_start:orig_end]!r}"
+
+    # All three dots of the expanded ellipsis point at the original character
+    dots = cleaned.index('...')
+    assert {offset_map.lookup(dots + k) for k in range(3)} == {original.index('\u2026')}
+    # Merge inserted a space where the original had a line break
+    assert original[offset_map.lookup(cleaned.index(' waits'))] == '\n'
+    assert offset_map.lookup(len(cleaned)) == len(original)
+
+    restored = OffsetMap.from_dict(json.loads(json.dumps(offset_map.to_dict())))
+    assert all(restored.lookup(k) == offset_map.lookup(k) for k in range(len(cleaned) + 1))
+
+    print("  ✓ Offset map working")
+
+
+def test_table_detector_long_and_ragged():
+    """Test that long tables are one block and a ragged first row does not hide the table"""
+    print("Testing bitmask table detector...")
+
+    ds = DocStripper(dry_run=True)
+    rows = ["{:<10}  {:>8}  {:>8}".format(f"Item {i}", i * 3, i * 7) for i in range(40)]
+    lines = ["Intro paragraph text", "Name     Qty  Price"] + rows + ["", "Closing text"]
+    flags = ds.detect_table_lines(lines)
+    assert flags[0] == 0 and flags[-1] == 0 and flags[-2] == 0
+    assert all(flags[1:42]), "Ragged header or long table rows not flagged"
+    assert ds.detect_table_block(lines, 1) == (True, 42), "Table should not be cut into 10-line chunks"
+    assert ds.detect_table_block(lines, 0) == (False, 0)
+
+    # Table rows stay untouched by merging and whitespace normalization
+    cleaned, _ = ds.clean_text("\n".join(lines), **ALL_ON)
+    assert rows[25] in cleaned.split('\n')
+
+    print("  ✓ Bitmask table detector working")
+
+
+def test_document_offsets_and_removal():
+    """Test the offset-array document model across block boundaries"""
+    print("Testing document model...")
+
+    text = "alpha\n\nbeta gamma\n---\nbeta gamma\nlast"
+    lines = text.split('\n')
+    saved_block = Document.BLOCK
+    try:
+        for block in (1, 3, 8, 1 << 20):
+            Document.BLOCK = block
+            document = Document(text)
+            assert list(document.iter_lines()) == lines
+            assert len(document) == len(lines) and len(document.starts) == len(lines)
+            assert [document.line(i) for i in range(len(lines))] == lines
+            assert document.assemble() is text, "Nothing removed should return the text itself"
+            document.removed[1] = document.removed[3] = document.removed[5] = 1
+            assert document.assemble() == "alpha\nbeta gamma\nbeta gamma"
+    finally:
+        Document.BLOCK = saved_block
+
+    # The filter stage marks lines on the document and records reasons from the codes
+    ds = DocStripper(dry_run=True)
+    edits = EditScript()
+    cleaned, stats = ds.clean_text(text, edits=edits)
+    assert cleaned == "alpha\nbeta gamma\nlast"
+    assert [reason for op, _, _, reason in edits.ops] == ['empty', 'punctuation', 'duplicate']
+
+    print("  ✓ Document model working")
+
+
+def test_merge_builds_paragraphs_in_linear_time():
+    """Test merging of a long unpunctuated paragraph and of a header split over two lines"""
+    print("Testing paragraph merging...")
+
+    ds = DocStripper(dry_run=True)
+    paragraph = "\n".join(f"fragment {i} of a slide title" for i in range(5000))
+    merged, count = ds.merge_broken_lines(paragraph + "\n\nNext.", enabled=True)
+    assert count == 4999
+    assert merged == paragraph.replace("\n", " ") + "\n\nNext."
+
+    # A header split over two lines becomes a header once merged, so nothing joins it
+    merged, count = ds.merge_broken_lines("DRAFT -\nNOT FOR DISTRIBUTION\nbody text\ncontinues here",
+                                          enabled=True)
+    assert merged == "DRAFT - NOT FOR DISTRIBUTION\nbody text continues here", merged
+    assert count == 2
+
+    # Table rows are copied untouched; text after the block still joins its last row
+    table = "Name    Qty    Price\nApple   3      1.20\nPear    5      0.80"
+    merged, count = ds.merge_broken_lines(f"intro text\n{table}\nnotes follow", enabled=True)
+    assert merged == f"intro text\n{table} notes follow", merged
+    assert count == 1
+
+    print("  ✓ Paragraph merging working")
+
+
+def drop_todo_lines(lines):
+    """Batched line function used as a custom stage"""
+    return [None if line.startswith('TODO') else line for line in lines]
+
+
+def test_compiled_plan_and_custom_stages():
+    """Test plan caching, disabled-stage removal and custom stage registration"""
+    print("Testing pipeline plans and custom stages...")
+
+    ds = DocStripper(dry_run=True)
+    options = CleaningOptions(merge_lines=False, normalize_ws=True, normalize_unicode=False,
+                              dehyphenate=True, remove_headers=False)
+    plan = ds.compile_plan(options)
+    assert plan.names == ['dehyphenate', 'whitespace', 'filters'], plan.names
+    assert ds.compile_plan(options) is plan, "Plan should be cached per option set"
+
+    ds.register_stage(LineStage('todo', drop_todo_lines), before='filters')
+    ds.register_stage(TextStage('upper', str.upper), after='merge')
+    plan = ds.compile_plan(options)
+    assert plan.names == ['dehyphenate', 'upper', 'whitespace', 'todo', 'filters'], plan.names
+
+    edits = EditScript()
+    sample = "Keep this line.\nTODO remove me\nAnd  this one."
+    cleaned, stats = ds.clean_text(sample, edits=edits, **options._asdict())
+    assert cleaned == "KEEP THIS LINE.\nAND THIS ONE.", cleaned
+    assert stats['todo_removed'] == 1
+    assert stats['lines_removed'] == 1
+    assert ('drop', 1, 2, 'todo') in edits.ops
+
+    try:
+        ds.register_stage(LineStage('other', drop_todo_lines), after='nonexistent')
+        assert False, "Unknown anchor should be rejected"
+    except ValueError:
+        pass
+
+    print("  ✓ Pipeline plans and custom stages working")
+
+
+def test_cpu_cap_degrades_optional_stages():
+    """Test that a spent CPU cap skips merging and repeating-header detection and is recorded"""
+    print("Testing per-file CPU cap...")
+
+    ds = DocStripper(dry_run=True)
+    sample = "Header text here\nthis line is\nbroken mid\nsentence\n\f\nHeader text here\nmore text\n"
+    full, stats = ds.clean_text(sample, **ALL_ON)
+    assert stats['cpu_cap_exceeded'] == 0 and stats['merged_lines'] > 0
+
+    capped, stats = ds.clean_text(sample, max_cpu_seconds=0, **ALL_ON)
+    assert stats['cpu_cap_exceeded'] == 1
+    assert stats['cpu_cap_skipped_stages'] == 2, "Merge and page detection should be skipped"
+    assert stats['merged_lines'] == 0
+    assert capped.split('\n')[:3] == ["Header text here", "this line is", "broken mid"]
+
+    # Abort mode leaves the file untouched and reports a failure
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "slow.txt"
+        path.write_text(sample, encoding='utf-8')
+        aborting = DocStripper(quiet=True, max_cpu_seconds=0, cpu_cap_action='abort')
+        with contextlib.redirect_stderr(io.StringIO()):
+            assert not aborting.process_file(path)
+        assert path.read_text() == sample
+        assert not Path(str(path) + '.bak').exists()
+        assert aborting.stats['files_cpu_capped'] == 1
+
+    print("  ✓ Per-file CPU cap working")
+
+
+def test_sweep_shares_stage_prefixes():
+    """Test that a memoized sweep matches separate runs and reuses shared stages"""
+    print("Testing option sweep...")
+
+    ds = DocStripper(dry_run=True, quiet=True)
+    combos = ds.sweep_combinations(['merge-lines', 'normalize-ws', 'headers'])
+    assert len(combos) == 8 and len(set(combos)) == 8
+
+    memo: Dict[tuple, tuple] = {}
+    for combo in combos:
+        swept, swept_stats = ds.clean_text(SAMPLE, memo=memo, **combo._asdict())
+        alone, alone_stats = ds.clean_text(SAMPLE, **combo._asdict())
+        assert swept == alone and swept_stats == alone_stats, f"Memoized run differs for {combo}"
+    # Dehyphenation is first in every plan, so it is stored once
+    assert sum(1 for key in memo if len(key) == 1) == 1
+
+    # Output with optional stages skipped at the CPU cap is not shared with a later run
+    capped_memo: Dict[tuple, tuple] = {}
+    combo = ds.sweep_combinations(['merge-lines'])[0]  # Merging on: an optional stage
+    _, capped_stats = ds.clean_text(SAMPLE, memo=capped_memo, max_cpu_seconds=1e-9, **combo._asdict())
+    assert capped_stats['cpu_cap_skipped_stages'] > 0
+    assert ds.clean_text(SAMPLE, memo=capped_memo, **combo._asdict()) == ds.clean_text(SAMPLE, **combo._asdict())
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "doc.txt"
+        path.write_text(SAMPLE, encoding='utf-8')
+        rows = ds.sweep([path], combos)
+        assert path.read_text() == SAMPLE, "Sweep must not write files"
+        assert not Path(str(path) + '.bak').exists()
+    assert [row['chars_out'] for row in rows] == [len(ds.clean_text(SAMPLE, **c._asdict())[0]) for c in combos]
+    assert sum(row['stages_reused'] for row in rows) > 0
+    assert rows[0]['stages_reused'] == 0 and rows[1]['stages_reused'] > 0
+
+    print("  ✓ Option sweep working")
+
+
+def test_lexicon_dehyphenation():
+    """Test that the lexicon joins split words, keeps compound hyphens and skips unknown words"""
+    print("Testing lexicon dehyphenation...")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        words = Path(tmpdir) / "words.txt"
+        words.write_text("automatic\nSelf\nemployed\nwell-known\ncooperate\n", encoding='utf-8')
+        lexicon = Lexicon.load(words)
+        assert lexicon.path.name == "words.txt.dslex"
+        assert Lexicon.load(lexicon.path).path == lexicon.path, "Compiled file should load as is"
+        assert 'automatic' in lexicon and 'SELF' in lexicon and 'well-known' in lexicon
+        assert 'auto' not in lexicon and 'zzz' not in lexicon and '' not in lexicon
+
+        ds = DocStripper(dry_run=True, lexicon=lexicon)
+        sample = "auto-\nmatic and Self-\nemployed, well-\nknown co-\noperate foo-\nbar x"
+        edits = EditScript()
+        text, joined, kept = ds.dehyphenate_with_lexicon(sample)
+        assert text == "automatic and Self-employed, well-known cooperate foo-\nbar x", text
+        assert (joined, kept) == (2, 2)
+        cleaned, stats = ds.clean_text(sample, edits=edits, merge_lines=False, normalize_ws=True,
+                                       normalize_unicode=True, dehyphenate=True, remove_headers=True)
+        assert stats['dehyphenated_tokens'] == 2 and stats['hyphens_kept'] == 2
+        assert len(edits.line_origins) == len(cleaned.split('\n')) == 2
+
+        # Without a lexicon every lowercase continuation is joined, as before
+        assert DocStripper(dry_run=True).dehyphenate_with_lexicon(sample)[1:] == (5, 0)
+
+        # Worker processes receive the path and map the file themselves
+        assert 'cooperate' in pickle.loads(pickle.dumps(lexicon))
+
+    print("  ✓ Lexicon dehyphenation working")
+
+
+def test_extended_unicode_normalization():
+    """Test per-category Unicode counts, NFKC mode and offsets over replaced characters"""
+    print("Testing extended Unicode normalization...")
+
+    ds = DocStripper(dry_run=True)
+    original = ("\ufb01nal e\ufb00ort\u00a0costs \u201c5\u201d \uff08ok\uff09\u200b.\n"
+                "re\u00adport \u2013 x\u00b2 \uff21")
+    options: Dict[str, Any] = dict(ALL_ON, merge_lines=False, normalize_ws=False)
+    edits = EditScript()
+    cleaned, stats = ds.clean_text(original, edits=edits, **options)
+    assert cleaned == 'final effort costs "5" (ok).\nreport - x\u00b2 \uff21', cleaned
+    expected = {'unicode_ligatures': 2, 'unicode_spaces': 1, 'unicode_quotes': 2, 'unicode_fullwidth': 2,
+                'unicode_zero_width': 1, 'unicode_soft_hyphens': 1, 'unicode_dashes': 1, 'unicode_nfkc': 0}
+    assert {key: stats[key] for key in expected} == expected, stats
+
+    offset_map = OffsetMap.from_edits(original, cleaned, edits)
+    for word in ('costs', 'report', 'ok'):
+        start = cleaned.index(word)
+        orig_start, orig_end = offset_map.span(start, start + len(word))
+        assert original[orig_start:orig_end].replace('\u00ad', '') == word
+
+    nfkc, stats = ds.clean_text(original, unicode_nfkc=True, **options)
+    assert nfkc.endswith("report - x2 A") and stats['unicode_nfkc'] == 2
+    # Replaced punctuation still reports a change when NFKC leaves the rest alone
+    counts: Dict[str, int] = {}
+    assert ds.normalize_unicode_punctuation('\u201ccaf\u00e9\u201d', enabled=True, counts=counts,
+                                            nfkc=True) == ('"caf\u00e9"', True)
+    assert counts == {'unicode_quotes': 2}, counts
+    assert ds.compile_plan(CleaningOptions(normalize_unicode=True, unicode_nfkc=True)).keys[0] == ('unicode', 'nfkc')
+
+    print("  ✓ Extended Unicode normalization working")
+
+
+def test_page_aware_chunks():
+    """Test chunk size limits, page metadata, overlap and JSON-lines output"""
+    print("Testing page-aware chunking...")
+
+    pages = []
+    for page in range(1, 5):
+        pages.append(f"Quarterly Report\nPage {page} of 4\n\n"
+                     f"Section {page} begins with a para-\ngraph that wraps across\nseveral lines of text.\n\n"
+                     f"Note {page}: figures are provisional.\nEnd of section {page}.")
+    text = "\n\f".join(pages)
+    ds = DocStripper(dry_run=True)
+
+    generated = ds.chunk(text, max_chars=80, overlap=20, break_on='page')
+    assert not isinstance(generated, list)  # A generator: chunks are produced one at a time
+    chunks = list(generated)
+    cleaned = ds.clean(text).text
+    for chunk in chunks:
+        assert len(chunk.text) <= 80 and chunk.text == cleaned[chunk.start:chunk.end]
+        found = re.search(r'(?:Section|Note|section) (\d)', chunk.text)
+        assert found is not None, chunk.text
+        assert chunk.page_start == chunk.page_end == int(found.group(1))
+    assert [chunk.chunk_index for chunk in chunks] == list(range(len(chunks)))
+    assert any(b.start < a.end for a, b in zip(chunks, chunks[1:]))  # Overlap within a page
+    for a, b in zip(chunks, chunks[1:]):
+        if a.page_end != b.page_start:
+            assert b.start > a.end  # No overlap across a page break
+
+    whole = list(ds.chunk(text, max_chars=10000))
+    assert len(whole) == 1 and whole[0].text == cleaned and (whole[0].page_start, whole[0].page_end) == (1, 4)
+
+    try:
+        list(ds.chunk(text, max_chars=10, overlap=10))
+        assert False, "overlap >= max_chars accepted"
+    except ValueError:
+        pass
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "report.txt"
+        path.write_text(text, encoding='utf-8')
+        stripper = DocStripper(dry_run=True, quiet=True, chunk_size=80, chunk_overlap=20, chunk_break='page')
+        buf = io.StringIO()
+        with contextlib.redirect_stdout(buf):
+            assert stripper.process_file(path)
+        records = [json.loads(line) for line in buf.getvalue().splitlines()]
+        assert [record['text'] for record in records] == [chunk.text for chunk in chunks]
+        assert all(record['source'] == str(path) for record in records)
+        assert [record['chunk_index'] for record in records] == list(range(len(chunks)))
+        assert path.read_text(encoding='utf-8') == text
+
+    print("  ✓ Page-aware chunking working")
+
+
+def test_ascii_fast_path_matches_regex_path():
+    """Test that ASCII lines get the same answers as the regex path"""
+    print("Testing ASCII fast path...")
+
+    ds = DocStripper(dry_run=True)
+    lines = ["12", " 7 ", "1 2", "12a", "---", "*", "* *", "__", "=" * 51, "- item", "-item", "* x",
+             "3. step", "3.step", "10) ten", ")", "\x1c12\x1f", "\x0b-\x0c", "#!", "a_b", "\t\t", "",
+             "  lead  and   trail  ", "tab\tin\x0bside", "\x1cx\x1d  y\x1e",
+             # Non-ASCII lines take the regex path
+             "\u0663\u0664", "\u2022 item", "\u2014\u2014", "caf\u00e9\u2003 \u00a0bar\u3000"]
+    for line in lines:
+        stripped = line.strip()
+        assert ds.is_page_number(line) == bool(stripped and re.match(r'^\s*\d+\s*$', stripped)), repr(line)
+        assert ds.is_punctuation_only(line) == bool(
+            stripped and len(stripped) <= 50 and re.match(r'^[^\w\s]+$', stripped)), repr(line)
+        assert ds.is_list_marker(line) == bool(re.match(r'^\s*([-•*·])\s+', stripped)
+                                               or re.match(r'^\s*\d+[.)]\s+', stripped)), repr(line)
+        normalized, _ = ds.normalize_whitespace(line, enabled=True, skip_table_blocks=False)
+        assert normalized == re.sub(r'\s+$', '', re.sub(r'\s+', ' ', line)), repr(line)
+
+    print("  ✓ ASCII fast path agrees with the regexes")
+
+
+def run_all_cleaning_tests():
+    """Run all cleaning tests"""
+    print("=" * 60)
+    print("DocStripper Cleaning Test Suite")
+    print("=" * 60)
+
+    tests = [
+        test_edit_script_reasons,
+        test_unified_diff_round_trip,
+        test_offset_map_lookup,
+        test_table_detector_long_and_ragged,
+        test_document_offsets_and_removal,
+        test_merge_builds_paragraphs_in_linear_time,
+        test_compiled_plan_and_custom_stages,
+        test_cpu_cap_degrades_optional_stages,
+        test_sweep_shares_stage_prefixes,
+        test_lexicon_dehyphenation,
+        test_extended_unicode_normalization,
+        test_page_aware_chunks,
+        test_ascii_fast_path_matches_regex_path,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test_func in tests:
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"  ✗ Test failed: {e}")
+            failed += 1
+        except Exception as e:
+            print(f"  ✗ Unexpected error: {e}")
+            import traceback
+            traceback.print_exc()
+            failed += 1
+
+    print("\n" + "=" * 60)
+    if failed == 0:
+        print(f"✅ All {passed} cleaning tests passed!")
+        return 0
+    else:
+        print(f"❌ {failed} test(s) failed, {passed} passed")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_cleaning_tests())
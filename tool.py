@@ -7,18 +7,1002 @@ Removes noise from text documents: page headers, footers, duplicates, etc.
 import sys
 import os
 import re
-import json
-import argparse
-import subprocess
-import shutil
+import time
 from pathlib import Path
-from datetime import datetime
-from hashlib import sha1
-from typing import List, Tuple, Optional, Set
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, NamedTuple, Tuple, Optional, Set
 
+if TYPE_CHECKING:  # Imported where they are used, only when needed
+    import mmap
+    import threading
+    import xml.etree.ElementTree as ET
+    from concurrent.futures import ThreadPoolExecutor
+    from array import array
 
-class DocStripper:
-    """Main class for document cleaning operations."""
+
+class EditScript:
+    """
+    Compact record of how clean_text turned original lines into output lines.
+
+    Pass an instance to clean_text(edits=...) to have it filled in while
+    cleaning. Ops are (op, start, end, reason) tuples over original line
+    indices [start, end): 'drop' ranges carry the filter that removed them
+    (consecutive drops with the same reason are coalesced), 'merge' and
+    'dehyphenate' ranges were joined into one line. line_origins holds the
+    original line range behind each output line, so a diff can be rendered
+    without comparing the texts again.
+    """
+
+    DROP_REASONS = ('empty', 'punctuation', 'page_number', 'header', 'repeating', 'duplicate')
+
+    def __init__(self):
+        self.ops: List[Tuple[str, int, int, str]] = []
+        self.line_origins: List[Tuple[int, int]] = []
+        self.original_line_count = 0
+
+    def begin(self, text: str) -> List[Tuple[int, int]]:
+        """Reset for a new document; returns one origin range per line."""
+        self.ops = []
+        self.line_origins = []
+        self.original_line_count = text.count('\n') + 1
+        return [(i, i + 1) for i in range(self.original_line_count)]
+
+    def apply_joins(self, origins: List[Tuple[int, int]], joins: List[int],
+                    kind: str) -> List[Tuple[int, int]]:
+        """Fold lines listed in joins (each appended to its predecessor) into their origins."""
+        if not joins:
+            return origins
+        joined = set(joins)
+        result: List[Tuple[int, int]] = []
+        touched: List[int] = []
+        for i, origin in enumerate(origins):
+            if i in joined and result:
+                result[-1] = (result[-1][0], origin[1])
+                if not touched or touched[-1] != len(result) - 1:
+                    touched.append(len(result) - 1)
+            else:
+                result.append(origin)
+        for idx in touched:
+            start, end = result[idx]
+            self.ops.append((kind, start, end, ''))
+        return result
+
+    def drop(self, origin: Tuple[int, int], reason: str):
+        """Record that the line from the given original range was removed."""
+        if self.ops:
+            op, start, end, last_reason = self.ops[-1]
+            if op == 'drop' and last_reason == reason and end == origin[0]:
+                self.ops[-1] = (op, start, origin[1], reason)
+                return
+        self.ops.append(('drop', origin[0], origin[1], reason))
+
+    def keep(self, origin: Tuple[int, int]):
+        """Record that the next output line came from the given original range."""
+        self.line_origins.append(origin)
+
+    def to_dict(self) -> dict:
+        """JSON-serializable form."""
+        return {
+            'original_line_count': self.original_line_count,
+            'ops': [list(op) for op in self.ops],
+            'line_origins': [list(origin) for origin in self.line_origins],
+        }
+
+    def _items(self, original_lines: List[str], cleaned_lines: List[str]):
+        """Yield (old_lines, new_lines, tag) groups in original-line order."""
+        import bisect
+        drops = [(start, end, reason) for op, start, end, reason in self.ops if op == 'drop']
+        joins = sorted((start, op) for op, start, end, _ in self.ops if op != 'drop')
+        join_starts = [start for start, _ in joins]
+        kept = [(start, end, idx) for idx, (start, end) in enumerate(self.line_origins)]
+        di = ki = 0
+        while di < len(drops) or ki < len(kept):
+            if ki >= len(kept) or (di < len(drops) and drops[di][0] < kept[ki][0]):
+                start, end, reason = drops[di]
+                di += 1
+                yield original_lines[start:end], [], reason
+            else:
+                start, end, idx = kept[ki]
+                ki += 1
+                old = original_lines[start:end]
+                new = [cleaned_lines[idx]] if idx < len(cleaned_lines) else []
+                if old == new:
+                    yield old, new, None
+                else:
+                    lo = bisect.bisect_left(join_starts, start)
+                    hi = bisect.bisect_left(join_starts, end)
+                    kinds = sorted({op for _, op in joins[lo:hi]})
+                    yield old, new, '+'.join(kinds) or 'normalized'
+
+    def render(self, original_text: str, cleaned_text: str, mode: str = 'unified',
+               fromfile: str = 'original', tofile: str = 'cleaned', context: int = 3) -> str:
+        """Render the recorded edits as a unified diff or an annotated listing."""
+        original_lines = original_text.split('\n')
+        cleaned_lines = cleaned_text.split('\n') if cleaned_text else []
+        if mode == 'annotated':
+            return self._render_annotated(original_lines, cleaned_lines)
+        if mode != 'unified':
+            raise ValueError(f"Unknown diff mode: {mode}")
+        return self._render_unified(original_lines, cleaned_lines, fromfile, tofile, context)
+
+    def _render_annotated(self, original_lines: List[str], cleaned_lines: List[str]) -> str:
+        out = []
+        line_no = 1
+        width = len(str(len(original_lines)))
+        for old, new, tag in self._items(original_lines, cleaned_lines):
+            if tag is None:
+                out.append(f"  {line_no:>{width}} | {old[0]}")
+            else:
+                marker = '~' if new else '-'
+                for offset, line in enumerate(old):
+                    suffix = f"  [{tag}]" if offset == 0 else ''
+                    out.append(f"{marker} {line_no + offset:>{width}} | {line}{suffix}")
+                if new:
+                    out.append(f"  {'':>{width}} => {new[0]}")
+            line_no += len(old)
+        return '\n'.join(out) + '\n' if out else ''
+
+    def _render_unified(self, original_lines: List[str], cleaned_lines: List[str],
+                        fromfile: str, tofile: str, context: int) -> str:
+        # Flatten into (old_no, new_no, old, new, changed) groups, then cut hunks
+        groups = []
+        old_no = new_no = 1
+        for old, new, tag in self._items(original_lines, cleaned_lines):
+            groups.append((old_no, new_no, old, new, tag is not None))
+            old_no += len(old)
+            new_no += len(new)
+        changed = [i for i, group in enumerate(groups) if group[4]]
+        if not changed:
+            return ''
+
+        out = [f"--- {fromfile}", f"+++ {tofile}"]
+        i = 0
+        while i < len(changed):
+            first = last = changed[i]
+            # Extend the hunk while the next change is within 2*context equal lines
+            while i + 1 < len(changed) and changed[i + 1] - last - 1 <= 2 * context:
+                i += 1
+                last = changed[i]
+            i += 1
+            lo = max(0, first - context)
+            hi = min(len(groups), last + context + 1)
+            body: List[str] = []
+            old_count = new_count = 0
+            for old_start, new_start, old, new, is_change in groups[lo:hi]:
+                if is_change:
+                    body.extend('-' + line for line in old)
+                    body.extend('+' + line for line in new)
+                else:
+                    body.extend(' ' + line for line in old)
+                old_count += len(old)
+                new_count += len(new)
+            old_start = groups[lo][0] if old_count else groups[lo][0] - 1
+            new_start = groups[lo][1] if new_count else groups[lo][1] - 1
+            out.append(f"@@ -{old_start},{old_count} +{new_start},{new_count} @@")
+            out.extend(body)
+        return '\n'.join(out) + '\n'
+
+
+def _match_length(a: str, i: int, b: str, j: int) -> int:
+    """Length of the common run a[i:] / b[j:], found with galloping slice compares."""
+    limit = min(len(a) - i, len(b) - j)
+    matched = 0
+    step = limit  # Whole remainder first: most lines are mostly unchanged
+    while matched < limit:
+        k = min(step, limit - matched)
+        if a[i + matched:i + matched + k] == b[j + matched:j + matched + k]:
+            matched += k
+            step *= 2
+        elif k == 1:
+            break
+        else:
+            step = k // 2
+    return matched
+
+
+class _LazyPattern:
+    """Class attribute holding a regex that is compiled on first access."""
+
+    def __init__(self, pattern: str, flags: int = 0):
+        self.pattern = pattern
+        self.flags = flags
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner):
+        compiled = re.compile(self.pattern, self.flags)
+        setattr(owner, self.name, compiled)  # Later lookups skip the descriptor
+        return compiled
+
+
+class OffsetMap:
+    """
+    Map offsets in cleaned text back to offsets in the original text.
+
+    Stored as run-length segments in parallel arrays: segment i starts at
+    cleaned offset clean_starts[i] and original offset orig_starts[i].
+    Linear segments advance through both texts together; constant segments
+    (text that replaced one original character, e.g. '...' for an ellipsis)
+    map every offset to orig_starts[i]. Lookups are a binary search.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self):
+        from array import array
+        self.clean_starts = array('q')
+        self.orig_starts = array('q')
+        self.linear = bytearray()
+        self.clean_length = 0
+        self.orig_length = 0
+
+    def __len__(self) -> int:
+        return len(self.clean_starts)
+
+    def _add(self, clean_pos: int, orig_pos: int, linear: bool):
+        """Start a segment at clean_pos unless it continues the previous one."""
+        if self.clean_starts:
+            last = len(self.clean_starts) - 1
+            if self.linear[last] and linear:
+                if orig_pos - self.orig_starts[last] == clean_pos - self.clean_starts[last]:
+                    return
+            elif not self.linear[last] and not linear and self.orig_starts[last] == orig_pos:
+                return
+        self.clean_starts.append(clean_pos)
+        self.orig_starts.append(orig_pos)
+        self.linear.append(1 if linear else 0)
+
+    def lookup(self, offset: int) -> int:
+        """Return the original offset for a cleaned-text offset."""
+        import bisect
+        if offset < 0 or offset > self.clean_length:
+            raise IndexError(f"offset {offset} outside cleaned text of length {self.clean_length}")
+        if offset == self.clean_length or not self.clean_starts:
+            return self.orig_length
+        i = bisect.bisect_right(self.clean_starts, offset) - 1
+        if self.linear[i]:
+            return self.orig_starts[i] + (offset - self.clean_starts[i])
+        return self.orig_starts[i]
+
+    def span(self, start: int, end: int) -> Tuple[int, int]:
+        """Map a cleaned [start, end) range to the original range covering it."""
+        if end <= start:
+            orig = self.lookup(start)
+            return orig, orig
+        return self.lookup(start), self.lookup(end - 1) + 1
+
+    @classmethod
+    def from_edits(cls, original: str, cleaned: str, edits: EditScript,
+                   replacements: Optional[dict] = None) -> 'OffsetMap':
+        """
+        Build the map for a clean_text run that filled the given EditScript.
+
+        Line provenance from the edit script pins each cleaned line to its
+        original line range; inside that range the only edits clean_text makes
+        are whitespace collapse, hyphen/newline removal and the character
+        replacements given, so the characters are aligned in one forward pass.
+        """
+        if replacements is None:
+            replacements = TextCleaner.UNICODE_PUNCTUATION_MAP
+        offset_map = cls()
+        offset_map.clean_length = len(cleaned)
+        offset_map.orig_length = len(original)
+        if not cleaned:
+            return offset_map
+
+        line_starts = [0]
+        pos = original.find('\n')
+        while pos != -1:
+            line_starts.append(pos + 1)
+            pos = original.find('\n', pos + 1)
+        line_starts.append(len(original) + 1)
+
+        clean_pos = 0
+        cleaned_lines = cleaned.split('\n')
+        for line, (start, end) in zip(cleaned_lines, edits.line_origins):
+            base = line_starts[start]
+            region = original[base:line_starts[end] - 1]
+            offset_map._align(region, base, line, clean_pos, replacements)
+            clean_pos += len(line)
+            if clean_pos < len(cleaned):
+                # The newline after this output line stands for the one ending its range
+                offset_map._add(clean_pos, line_starts[end] - 1, True)
+                clean_pos += 1
+        return offset_map
+
+    def _align(self, region: str, base: int, line: str, clean_pos: int, replacements: dict):
+        i = j = 0
+        while j < len(line):
+            if i < len(region):
+                src = region[i]
+                run = _match_length(region, i, line, j)
+                if run:
+                    self._add(clean_pos + j, base + i, True)
+                    i += run
+                    j += run
+                    continue
+                rep = replacements.get(src)
+                if rep is not None:
+                    if not rep:
+                        i += 1
+                        continue
+                    if line.startswith(rep, j):
+                        self._add(clean_pos + j, base + i, len(rep) == 1)
+                        i += 1
+                        j += len(rep)
+                        continue
+                if line[j] == ' ' and src.isspace():
+                    # Collapsed whitespace or a merged line break
+                    self._add(clean_pos + j, base + i, True)
+                    i += 1
+                    j += 1
+                    continue
+                if src.isspace() or (src == '-' and region.startswith('\n', i + 1)):
+                    i += 1
+                    continue
+            # Unexplained output character: pin it to the current original position
+            self._add(clean_pos + j, base + min(i, len(region)), False)
+            j += 1
+
+    def to_dict(self) -> dict:
+        """JSON-serializable form; arrays are stored as base64 little-endian int64."""
+        import base64
+        from array import array
+
+        def pack(values):
+            packed = array('q', values)
+            if sys.byteorder != 'little':
+                packed.byteswap()
+            return base64.b64encode(packed.tobytes()).decode('ascii')
+
+        return {
+            'version': self.FORMAT_VERSION,
+            'clean_length': self.clean_length,
+            'orig_length': self.orig_length,
+            'clean_starts': pack(self.clean_starts),
+            'orig_starts': pack(self.orig_starts),
+            'linear': base64.b64encode(bytes(self.linear)).decode('ascii'),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'OffsetMap':
+        """Inverse of to_dict."""
+        import base64
+        from array import array
+        if data.get('version') != cls.FORMAT_VERSION:
+            raise ValueError(f"Unsupported offset map version: {data.get('version')}")
+
+        def unpack(encoded):
+            values = array('q')
+            values.frombytes(base64.b64decode(encoded))
+            if sys.byteorder != 'little':
+                values.byteswap()
+            return values
+
+        offset_map = cls()
+        offset_map.clean_length = data['clean_length']
+        offset_map.orig_length = data['orig_length']
+        offset_map.clean_starts = unpack(data['clean_starts'])
+        offset_map.orig_starts = unpack(data['orig_starts'])
+        offset_map.linear = bytearray(base64.b64decode(data['linear']))
+        return offset_map
+
+    def save(self, path: Path):
+        """Write the map as JSON."""
+        import json
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: Path) -> 'OffsetMap':
+        """Read a map written by save()."""
+        import json
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+class CleaningOptions(NamedTuple):
+    """Option set for clean_text; also the key under which pipeline plans are cached."""
+    merge_lines: bool = False
+    normalize_ws: bool = False
+    normalize_unicode: bool = False
+    dehyphenate: bool = False
+    remove_headers: bool = True
+    unicode_nfkc: bool = False
+
+
+class CleanResult(NamedTuple):
+    """Outcome of TextCleaner.clean for one document."""
+    text: str
+    stats: dict
+    changed: bool
+
+
+class Chunk(NamedTuple):
+    """
+    One piece of cleaned text from TextCleaner.chunk.
+
+    start and end are offsets into the cleaned text (chunks overlap when
+    an overlap was asked for); pages are 1-based physical page numbers as
+    found by detect_pages on the original text. chunk_index counts from 0
+    (a field named index would shadow tuple.index).
+    """
+    chunk_index: int
+    text: str
+    start: int
+    end: int
+    page_start: int
+    page_end: int
+
+
+STAT_KEYS = (
+    'lines_removed',
+    'duplicates_collapsed',
+    'empty_lines_removed',
+    'header_footer_removed',
+    'punctuation_lines_removed',
+    'dehyphenated_tokens',
+    'hyphens_kept',
+    'repeating_headers_footers_removed',
+    'merged_lines',
+    'cpu_cap_exceeded',
+    'cpu_cap_skipped_stages',
+    # Characters replaced per normalize_unicode_punctuation category
+    'unicode_quotes',
+    'unicode_dashes',
+    'unicode_ellipsis',
+    'unicode_ligatures',
+    'unicode_spaces',
+    'unicode_zero_width',
+    'unicode_soft_hyphens',
+    'unicode_fullwidth',
+    'unicode_nfkc',
+)
+
+
+class Lexicon:
+    """
+    Sorted word list memory-mapped from a compiled file, for dehyphenation.
+
+    The compiled format is a MAGIC line followed by lowercase UTF-8 words,
+    one per line, in byte order; membership is a binary search over the
+    mapping, so nothing is parsed at load time and worker processes share
+    the pages through the OS cache. The file is mapped on first lookup,
+    and pickling sends only the path.
+    """
+
+    MAGIC = b'DSLEX1\n'
+    SUFFIX = '.dslex'
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._map: Optional['mmap.mmap'] = None
+
+    @classmethod
+    def compile(cls, words: Iterable[str], out_path: Path) -> 'Lexicon':
+        """Write words as a compiled lexicon file."""
+        encoded = sorted({w.strip().lower().encode('utf-8') for w in words if w.strip()})
+        tmp_path = out_path.with_name(out_path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(cls.MAGIC)
+            for word in encoded:
+                f.write(word + b'\n')
+        os.replace(tmp_path, out_path)
+        return cls(out_path)
+
+    @classmethod
+    def load(cls, path: Path) -> 'Lexicon':
+        """
+        Open a compiled lexicon, or a plain word list (one word per line).
+
+        A plain list is compiled once to PATH.dslex next to it and reused
+        until the list is newer than the compiled file.
+        """
+        path = Path(path)
+        with open(path, 'rb') as f:
+            if f.read(len(cls.MAGIC)) == cls.MAGIC:
+                return cls(path)
+        compiled = path.with_name(path.name + cls.SUFFIX)
+        if not compiled.exists() or compiled.stat().st_mtime_ns < path.stat().st_mtime_ns:
+            with open(path, 'r', encoding='utf-8') as f:
+                cls.compile(f, compiled)
+        return cls(compiled)
+
+    def __reduce__(self):
+        return (self.__class__, (self.path,))
+
+    def _mapping(self) -> 'mmap.mmap':
+        if self._map is None:
+            import mmap
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def __contains__(self, word: str) -> bool:
+        target = word.lower().encode('utf-8')
+        mm = self._mapping()
+        lo, hi = len(self.MAGIC), len(mm)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mm.rfind(b'\n', lo, mid) + 1 or lo
+            end = mm.find(b'\n', start)
+            entry = mm[start:end]
+            if entry == target:
+                return True
+            if entry < target:
+                lo = end + 1
+            else:
+                hi = start
+        return False
+
+
+class WorkLimitExceeded(Exception):
+    """Raised inside a stage when the per-file CPU-time cap has run out."""
+
+
+class Document:
+    """
+    A document held as one string plus line offsets, without a str per line.
+
+    starts is an array('Q') of line start offsets, built on first use from
+    block-sized splits, so random access to line i is one slice. removed
+    holds one byte per line: 0 to keep it, otherwise 1 + the index of its
+    reason in EditScript.DROP_REASONS. Stages mark lines there instead of
+    copying, and assemble() joins the runs of kept lines in one pass.
+    """
+
+    __slots__ = ('text', '_starts', 'removed')
+
+    BLOCK = 1 << 20  # Characters split at a time when scanning lines
+
+    def __init__(self, text: str):
+        self.text = text
+        self._starts: Optional['array[int]'] = None
+        self.removed = bytearray(text.count('\n') + 1)
+
+    def __len__(self) -> int:
+        return len(self.removed)
+
+    def _blocks(self) -> Iterator[Tuple[int, str, bool]]:
+        """Yield (offset, block, last) slices of the text that end at a line break."""
+        text = self.text
+        pos = 0
+        while True:
+            end = text.find('\n', pos + self.BLOCK) if pos + self.BLOCK < len(text) else -1
+            if end == -1:
+                yield pos, text[pos:], True
+                return
+            yield pos, text[pos:end], False
+            pos = end + 1
+
+    def iter_lines(self) -> Iterator[str]:
+        """All lines in order; only one block's worth of line strings exists at a time."""
+        for _, block, _ in self._blocks():
+            yield from block.split('\n')
+
+    @property
+    def starts(self) -> 'array[int]':
+        if self._starts is None:
+            from array import array
+            from itertools import accumulate, islice
+            starts = array('Q', [0])
+            for pos, block, last in self._blocks():
+                parts = block.split('\n')
+                lengths = map((1).__add__, map(len, islice(parts, len(parts) - 1 if last else None)))
+                starts.extend(islice(accumulate(lengths, initial=pos), 1, None))
+            self._starts = starts
+        return self._starts
+
+    def line(self, i: int) -> str:
+        starts = self.starts
+        end = starts[i + 1] - 1 if i + 1 < len(starts) else len(self.text)
+        return self.text[starts[i]:end]
+
+    def assemble(self) -> str:
+        """The text with removed lines left out."""
+        keep = self.removed.translate(self._KEEP_TABLE)
+        if keep.find(0) == -1:
+            return self.text
+        starts = self.starts
+        text = self.text
+        pieces = []
+        i = keep.find(1)
+        while i != -1:
+            j = keep.find(0, i)
+            if j == -1:
+                pieces.append(text[starts[i]:])
+                break
+            pieces.append(text[starts[i]:starts[j] - 1])
+            i = keep.find(1, j)
+        return '\n'.join(pieces)
+
+    _KEEP_TABLE = bytes([1] + [0] * 255)
+
+
+class StageContext:
+    """
+    Per-document state passed from stage to stage.
+
+    The document is held as text or as a list of lines and converted only
+    when a stage asks for the other form; document gives a Document view
+    of the current text, shared by stages until the text changes. origins
+    is the EditScript line provenance (None unless an edit script is being
+    recorded). headers, if given, are the document's known header/footer
+    lines (e.g. a DOCX's header parts): they seed repeating and page
+    detection is skipped.
+    """
+
+    __slots__ = ('_text', '_lines', '_document', 'stats', 'edits', 'origins', 'repeating', 'headers_known',
+                 'deadline')
+
+    def __init__(self, text: str, edits: Optional[EditScript] = None,
+                 deadline: Optional[float] = None, headers: Optional[Iterable[str]] = None):
+        self._text: Optional[str] = text
+        self._lines: Optional[List[str]] = None
+        self._document: Optional[Document] = None
+        self.stats = dict.fromkeys(STAT_KEYS, 0)
+        self.edits = edits
+        self.origins = edits.begin(text) if edits is not None else None
+        self.repeating: Set[str] = set(headers) if headers is not None else set()
+        self.headers_known = headers is not None
+        # time.thread_time() after which optional stages are skipped or abandoned
+        self.deadline = deadline
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            # Exactly one of _text and _lines is set at a time
+            self._text = '\n'.join(self._lines or ())
+            self._lines = None
+        return self._text
+
+    @text.setter
+    def text(self, value: str):
+        self._text = value
+        self._lines = None
+        self._document = None
+
+    @property
+    def lines(self) -> List[str]:
+        if self._lines is None:
+            self._lines = (self._text or '').split('\n')
+            self._text = None
+        return self._lines
+
+    @lines.setter
+    def lines(self, value: List[str]):
+        self._lines = value
+        self._text = None
+        self._document = None
+
+    @property
+    def document(self) -> Document:
+        if self._document is None:
+            self._document = Document(self.text)
+        return self._document
+
+    def snapshot(self) -> tuple:
+        """Immutable copy of the document state, for sharing between plans."""
+        return self.text, dict(self.stats), frozenset(self.repeating)
+
+    def restore(self, saved: tuple):
+        text, stats, repeating = saved
+        self.text = text
+        self.stats = dict(stats)
+        self.repeating = set(repeating)
+
+    def line_count(self) -> int:
+        if self._lines is not None:
+            return len(self._lines)
+        return (self._text or '').count('\n') + 1
+
+    def drop_lines(self, keep: bytearray, reasons: List[str]):
+        """Keep lines whose keep flag is set; record the others under their reasons."""
+        lines = self.lines
+        if self.edits is not None and self.origins is not None:
+            origins = []
+            for i, origin in enumerate(self.origins):
+                if keep[i]:
+                    origins.append(origin)
+                else:
+                    self.edits.drop(origin, reasons[i])
+            self.origins = origins
+        self.lines = [line for line, flag in zip(lines, keep) if flag]
+
+    def apply_removals(self, document: Document):
+        """Replace the text with document minus the lines marked in document.removed."""
+        if self.edits is not None and self.origins is not None:
+            reasons = EditScript.DROP_REASONS
+            origins = []
+            for origin, code in zip(self.origins, document.removed):
+                if code:
+                    self.edits.drop(origin, reasons[code - 1])
+                else:
+                    origins.append(origin)
+            self.origins = origins
+        self.text = document.assemble()
+
+
+class Stage:
+    """
+    One step of the cleaning pipeline.
+
+    Subclasses implement run(cleaner, ctx) and read or replace ctx.text or
+    ctx.lines. Stages must not keep per-document state on self: a compiled
+    plan, and its stage objects, is shared by every file cleaned with the
+    same options. A stage that changes the number of lines other than via
+    ctx.drop_lines cannot be combined with edit-script recording.
+
+    Optional stages are skipped once a file's CPU-time cap (ctx.deadline)
+    has passed, and may raise WorkLimitExceeded to be abandoned midway;
+    they must leave ctx untouched when they do.
+    """
+
+    name = 'stage'
+    optional = False
+
+    @property
+    def key(self):
+        """Hashable identity of this stage's behaviour, used to share results between plans."""
+        return self.name
+
+    def run(self, cleaner: 'TextCleaner', ctx: StageContext):
+        raise NotImplementedError
+
+
+class TextStage(Stage):
+    """Custom stage applying a str -> str function to the whole document."""
+
+    def __init__(self, name: str, func: Callable[[str], str]):
+        self.name = name
+        self.func = func
+
+    @property
+    def key(self):
+        return (self.name, self.func)
+
+    def run(self, cleaner, ctx):
+        before = ctx.line_count() if ctx.edits is not None else 0
+        ctx.text = self.func(ctx.text)
+        if ctx.edits is not None and ctx.line_count() != before:
+            raise ValueError(f"Stage '{self.name}' changed the line count; "
+                             f"use a LineStage to drop lines when recording edits")
+
+
+class LineStage(Stage):
+    """
+    Custom stage applying a batched line function.
+
+    func receives the full list of lines once per document and returns a
+    list of the same length; None entries drop that line (counted in
+    lines_removed and in '<name>_removed').
+    """
+
+    def __init__(self, name: str, func: Callable[[List[str]], List[Optional[str]]]):
+        self.name = name
+        self.func = func
+
+    @property
+    def key(self):
+        return (self.name, self.func)
+
+    def run(self, cleaner, ctx):
+        lines = ctx.lines
+        result = self.func(lines)
+        if len(result) != len(lines):
+            raise ValueError(f"Stage '{self.name}' returned {len(result)} lines for {len(lines)}")
+        if None not in result:
+            ctx.lines = list(result)
+            return
+        keep = bytearray(line is not None for line in result)
+        dropped = len(result) - sum(keep)
+        ctx.lines = [line if line is not None else '' for line in result]
+        ctx.drop_lines(keep, [self.name] * len(result))
+        ctx.stats['lines_removed'] += dropped
+        ctx.stats[f'{self.name}_removed'] = ctx.stats.get(f'{self.name}_removed', 0) + dropped
+
+
+class DehyphenateStage(Stage):
+    name = 'dehyphenate'
+
+    def run(self, cleaner, ctx):
+        joins: Optional[List[int]] = [] if ctx.edits is not None else None
+        ctx.text, ctx.stats['dehyphenated_tokens'], ctx.stats['hyphens_kept'] = \
+            cleaner.dehyphenate_with_lexicon(ctx.text, joins=joins)
+        if joins:
+            ctx.origins = ctx.edits.apply_joins(ctx.origins, joins, 'dehyphenate')
+
+
+class MergeStage(Stage):
+    name = 'merge'
+    optional = True
+
+    def run(self, cleaner, ctx):
+        joins: Optional[List[int]] = [] if ctx.edits is not None else None
+        ctx.text, ctx.stats['merged_lines'] = cleaner.merge_broken_lines(ctx.text, enabled=True, joins=joins,
+                                                                         deadline=ctx.deadline)
+        if joins:
+            ctx.origins = ctx.edits.apply_joins(ctx.origins, joins, 'merge')
+
+
+class WhitespaceStage(Stage):
+    name = 'whitespace'
+
+    def run(self, cleaner, ctx):
+        ctx.text, _ = cleaner.normalize_whitespace(ctx.text, enabled=True, skip_table_blocks=True)
+
+
+class UnicodeStage(Stage):
+    name = 'unicode'
+
+    def __init__(self, nfkc: bool = False):
+        self.nfkc = nfkc
+
+    @property
+    def key(self):
+        return ('unicode', 'nfkc') if self.nfkc else self.name
+
+    def run(self, cleaner, ctx):
+        ctx.text, _ = cleaner.normalize_unicode_punctuation(ctx.text, enabled=True, counts=ctx.stats,
+                                                            nfkc=self.nfkc)
+
+
+class PageDetectionStage(Stage):
+    """Find headers/footers repeating across pages; FilterStage removes them."""
+    name = 'pages'
+    optional = True
+
+    def run(self, cleaner, ctx):
+        if ctx.headers_known:
+            return
+        document = ctx.document
+        ctx.repeating = cleaner.detect_repeating_headers_footers(
+            document.text, cleaner.detect_pages(document.text, document), document)
+
+
+class FilterStage(Stage):
+    """Drop empty, punctuation-only, header/footer, repeating and duplicate lines."""
+    name = 'filters'
+
+    def __init__(self, remove_headers: bool = True):
+        self.remove_headers = remove_headers
+
+    @property
+    def key(self):
+        return (self.name, self.remove_headers)
+
+    # Document.removed codes: 1 + index in EditScript.DROP_REASONS
+    EMPTY, PUNCTUATION, PAGE_NUMBER, HEADER, REPEATING, DUPLICATE = range(1, 7)
+
+    def run(self, cleaner, ctx):
+        document = ctx.document
+        removed = document.removed
+        stats = ctx.stats
+        remove_headers = self.remove_headers
+        repeating = ctx.repeating
+        prev_stripped = None
+        kept = 0
+
+        for i, line in enumerate(document.iter_lines()):
+            stripped = line.strip()
+            
+            # Skip empty or whitespace-only lines
+            if not stripped:
+                stats['empty_lines_removed'] += 1
+                removed[i] = self.EMPTY
+            
+            # Skip punctuation-only lines (---, ***, ===, etc.)
+            elif cleaner.is_punctuation_only(stripped):
+                stats['punctuation_lines_removed'] += 1
+                removed[i] = self.PUNCTUATION
+            
+            # Skip page numbers
+            elif remove_headers and cleaner.is_page_number(stripped):
+                stats['header_footer_removed'] += 1
+                removed[i] = self.PAGE_NUMBER
+            
+            # Skip headers/footers
+            elif remove_headers and cleaner.is_header_footer(stripped):
+                stats['header_footer_removed'] += 1
+                removed[i] = self.HEADER
+            
+            # Skip repeating headers/footers across pages
+            elif remove_headers and stripped in repeating:
+                stats['repeating_headers_footers_removed'] += 1
+                removed[i] = self.REPEATING
+            
+            # Skip consecutive duplicates
+            elif stripped == prev_stripped:
+                stats['duplicates_collapsed'] += 1
+                removed[i] = self.DUPLICATE
+            
+            else:
+                kept += 1
+                prev_stripped = stripped
+
+        stats['lines_removed'] += len(document) - kept
+        ctx.apply_removals(document)
+
+
+class PipelinePlan:
+    """Ordered stages compiled for one option set; disabled stages are left out entirely."""
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = tuple(stages)
+
+    @property
+    def names(self) -> List[str]:
+        return [stage.name for stage in self.stages]
+
+    @property
+    def keys(self) -> tuple:
+        return tuple(stage.key for stage in self.stages)
+
+    def cached_prefix(self, memo: dict) -> int:
+        """Number of leading stages whose output is already in memo."""
+        keys = self.keys
+        for k in range(len(keys), 0, -1):
+            if keys[:k] in memo:
+                return k
+        return 0
+
+    def run(self, cleaner: 'TextCleaner', text: str,
+            edits: Optional[EditScript] = None,
+            deadline: Optional[float] = None,
+            memo: Optional[dict] = None,
+            headers: Optional[Iterable[str]] = None) -> Tuple[str, dict]:
+        """
+        Run the stages over text.
+
+        memo, if given, maps stage-key prefixes to document snapshots for
+        this text. The longest prefix already there is restored instead of
+        re-run, and every later stage's output is added, so plans that share
+        leading stages (a prefix DAG over option sets) share the work.
+        """
+        ctx = StageContext(text, edits, deadline, headers)
+        start = 0
+        if memo is not None:
+            start = self.cached_prefix(memo)
+            if start:
+                ctx.restore(memo[self.keys[:start]])
+        for k in range(start, len(self.stages)):
+            self._run_stage(self.stages[k], cleaner, ctx, deadline)
+            # Past the CPU cap optional stages are skipped: that output is no prefix for other plans
+            if memo is not None and not ctx.stats['cpu_cap_exceeded']:
+                memo[self.keys[:k + 1]] = ctx.snapshot()
+        if edits is not None and ctx.origins is not None:
+            for origin in ctx.origins:
+                edits.keep(origin)
+        return ctx.text, ctx.stats
+
+    @staticmethod
+    def _run_stage(stage: Stage, cleaner: 'TextCleaner', ctx: StageContext,
+                   deadline: Optional[float]):
+        if deadline is not None and stage.optional:
+            # Degrade instead of running over the cap: skip or abandon optional stages
+            if time.thread_time() >= deadline:
+                ctx.stats['cpu_cap_exceeded'] = 1
+                ctx.stats['cpu_cap_skipped_stages'] += 1
+                return
+            try:
+                stage.run(cleaner, ctx)
+            except WorkLimitExceeded:
+                ctx.stats['cpu_cap_exceeded'] = 1
+                ctx.stats['cpu_cap_skipped_stages'] += 1
+            return
+        stage.run(cleaner, ctx)
+
+
+class TextCleaner:
+    """
+    Cleaning engine: options, stage plans and the text transformations.
+
+    A TextCleaner holds no per-run state, so one instance can be shared by
+    any number of threads once its options and custom stages are set up:
+    every call works on its own StageContext and returns its results
+    (see clean and CleanResult). Run totals, logging and file handling
+    live in DocStripper and RunAccumulator.
+    """
 
     # Configuration constants
     REPEATING_HEADER_THRESHOLD = 0.7  # 70% of pages must have same header/footer
@@ -26,7 +1010,6 @@ class DocStripper:
     MIN_TABLE_CONSECUTIVE_LINES = 3  # Minimum consecutive lines to detect table
     TABLE_MIN_SPACE_COLUMNS = 2  # Minimum space-separated columns for table detection
     TABLE_POSITION_TOLERANCE = 2  # Character position tolerance for table column alignment
-    PDF_EXTRACTION_TIMEOUT = 30  # Timeout in seconds for PDF extraction
 
     # Patterns for common headers/footers
     HEADER_PATTERNS = [
@@ -43,184 +1026,219 @@ class DocStripper:
         r'^FOR\s+INTERNAL\s+USE$',
     ]
 
-    # Pre-compile combined pattern for performance
+    # Unicode normalization by stats category: typographic punctuation and the
+    # layout characters pdftotext leaves behind. Letters are never touched
+    # (joiners ZWJ/ZWNJ stay: they matter in several scripts).
+    UNICODE_NORMALIZATION: Dict[str, Dict[str, str]] = {
+        'unicode_quotes': {
+            '\u201C': '"', '\u201D': '"', '\u201E': '"', '\u201F': '"',  # Double quotation marks
+            '\u2018': "'", '\u2019': "'", '\u201A': "'", '\u201B': "'",  # Single quotation marks
+        },
+        'unicode_dashes': {
+            '\u2010': '-', '\u2011': '-', '\u2012': '-',  # Hyphen, non-breaking hyphen, figure dash
+            '\u2013': '-', '\u2014': '-', '\u2015': '-',  # En dash, em dash, horizontal bar
+            '\u2212': '-',                                # Minus sign
+        },
+        'unicode_ellipsis': {'\u2026': '...'},
+        'unicode_ligatures': {
+            '\uFB00': 'ff', '\uFB01': 'fi', '\uFB02': 'fl', '\uFB03': 'ffi', '\uFB04': 'ffl',
+            '\uFB05': 'st', '\uFB06': 'st',
+        },
+        'unicode_spaces': {  # No-break, en/em/thin/hair, narrow no-break, math and ideographic spaces
+            ch: ' ' for ch in '\u00A0\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200A'
+                              '\u202F\u205F\u3000'
+        },
+        'unicode_zero_width': {'\u200B': '', '\u2060': '', '\uFEFF': ''},  # ZW space, word joiner, BOM
+        'unicode_soft_hyphens': {'\u00AD': ''},
+        'unicode_fullwidth': {  # Full-width ASCII punctuation (full-width letters and digits are left)
+            chr(cp): chr(cp - 0xFEE0) for cp in range(0xFF01, 0xFF5F) if not chr(cp - 0xFEE0).isalnum()
+        },
+    }
+    # Flat replacement map, also used by OffsetMap to align replaced characters
+    UNICODE_PUNCTUATION_MAP = {ch: rep for table in UNICODE_NORMALIZATION.values() for ch, rep in table.items()}
+    UNICODE_STAT_KEYS = tuple(UNICODE_NORMALIZATION) + ('unicode_nfkc',)
+    _UNICODE_CATEGORY = {ch: key for key, table in UNICODE_NORMALIZATION.items() for ch in table}
+
+    # No line matched by HEADER_PATTERNS has more whitespace-separated tokens than this
+    MAX_HEADER_TOKENS = 8
+
+    # Gutter between table columns: two or more spaces
+    _GUTTER_PATTERN = _LazyPattern(r' {2,}')
+
+    # "Page X" or "Page X of Y": a page boundary for detect_pages
+    _PAGE_MARKER = _LazyPattern(r'^Page\s+\d+(\s+of\s+\d+)?$', re.IGNORECASE)
+
+    # Whitespace normalize_whitespace changes besides runs of spaces: ASCII controls, then any
+    _ASCII_WHITESPACE_CONTROLS = '\t\r\f\v\x1c\x1d\x1e\x1f'
+    _OTHER_WHITESPACE = _LazyPattern(r'[^\S \n]')
+    # A line FilterStage drops on its own (empty or punctuation-only of any length; with
+    # header removal also a page number or header/footer), searched in '\n' + text + '\n':
+    # the leading literal lets the regex engine skip to each line start
+    _FILTERED_LINE = _LazyPattern(r'\n[^\S\n]*[^\w\s]*[^\S\n]*(?=\n)')
+    _FILTERED_HEADER_LINE = _LazyPattern(
+        r'\n[^\S\n]*(?:[^\w\s]*|\d+|' + '|'.join(p.strip('^$') for p in HEADER_PATTERNS) + r')[^\S\n]*(?=\n)',
+        re.IGNORECASE
+    )
+
+    # Combined pattern, compiled on first use so importing the module stays cheap
     # Strip ^ and $ from individual patterns and wrap the alternation in ^(?: ... )$
-    _COMBINED_HEADER_PATTERN = re.compile(
+    _COMBINED_HEADER_PATTERN = _LazyPattern(
         r'^(?:' + '|'.join(p.strip('^$') for p in HEADER_PATTERNS) + r')$',
         re.IGNORECASE
     )
     
-    def __init__(self, dry_run: bool = False,
-                 merge_lines: bool = True,
+    def __init__(self, merge_lines: bool = True,
                  dehyphenate: bool = True,
                  normalize_ws: bool = True,
                  normalize_unicode: bool = True,
                  remove_headers: bool = True,
-                 stdout: bool = False):
-        self.dry_run = dry_run
+                 max_cpu_seconds: Optional[float] = None,
+                 lexicon: Optional[Lexicon] = None,
+                 unicode_nfkc: bool = False):
         self.merge_lines_opt = merge_lines
         self.dehyphenate_opt = dehyphenate
         self.normalize_ws_opt = normalize_ws
         self.normalize_unicode_opt = normalize_unicode
+        # Also apply NFKC compatibility normalization in the Unicode stage
+        self.unicode_nfkc_opt = unicode_nfkc
         self.remove_headers_opt = remove_headers
-        self.stdout_opt = stdout
-        self.log_file = Path('.strip-log')
-        self.stats = {
-            'files_processed': 0,
-            'lines_removed': 0,
-            'duplicates_collapsed': 0,
-            'empty_lines_removed': 0,
-            'header_footer_removed': 0,
-            'punctuation_lines_removed': 0,
-            'dehyphenated_tokens': 0,
-            'repeating_headers_footers_removed': 0,
-            'merged_lines': 0,
-        }
-        self.undo_data = []
-    
-    def extract_text_from_pdf(self, file_path: Path) -> Optional[str]:
-        """Extract text from PDF using pdftotext if available."""
-        if shutil.which('pdftotext'):
-            try:
-                result = subprocess.run(
-                    ['pdftotext', '-layout', str(file_path), '-'],
-                    capture_output=True,
-                    text=True,
-                    timeout=self.PDF_EXTRACTION_TIMEOUT
-                )
-                if result.returncode == 0:
-                    return result.stdout
-            except (subprocess.TimeoutExpired, FileNotFoundError):
-                pass
-        
-        # Fallback: try antiword-style approach or return None
-        print(f"Warning: Could not extract text from PDF {file_path}. "
-              f"Install pdftotext (poppler-utils) for PDF support.", file=sys.stderr)
-        return None
-    
-    def extract_text_from_docx(self, file_path: Path) -> Optional[str]:
-        """Extract text from DOCX using basic XML parsing (stdlib only)."""
-        try:
-            import xml.etree.ElementTree as ET
-            import zipfile
-
-            with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                # Security: Validate ZIP file structure to prevent zip slip attacks
-                for zip_info in zip_ref.infolist():
-                    # Check for directory traversal attempts
-                    if zip_info.filename.startswith('/') or '..' in zip_info.filename:
-                        print(f"Warning: Potentially malicious DOCX file {file_path}: "
-                              f"invalid path '{zip_info.filename}'", file=sys.stderr)
-                        return None
-
-                # Read main document XML
-                xml_content = zip_ref.read('word/document.xml')
-                root = ET.fromstring(xml_content)
+        # Per-file CPU-time cap (thread CPU time); optional stages are skipped past it
+        self.max_cpu_seconds = max_cpu_seconds
+        # Word list that decides whether a line-end hyphen is joined, kept or left alone
+        self.lexicon = lexicon
+        # Registered custom stages and compiled plans per option set
+        self._custom_stages: List[Tuple[Stage, Optional[str], Optional[str]]] = []
+        self._plans: Dict[CleaningOptions, PipelinePlan] = {}
 
-                # Extract text from all text nodes
-                # DOCX uses namespace, we'll handle it simply
-                ns = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
-                text_parts = []
+    # ASCII characters matched by [^\w\s]: str.strip(_ASCII_PUNCTUATION) answers that regex for ASCII text
+    _ASCII_PUNCTUATION = ''.join(ch for ch in map(chr, range(128))
+                                 if not (ch.isalnum() or ch == '_' or ch.isspace()))
 
-                for elem in root.iter():
-                    if elem.tag.endswith('}t'):  # text element
-                        if elem.text:
-                            text_parts.append(elem.text)
+    def is_page_number(self, line: str) -> bool:
+        """
+        Check if line contains only numbers (page markers).
 
-                return '\n'.join(text_parts)
-        except zipfile.BadZipFile as e:
-            print(f"Warning: Invalid DOCX file {file_path}: {e}", file=sys.stderr)
-            return None
-        except KeyError as e:
-            print(f"Warning: DOCX file {file_path} missing required component: {e}", file=sys.stderr)
-            return None
-        except ET.ParseError as e:
-            print(f"Warning: Could not parse XML in DOCX {file_path}: {e}", file=sys.stderr)
-            return None
-        except Exception as e:
-            print(f"Warning: Unexpected error extracting text from DOCX {file_path}: {e}", file=sys.stderr)
-            return None
-    
-    def read_text_file(self, file_path: Path) -> Optional[str]:
-        """Read text from various file formats."""
-        suffix = file_path.suffix.lower()
-        
-        if suffix == '.txt':
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return f.read()
-            except UnicodeDecodeError:
-                try:
-                    with open(file_path, 'r', encoding='latin-1') as f:
-                        return f.read()
-                except (OSError, IOError) as e:
-                    print(f"Error reading {file_path}: {e}", file=sys.stderr)
-                    return None
-            except (OSError, IOError, PermissionError) as e:
-                print(f"Error reading {file_path}: {e}", file=sys.stderr)
-                return None
-        
-        elif suffix == '.pdf':
-            return self.extract_text_from_pdf(file_path)
-        
-        elif suffix == '.docx':
-            return self.extract_text_from_docx(file_path)
-        
-        else:
-            print(f"Unsupported file type: {suffix}", file=sys.stderr)
-            return None
-    
-    def is_page_number(self, line: str) -> bool:
-        """Check if line contains only numbers (page markers)."""
-        stripped = line.strip()
-        if not stripped:
-            return False
-        # Check if it's only digits (possibly with spaces or punctuation)
-        return bool(re.match(r'^\s*\d+\s*$', stripped))
+        The predicates called per line (is_page_number, is_punctuation_only,
+        is_list_marker) answer ASCII lines with str methods, which agree
+        with their regexes on ASCII (str.isascii() is O(1) in CPython), and
+        use the regexes otherwise.
+        """
+        stripped = line.strip()
+        if not stripped:
+            return False
+        if stripped.isascii():
+            return stripped.isdigit()
+        # Check if it's only digits (possibly with spaces or punctuation)
+        return bool(re.match(r'^\s*\d+\s*$', stripped))
     
     def is_punctuation_only(self, line: str) -> bool:
         """Check if line contains only punctuation characters."""
         stripped = line.strip()
         if not stripped:
             return False
+        if stripped.isascii():
+            # The only ASCII bullet, '*', is punctuation too
+            return len(stripped) <= 50 and not stripped.strip(self._ASCII_PUNCTUATION)
         
         # Single bullet artifacts: •, *, ·, etc.
         if re.match(r'^\s*[\u2022•·*]\s*$', stripped):
             return True
         
         # Lines with only punctuation: ---, ***, ===, etc.
-        # Match non-word, non-space characters, max 50 chars
-        return bool(re.match(r'^[^\w\s]+$', stripped)) and len(stripped) <= 50
+        # Match non-word, non-space characters, max 50 chars (length first: it is O(1))
+        return len(stripped) <= 50 and bool(re.match(r'^[^\w\s]+$', stripped))
     
     def is_header_footer(self, line: str) -> bool:
         """Check if line matches common header/footer patterns."""
         stripped = line.strip()
         return bool(self._COMBINED_HEADER_PATTERN.match(stripped))
     
-    def dehyphenate_text(self, text: str) -> Tuple[str, int]:
-        """Remove hyphenation across line breaks. Only applies to lowercase continuation."""
+    def dehyphenate_text(self, text: str, joins: Optional[List[int]] = None) -> Tuple[str, int]:
+        """
+        Remove hyphenation across line breaks. Only applies to lowercase continuation.
+
+        If joins is given, the index of every line appended to its predecessor
+        is added to it (used for edit-script provenance).
+        """
         if not text:
             return text, 0
         
-        # Count matches before replacement
-        matches = re.findall(r'-\n([a-z]{1,})', text)
-        tokens_fixed = len(matches)
-        
-        # Replace "-\n[a-z]" with just the lowercase part (safe dehyphenation)
-        dehyphenated = re.sub(r'-\n([a-z]{1,})', r'\1', text)
+        if joins is None:
+            # Replace "-\n[a-z]" with just the lowercase part (safe dehyphenation)
+            return re.subn(r'-\n([a-z]{1,})', r'\1', text)
         
+        dehyphenated, tokens_fixed, _ = self._dehyphenate_scan(text, None, joins)
         return dehyphenated, tokens_fixed
     
-    def detect_pages(self, text: str) -> List[int]:
-        """Detect page boundaries. Returns list of line indices where pages start."""
-        lines = text.split('\n')
+    def dehyphenate_with_lexicon(self, text: str, joins: Optional[List[int]] = None) -> Tuple[str, int, int]:
+        """
+        Dehyphenate, letting self.lexicon decide each line-end hyphen.
+
+        If the joined word is in the lexicon the halves are joined; if the
+        hyphenated form (or both halves) is, the line break is removed but
+        the hyphen kept ("self-\nemployed" -> "self-employed"); otherwise
+        the text is left as it is. Returns (text, joined, kept). Without a
+        lexicon this is dehyphenate_text.
+        """
+        if self.lexicon is None or not text:
+            dehyphenated, tokens_fixed = self.dehyphenate_text(text, joins)
+            return dehyphenated, tokens_fixed, 0
+        return self._dehyphenate_scan(text, self.lexicon, joins)
+    
+    _LINE_END_HYPHEN = _LazyPattern(r'-\n([a-z]{1,})')
+    _LETTER = _LazyPattern(r'[^\W\d_]')
+
+    def _dehyphenate_scan(self, text: str, lexicon: Optional[Lexicon],
+                          joins: Optional[List[int]]) -> Tuple[str, int, int]:
+        """Single regex pass deciding, counting and locating every join."""
+        joined = kept = 0
+        line_no = counted = 0
+        pieces: List[str] = []
+        last = 0  # End of the previous match: the left word never reaches back past it
+        is_letter = self._LETTER.match
+        for match in self._LINE_END_HYPHEN.finditer(text):
+            # Found by scanning back rather than by the pattern: a letter run the
+            # pattern has to re-match from each of its positions costs O(run length ** 2)
+            start = match.start()
+            while start > last and is_letter(text, start - 1):
+                start -= 1
+            left, right = text[start:match.start()], match.group(1)
+            if lexicon is None or not left or (left + right) in lexicon:
+                replacement = left + right
+                joined += 1
+            elif (left + '-' + right) in lexicon or (left in lexicon and right in lexicon):
+                replacement = left + '-' + right
+                kept += 1
+            else:
+                pieces.append(text[last:match.end()])
+                last = match.end()
+                continue
+            if joins is not None:
+                line_no += text.count('\n', counted, match.start())
+                counted = match.start()
+                joins.append(line_no + 1)
+            pieces.append(text[last:start])
+            pieces.append(replacement)
+            last = match.end()
+        if not pieces:
+            return text, 0, 0
+        pieces.append(text[last:])
+        return ''.join(pieces), joined, kept
+    
+    def detect_pages(self, text: str, document: Optional[Document] = None) -> List[int]:
+        """
+        Detect page boundaries. Returns list of line indices where pages start.
+
+        Pass a Document of text to scan its lines without splitting the text again.
+        """
+        document = document or Document(text)
         
         # First try: split by form-feed
         if '\f' in text:
             boundaries = []
             
             # Check for form-feeds within lines
-            for i, line in enumerate(lines):
+            for i, line in enumerate(document.iter_lines()):
                 if '\f' in line:
                     # This line contains a form-feed, so it's a boundary
                     boundaries.append(i)
@@ -239,10 +1257,10 @@ class DocStripper:
         
         # Second try: detect "Page X of Y" patterns as page boundaries
         page_markers = []
-        for i, line in enumerate(lines):
+        for i, line in enumerate(document.iter_lines()):
             stripped = line.strip()
             # Match "Page X of Y" or "Page X" patterns
-            if re.match(r'^Page\s+\d+(\s+of\s+\d+)?$', stripped, re.IGNORECASE):
+            if self._PAGE_MARKER.match(stripped):
                 page_markers.append(i)
         
         if len(page_markers) > 1:
@@ -253,7 +1271,7 @@ class DocStripper:
         boundaries = []
         consecutive_empty = 0
         
-        for i, line in enumerate(lines):
+        for i, line in enumerate(document.iter_lines()):
             if not line.strip():
                 consecutive_empty += 1
             else:
@@ -263,9 +1281,10 @@ class DocStripper:
         
         return boundaries
     
-    def detect_repeating_headers_footers(self, text: str, pages: List[int]) -> Set[str]:
+    def detect_repeating_headers_footers(self, text: str, pages: List[int],
+                                         document: Optional[Document] = None) -> Set[str]:
         """Detect headers/footers that repeat across pages."""
-        lines = text.split('\n')
+        document = document or Document(text)
         first_lines = []
         last_lines = []
 
@@ -278,18 +1297,18 @@ class DocStripper:
             return set()
 
         for i in range(len(pages) + 1):
-            end_idx = pages[i] if i < len(pages) else len(lines)
+            end_idx = pages[i] if i < len(pages) else len(document)
 
             # Find first non-empty line in this page (skip known header/footer patterns)
             for j in range(start_idx, end_idx):
-                stripped = lines[j].strip()
+                stripped = document.line(j).strip()
                 if stripped and not self.is_header_footer(stripped) and not self.is_page_number(stripped):
                     first_lines.append(stripped)
                     break
 
             # Find last non-empty line in this page (skip known header/footer patterns)
             for j in range(end_idx - 1, start_idx - 1, -1):
-                stripped = lines[j].strip()
+                stripped = document.line(j).strip()
                 if stripped and not self.is_header_footer(stripped) and not self.is_page_number(stripped):
                     last_lines.append(stripped)
                     break
@@ -298,9 +1317,11 @@ class DocStripper:
 
         # Count frequency of each line
         from collections import Counter
-        first_line_counts = Counter(first_lines)
-        last_line_counts = Counter(last_lines)
+        return self.repeating_from_counts(Counter(first_lines), Counter(last_lines), total_pages)
 
+    def repeating_from_counts(self, first_line_counts: Dict[str, int], last_line_counts: Dict[str, int],
+                              total_pages: int) -> Set[str]:
+        """Lines that start or end enough of total_pages pages to count as headers/footers."""
         # Find lines that appear in threshold % of pages
         threshold = max(1, int(total_pages * self.REPEATING_HEADER_THRESHOLD))
         to_remove = set()
@@ -320,6 +1341,12 @@ class DocStripper:
     def is_list_marker(self, line: str) -> bool:
         """Check if line starts with a list marker."""
         stripped = line.strip()
+        if stripped.isascii():
+            if stripped[:1] in ('-', '*'):
+                return stripped[1:2].isspace()
+            digits = len(stripped) - len(stripped.lstrip('0123456789'))
+            return (digits > 0 and stripped[digits:digits + 1] in ('.', ')')
+                    and stripped[digits + 1:digits + 2].isspace())
         # Bullet lists: - , • , * , · 
         if re.match(r'^\s*([-•*·])\s+', stripped):
             return True
@@ -328,119 +1355,178 @@ class DocStripper:
             return True
         return False
     
-    def detect_table_block(self, lines: List[str], start_idx: int) -> Tuple[bool, int]:
+    def _table_runs(self, lines: List[str], start: int, stop: int):
         """
-        Detect table-like blocks based on consistent spacing patterns.
-
-        A table is detected when we find consecutive lines with:
-        - Multiple space-separated columns (runs of 2+ spaces)
-        - Similar column positions across lines (within tolerance)
-        - Minimum number of consecutive matching lines
+        Yield (run_start, run_end, is_table) for runs of table-candidate lines.
 
-        Returns: (is_table, end_index)
+        A candidate line is non-empty and has at least TABLE_MIN_SPACE_COLUMNS
+        gutters (runs of 2+ spaces). Each line's gutter start positions are
+        packed into an int bitmask; a row is aligned with the row above when
+        at least TABLE_MIN_SPACE_COLUMNS of the row-above gutters have a gutter
+        within TABLE_POSITION_TOLERANCE (a shift-OR dilation plus an AND).
+        Comparing neighbours rather than the first row keeps a ragged header
+        row from hiding the table. A run is a table when it has at least
+        MIN_TABLE_CONSECUTIVE_LINES rows and MIN_TABLE_CONSECUTIVE_LINES - 1
+        aligned rows. Every line is examined once.
         """
-        if start_idx >= len(lines) - 2:
-            return False, start_idx
-
-        check_lines = lines[start_idx:min(start_idx + 10, len(lines))]
-        consecutive_table_lines = 0
-        space_patterns = []
+        tolerance = self.TABLE_POSITION_TOLERANCE
+        min_columns = self.TABLE_MIN_SPACE_COLUMNS
+        min_rows = self.MIN_TABLE_CONSECUTIVE_LINES
+        gutter_re = self._GUTTER_PATTERN
 
-        # Step 1: Find lines with multiple space columns
-        for line in check_lines:
-            if not line.strip():
-                break  # Empty line breaks table pattern
+        run_start = -1
+        aligned = 0
+        prev_mask = 0
+        for i in range(start, stop):
+            line = lines[i]
+            if '  ' in line and not line.isspace():
+                starts = [m.start() for m in gutter_re.finditer(line)]
+            else:
+                starts = []
+            if len(starts) < min_columns:
+                if run_start >= 0:
+                    yield run_start, i, i - run_start >= min_rows and aligned >= min_rows - 1
+                    run_start = -1
+                continue
 
-            # Find positions of space columns (2+ consecutive spaces)
-            matches = []
-            for match in re.finditer(r' {2,}', line):
-                matches.append(match.start())
+            bits = bytearray((starts[-1] >> 3) + 1)
+            for pos in starts:
+                bits[pos >> 3] |= 1 << (pos & 7)
+            mask = int.from_bytes(bits, 'little')
 
-            # Line must have minimum number of space columns
-            if len(matches) >= self.TABLE_MIN_SPACE_COLUMNS:
-                space_patterns.append(matches)
-                consecutive_table_lines += 1
+            if run_start < 0:
+                run_start = i
+                aligned = 0
             else:
-                break
+                dilated = mask
+                for shift in range(1, tolerance + 1):
+                    dilated |= (mask << shift) | (mask >> shift)
+                if bin(prev_mask & dilated).count('1') >= min_columns:
+                    aligned += 1
+            prev_mask = mask
+
+        if run_start >= 0:
+            yield run_start, stop, stop - run_start >= min_rows and aligned >= min_rows - 1
 
-        # Step 2: Check if we have enough consecutive lines to be a table
-        if consecutive_table_lines >= self.MIN_TABLE_CONSECUTIVE_LINES:
-            # Step 3: Verify that space positions align across lines
-            similar_positions = 0
-            if len(space_patterns) >= self.MIN_TABLE_CONSECUTIVE_LINES:
-                first_pattern = space_patterns[0]
-                for i in range(1, len(space_patterns)):
-                    pattern = space_patterns[i]
-                    # Check if minimum number of column positions match (within tolerance)
-                    matches = 0
-                    for pos in first_pattern:
-                        for pos2 in pattern:
-                            if abs(pos - pos2) <= self.TABLE_POSITION_TOLERANCE:
-                                matches += 1
-                                break
-                    if matches >= self.TABLE_MIN_SPACE_COLUMNS:
-                        similar_positions += 1
-
-            # Need at least 2 lines with matching patterns
-            if similar_positions >= self.TABLE_MIN_SPACE_COLUMNS:
-                return True, start_idx + consecutive_table_lines
+    def detect_table_lines(self, lines: List[str]) -> bytearray:
+        """Return a per-line flag array: 1 for lines inside a table block."""
+        flags = bytearray(len(lines))
+        for run_start, run_end, is_table in self._table_runs(lines, 0, len(lines)):
+            if is_table:
+                flags[run_start:run_end] = b'\x01' * (run_end - run_start)
+        return flags
 
+    def detect_table_block(self, lines: List[str], start_idx: int) -> Tuple[bool, int]:
+        """
+        Detect a table-like block starting at start_idx.
+
+        Looks at the run of candidate lines beginning at start_idx, however
+        long; see _table_runs for the alignment rule. Prefer
+        detect_table_lines to classify a whole document in one sweep.
+
+        Returns: (is_table, end_index)
+        """
+        for run_start, run_end, is_table in self._table_runs(lines, start_idx, len(lines)):
+            if run_start == start_idx and is_table:
+                return True, run_end
+            break
         return False, start_idx
     
-    def merge_broken_lines(self, text: str, enabled: bool = False) -> Tuple[str, int]:
-        """Merge broken lines mid-sentence, protecting lists."""
+    def merge_broken_lines(self, text: str, enabled: bool = False,
+                           joins: Optional[List[int]] = None,
+                           deadline: Optional[float] = None) -> Tuple[str, int]:
+        """
+        Merge broken lines mid-sentence, protecting lists.
+
+        Once a line joins the line being built, it is kept as a list of
+        fragments and joined once; unmerged lines are copied as they are. The
+        merge checks are answered from state carried forward: whether the
+        built line ends a sentence depends only on its last line, and once it
+        has more than MAX_HEADER_TOKENS tokens it can no longer be a header,
+        footer or page number. Each input line is examined a bounded number of times, so
+        a paragraph of any length merges in linear time.
+
+        If joins is given, the index of every line merged into its predecessor
+        is added to it (used for edit-script provenance). If time.thread_time()
+        passes deadline, WorkLimitExceeded is raised and nothing is merged.
+        """
         if not enabled or not text:
             return text, 0
         
         lines = text.split('\n')
-        merged_lines = []
+        last = len(lines) - 1
+        merged_lines: List[str] = []
         lines_merged = 0
-        table_block_end = -1
+        in_table = self.detect_table_lines(lines)
+        
+        # State of the line being built: merged_lines[-1], or fragments once a line joins it
+        fragments: List[str] = []
+        blank = False
+        ends_sentence = False
+        tokens = 0  # counted from its first merge
+        is_header: Optional[bool] = None  # None until needed
         
         for i in range(len(lines)):
-            # Check if we're in a table block
-            if i >= table_block_end:
-                is_table, end_idx = self.detect_table_block(lines, i)
-                if is_table:
-                    table_block_end = end_idx
+            if deadline is not None and not i & 31 and time.thread_time() >= deadline:
+                raise WorkLimitExceeded(f"merge stopped at line {i} of {len(lines)}")
             
-            # Skip merge if in table block
-            if i < table_block_end:
-                merged_lines.append(lines[i])
+            current_line = lines[i]
+            if in_table[i] and i < last and in_table[i + 1]:
+                # Inside a table block nothing merges, so only a block's last row needs merge state
+                if fragments:
+                    merged_lines[-1] = ' '.join(fragments)
+                    fragments = []
+                merged_lines.append(current_line)
                 continue
             
-            # Check if we should merge with previous line
-            if merged_lines:
-                prev_line = merged_lines[-1]
-                current_line = lines[i]
-                
-                # Don't merge if previous or current line is empty
-                if not prev_line.strip() or not current_line.strip():
-                    merged_lines.append(current_line)
-                    continue
-                
+            # Check if we should merge with previous line (never a table row into anything; a text
+            # line after a table block may still join the block's last row, as the original loop did)
+            current_stripped = current_line.strip()
+            if merged_lines and not in_table[i]:
                 # Merge conditions:
-                # 1. Previous line doesn't end with [.!?]
-                # 2. Current line doesn't start with list marker
-                # 3. Next line (if exists) doesn't start with list marker
-                # 4. Don't merge if previous or current line is a header/footer/page number
-                
-                prev_ends_with_punct = bool(re.search(r'[.!?]\s*$', prev_line))
-                next_is_list = (i < len(lines) - 1 and 
-                               lines[i + 1].strip() and 
-                               self.is_list_marker(lines[i + 1]))
-                current_is_list = current_line.strip() and self.is_list_marker(current_line)
-                prev_is_header = self.is_header_footer(prev_line.strip()) or self.is_page_number(prev_line.strip())
-                current_is_header = self.is_header_footer(current_line.strip()) or self.is_page_number(current_line.strip())
-                
-                if not prev_ends_with_punct and not current_is_list and not next_is_list and not prev_is_header and not current_is_header:
-                    # Merge: remove newline, add space
-                    merged_lines[-1] = prev_line.rstrip() + ' ' + current_line.lstrip()
-                    lines_merged += 1
-                    continue
+                # 1. Neither line is empty
+                # 2. Previous line doesn't end with [.!?]
+                # 3. Current line doesn't start with list marker
+                # 4. Next line (if exists) doesn't start with list marker
+                # 5. Don't merge if previous or current line is a header/footer/page number
+                if not blank and current_stripped and not ends_sentence:
+                    next_is_list = (i < last and
+                                    lines[i + 1].strip() and
+                                    self.is_list_marker(lines[i + 1]))
+                    if is_header is None:
+                        built = (' '.join(fragments) if fragments else merged_lines[-1]).strip()
+                        is_header = self.is_header_footer(built) or self.is_page_number(built)
+                    
+                    if (not next_is_list and not is_header
+                            and not self.is_list_marker(current_line)
+                            and not self.is_header_footer(current_stripped)
+                            and not self.is_page_number(current_stripped)):
+                        # Merge: remove newline, add space
+                        if fragments:
+                            fragments[-1] = fragments[-1].rstrip()
+                        else:
+                            fragments = [merged_lines[-1].rstrip()]
+                            tokens = len(fragments[0].split())
+                        fragments.append(current_line.lstrip())
+                        ends_sentence = current_stripped[-1] in '.!?'
+                        tokens += len(current_stripped.split())
+                        is_header = False if tokens > self.MAX_HEADER_TOKENS else None
+                        lines_merged += 1
+                        if joins is not None:
+                            joins.append(i)
+                        continue
             
-            merged_lines.append(lines[i])
+            # Start a new line
+            if fragments:
+                merged_lines[-1] = ' '.join(fragments)
+                fragments = []
+            merged_lines.append(current_line)
+            blank = not current_stripped
+            ends_sentence = not blank and current_stripped[-1] in '.!?'
+            is_header = None
         
+        if fragments:
+            merged_lines[-1] = ' '.join(fragments)
         return '\n'.join(merged_lines), lines_merged
     
     def normalize_whitespace(self, text: str, enabled: bool = False, skip_table_blocks: bool = True) -> Tuple[str, bool]:
@@ -450,22 +1536,23 @@ class DocStripper:
         
         lines = text.split('\n')
         normalized_lines = []
-        table_block_end = -1
-        
+        in_table = self.detect_table_lines(lines) if skip_table_blocks else bytearray(len(lines))
         for i in range(len(lines)):
             line = lines[i]
             
-            # Check if we're in a table block
-            if skip_table_blocks and i >= table_block_end:
-                is_table, end_idx = self.detect_table_block(lines, i)
-                if is_table:
-                    table_block_end = end_idx
-            
             # Skip normalization if in table block
-            if skip_table_blocks and i < table_block_end:
+            if in_table[i]:
                 normalized_lines.append(line)
                 continue
             
+            if line.isascii():
+                # str.split() splits on exactly the characters \s matches in ASCII text
+                words = line.split()
+                if words and line[0].isspace():
+                    words.insert(0, '')
+                normalized_lines.append(' '.join(words))
+                continue
+            
             # Normalize whitespace
             # Collapse multiple spaces to single space
             line = re.sub(r'\s+', ' ', line)
@@ -478,237 +1565,1702 @@ class DocStripper:
         
         return '\n'.join(normalized_lines), True
     
-    def normalize_unicode_punctuation(self, text: str, enabled: bool = False) -> Tuple[str, bool]:
-        """Normalize Unicode punctuation to ASCII (limited, only punctuation)."""
-        if not enabled or not text:
+    def normalize_unicode_punctuation(self, text: str, enabled: bool = False,
+                                      counts: Optional[Dict[str, int]] = None, nfkc: bool = False) -> Tuple[str, bool]:
+        """
+        Normalize Unicode punctuation, ligatures and layout characters (see UNICODE_NORMALIZATION).
+
+        Every mapped character is non-ASCII, so ASCII text returns at once.
+        Otherwise each character is counted and only those present are
+        replaced: str.count/str.replace skip characters wider than the
+        string's storage without scanning, and measure faster than a
+        translate table or a regex scan. If counts is given, per-category
+        totals are added to it under the category keys. With nfkc, the
+        result is also NFKC-normalized and the characters that changed are
+        counted as 'unicode_nfkc'.
+        """
+        if not enabled or not text or text.isascii():
             return text, False
         
-        # Limited Unicode normalization: only common punctuation
-        unicode_map = {
-            '\u201C': '"',  # Left double quotation mark
-            '\u201D': '"',   # Right double quotation mark
-            '\u2018': "'",   # Left single quotation mark
-            '\u2019': "'",   # Right single quotation mark
-            '\u2013': '-',   # En dash
-            '\u2014': '-',   # Em dash
-            '\u2026': '...', # Horizontal ellipsis
-        }
-        
         normalized = text
-        replacements = 0
-        
-        for unicode_char, ascii_char in unicode_map.items():
+        changed = False
+        category = self._UNICODE_CATEGORY
+        for unicode_char, ascii_char in self.UNICODE_PUNCTUATION_MAP.items():
             count = normalized.count(unicode_char)
             if count > 0:
-                replacements += count
+                changed = True
                 normalized = normalized.replace(unicode_char, ascii_char)
+                if counts is not None:
+                    key = category[unicode_char]
+                    counts[key] = counts.get(key, 0) + count
+        
+        if nfkc and not normalized.isascii():
+            import unicodedata
+            composed = unicodedata.normalize('NFKC', normalized)
+            if composed != normalized:
+                changed = True
+                if counts is not None:
+                    # Each distinct character is normalized once, then counted where it occurs
+                    nfkc_count = sum(normalized.count(ch) for ch in set(normalized)
+                                     if ord(ch) > 127 and unicodedata.normalize('NFKC', ch) != ch)
+                    counts['unicode_nfkc'] = counts.get('unicode_nfkc', 0) + nfkc_count
+                normalized = composed
         
-        return normalized, replacements > 0
+        return normalized, changed
+
+    BUILTIN_STAGES = ('dehyphenate', 'merge', 'whitespace', 'unicode', 'pages', 'filters')
+
+    def register_stage(self, stage: Stage, before: Optional[str] = None, after: Optional[str] = None):
+        """
+        Add a custom stage to every plan this instance compiles.
+
+        Position it relative to a built-in stage name (see BUILTIN_STAGES) or
+        an earlier custom stage; by default it runs last, after 'filters'.
+        The anchor is resolved against the full stage order, so it works
+        even when the anchor stage is disabled for a given option set.
+        """
+        if before is not None and after is not None:
+            raise ValueError("Pass either before or after, not both")
+        known = set(self.BUILTIN_STAGES) | {custom.name for custom, _, _ in self._custom_stages}
+        anchor = before or after
+        if anchor is not None and anchor not in known:
+            raise ValueError(f"Unknown stage '{anchor}'; expected one of {sorted(known)}")
+        if stage.name in known:
+            raise ValueError(f"Stage name '{stage.name}' is already in use")
+        self._custom_stages.append((stage, before, after))
+        self._plans.clear()
+
+    def compile_plan(self, options: CleaningOptions) -> PipelinePlan:
+        """Return the cached plan for an option set, compiling it on first use."""
+        plan = self._plans.get(options)
+        if plan is not None:
+            return plan
+
+        # Full order with enabled flags, so anchors resolve even for disabled stages
+        entries: List[Tuple[Stage, bool]] = [
+            (DehyphenateStage(), options.dehyphenate),
+            (MergeStage(), options.merge_lines),
+            (WhitespaceStage(), options.normalize_ws),
+            (UnicodeStage(nfkc=options.unicode_nfkc), options.normalize_unicode),
+            (PageDetectionStage(), options.remove_headers),
+            (FilterStage(remove_headers=options.remove_headers), True),
+        ]
+        for stage, before, after in self._custom_stages:
+            names = [entry.name for entry, _ in entries]
+            if before is not None:
+                position = names.index(before)
+            elif after is not None:
+                position = names.index(after) + 1
+            else:
+                position = len(entries)
+            entries.insert(position, (stage, True))
+
+        plan = PipelinePlan([stage for stage, enabled in entries if enabled])
+        self._plans[options] = plan
+        return plan
 
     def clean_text(self, text: str,
                    merge_lines: bool = False,
                    normalize_ws: bool = False,
                    normalize_unicode: bool = False,
                    dehyphenate: bool = False,
-                   remove_headers: bool = True) -> Tuple[str, dict]:
-        """Clean text by removing noise."""
+                   remove_headers: bool = True,
+                   edits: Optional[EditScript] = None,
+                   max_cpu_seconds: Optional[float] = None,
+                   memo: Optional[dict] = None,
+                   unicode_nfkc: bool = False,
+                   headers: Optional[Iterable[str]] = None) -> Tuple[str, dict]:
+        """
+        Clean text by removing noise.
+
+        Runs the compiled plan for this option set (see compile_plan). If an
+        EditScript is passed as edits, it is filled with the dropped, merged
+        and dehyphenated line ranges while cleaning. With max_cpu_seconds,
+        optional stages (merge, repeating-header detection) are skipped once
+        that much CPU time is spent, and stats['cpu_cap_exceeded'] is set.
+        Passing the same memo dict to calls on the same text with different
+        options reuses the output of the stages they have in common.
+        headers is an exact set of header/footer lines known from the source
+        format (see DocStripper.read_document); when given, the page-based
+        repeating-header heuristics are skipped and these lines are removed
+        instead, counted as repeating headers/footers.
+        """
         if not text:
             return "", {}
         
-        # Apply dehyphenation first (before line-by-line processing)
-        dehyphenated_tokens = 0
-        if dehyphenate:
-            text, dehyphenated_tokens = self.dehyphenate_text(text)
-        
-        # Apply merge broken lines (before whitespace normalization)
-        text, merged_lines_count = self.merge_broken_lines(text, enabled=merge_lines)
-        
-        # Apply whitespace normalization (with table protection)
-        text, normalized_ws = self.normalize_whitespace(text, enabled=normalize_ws, skip_table_blocks=True)
-        
-        # Apply Unicode punctuation normalization (limited, only punctuation)
-        text, normalized_unicode = self.normalize_unicode_punctuation(text, enabled=normalize_unicode)
-        
-        lines = text.split('\n')
-        cleaned_lines = []
-        prev_line = None
-        local_stats = {
-            'lines_removed': 0,
-            'duplicates_collapsed': 0,
-            'empty_lines_removed': 0,
-            'header_footer_removed': 0,
-            'punctuation_lines_removed': 0,
-            'dehyphenated_tokens': dehyphenated_tokens,
-            'repeating_headers_footers_removed': 0,
-            'merged_lines': merged_lines_count,
+        options = CleaningOptions(merge_lines, normalize_ws, normalize_unicode, dehyphenate, remove_headers,
+                                  unicode_nfkc)
+        deadline = time.thread_time() + max_cpu_seconds if max_cpu_seconds is not None else None
+        if memo is not None and edits is not None:
+            raise ValueError("memo cannot be combined with edit-script recording")
+        return self.compile_plan(options).run(self, text, edits, deadline, memo, headers)
+    
+    def page_lines(self, text: str) -> Tuple[List[str], List[Tuple[int, int]]]:
+        """
+        The lines of text as this instance's plan hands them to page detection.
+
+        Runs the stages before 'pages' (without a CPU cap) and returns their
+        output lines with the original line range behind each.
+        """
+        options = CleaningOptions(**{key: value for key, value in self.cleaning_options().items()
+                                     if key in CleaningOptions._fields})
+        ctx = StageContext(text, EditScript())
+        for stage in self.compile_plan(options).stages:
+            if stage.name == 'pages':
+                break
+            stage.run(self, ctx)
+        return ctx.lines, ctx.origins or []
+
+    def cleaning_options(self) -> dict:
+        """Return the clean_text keyword arguments for this instance's options."""
+        return {
+            'merge_lines': self.merge_lines_opt,
+            'normalize_ws': self.normalize_ws_opt,
+            'normalize_unicode': self.normalize_unicode_opt,
+            'dehyphenate': self.dehyphenate_opt,
+            'remove_headers': self.remove_headers_opt,
+            'max_cpu_seconds': self.max_cpu_seconds,
+            'unicode_nfkc': self.unicode_nfkc_opt,
         }
+
+    def clean(self, text: str, edits: Optional[EditScript] = None,
+              headers: Optional[Iterable[str]] = None) -> CleanResult:
+        """Clean text with this instance's options; safe to call from several threads at once."""
+        cleaned, stats = self.clean_text(text, edits=edits, headers=headers, **self.cleaning_options())
+        return CleanResult(cleaned, stats or dict.fromkeys(STAT_KEYS, 0), cleaned != text)
+
+    def needs_cleaning(self, text: str, headers: Optional[Iterable[str]] = None) -> bool:
+        """
+        Cheap pre-scan: False only if clean(text, headers=headers) would return text unchanged.
+
+        Whole-text substring and regex searches cover dehyphenation,
+        whitespace, Unicode, form-feed pages and the lines the filters drop;
+        one pass over the lines then checks for duplicates and for the merge
+        condition between neighbours. It errs towards True: a table block
+        keeps its column gutters and is never merged into, a hyphen the
+        lexicon keeps is left, and a punctuation-only line over 50 characters
+        stays, yet all count as work here. Any registered custom stage makes
+        the answer True.
+        """
+        if not text:
+            return False
+        if self._custom_stages:
+            return True
+        if self.dehyphenate_opt and '-\n' in text:
+            return True
+        if self.normalize_ws_opt and ('  ' in text or ' \n' in text or text.endswith(' ')
+                                      or any(ch in text for ch in self._ASCII_WHITESPACE_CONTROLS)
+                                      or not text.isascii() and self._OTHER_WHITESPACE.search(text)):
+            return True
+        if self.normalize_unicode_opt and not text.isascii():
+            if any(ch in text for ch in self.UNICODE_PUNCTUATION_MAP):
+                return True
+            if self.unicode_nfkc_opt:
+                import unicodedata
+                if not unicodedata.is_normalized('NFKC', text):
+                    return True
+        remove_headers = self.remove_headers_opt
+        # Form feeds split pages whose repeating first and last lines are removed; without
+        # them, detect_pages only finds "Page N" markers and blank runs, both filtered lines
+        if remove_headers and headers is None and '\f' in text:
+            return True
+        if (self._FILTERED_HEADER_LINE if remove_headers else self._FILTERED_LINE).search('\n' + text + '\n'):
+            return True
         
-        # Detect repeating headers/footers across pages
-        repeating_headers_footers = set()
-        if remove_headers:
-            page_boundaries = self.detect_pages(text)
-            repeating_headers_footers = self.detect_repeating_headers_footers(text, page_boundaries)
-        
+        known = set(headers) if remove_headers and headers is not None else ()
+        merge = self.merge_lines_opt
+        lines = text.split('\n')
+        last = len(lines) - 1
+        prev_stripped = None
+        for i, line in enumerate(lines):
+            stripped = line.strip()
+            if stripped == prev_stripped or stripped in known:
+                return True
+            # Neither line is empty or a header here, so only list markers stop a merge
+            if (merge and prev_stripped is not None and prev_stripped[-1] not in '.!?'
+                    and not self.is_list_marker(line)
+                    and not (i < last and self.is_list_marker(lines[i + 1]))):
+                return True
+            prev_stripped = stripped
+        return False
+
+    CHUNK_BREAKS = ('paragraph', 'page')
+
+    def chunk(self, text: str, max_chars: int = 2000, overlap: int = 0,
+              break_on: str = 'paragraph') -> Iterator[Chunk]:
+        """Clean text and yield it as chunks for retrieval; see chunk_cleaned."""
+        self.check_chunk_options(max_chars, overlap, break_on)
+        edits = EditScript()
+        cleaned = self.clean(text, edits=edits).text
+        return self.chunk_cleaned(text, cleaned, edits, max_chars, overlap, break_on)
+
+    @classmethod
+    def check_chunk_options(cls, max_chars: int, overlap: int, break_on: str):
+        if max_chars < 1:
+            raise ValueError("max_chars must be at least 1")
+        if not 0 <= overlap < max_chars:
+            raise ValueError("overlap must be at least 0 and less than max_chars")
+        if break_on not in cls.CHUNK_BREAKS:
+            raise ValueError(f"break_on must be one of {', '.join(cls.CHUNK_BREAKS)}, not {break_on!r}")
+
+    def chunk_cleaned(self, text: str, cleaned: str, edits: EditScript, max_chars: int = 2000,
+                      overlap: int = 0, break_on: str = 'paragraph') -> Iterator[Chunk]:
+        """
+        Split already-cleaned text into chunks of at most max_chars characters.
+
+        Cleaned lines are paragraphs (broken lines were merged), so lines are
+        packed whole while they fit; a longer one is cut at its last space
+        before the limit. break_on='page' also ends a chunk wherever the
+        page changes. Each
+        chunk after the first starts with up to overlap characters of its
+        predecessor, from a word start, unless a page break lies between
+        them in page mode. The page of each cleaned line comes from its
+        original line (edits.line_origins) and the page boundaries of the
+        original text. Chunks are yielded one at a time.
+        """
+        import bisect
+        boundaries = self.detect_pages(text)
+        lines = cleaned.split('\n')
+        line_starts = []
+        offset = 0
+        for line in lines:
+            line_starts.append(offset)
+            offset += len(line) + 1
+        pages = [bisect.bisect_right(boundaries, start) + 1 for start, _ in edits.line_origins]
+        pages += [pages[-1] if pages else 1] * (len(lines) - len(pages))
+
+        def page_at(offset):
+            return pages[bisect.bisect_right(line_starts, offset) - 1]
+
+        def pieces():
+            for line, start in zip(lines, line_starts):
+                if not line.strip():
+                    continue
+                end = start + len(line)
+                while end - start > max_chars:
+                    limit = start + max_chars
+                    cut = cleaned.rfind(' ', start + 1, limit + 1)
+                    if cut <= start:
+                        yield start, limit
+                        start = limit
+                    else:
+                        yield start, cut
+                        start = cut + 1
+                if end > start:
+                    yield start, end
+
+        spans = pieces()
+        first = next(spans, None)
+        if first is None:
+            return
+        chunk_index = 0
+        chunk_start, chunk_end = first
+        for start, end in spans:
+            same_page = break_on != 'page' or page_at(start) == page_at(chunk_end - 1)
+            if same_page and end - chunk_start <= max_chars:
+                chunk_end = end
+                continue
+            yield Chunk(chunk_index, cleaned[chunk_start:chunk_end], chunk_start, chunk_end,
+                        page_at(chunk_start), page_at(chunk_end - 1))
+            chunk_index += 1
+            # Overlap plus the separator and the new piece must still fit
+            room = min(overlap, max_chars - (end - chunk_end)) if same_page else 0
+            next_start = start
+            if room > 0:
+                tail = max(chunk_end - room, chunk_start)
+                # Begin the overlap at a word start
+                if tail > chunk_start and not cleaned[tail - 1].isspace():
+                    space = re.compile(r'\s').search(cleaned, tail, chunk_end)
+                    tail = space.end() if space else chunk_end
+                if tail < chunk_end:
+                    next_start = tail
+            chunk_start, chunk_end = next_start, end
+        yield Chunk(chunk_index, cleaned[chunk_start:chunk_end], chunk_start, chunk_end,
+                    page_at(chunk_start), page_at(chunk_end - 1))
+
+
+class RunAccumulator:
+    """
+    Thread-safe totals for one batch run.
+
+    Workers report each file's stats with add() and each in-place write
+    with add_undo(); both take a lock, so any number of threads can share
+    one accumulator. merge() folds in the totals of another run, e.g. one
+    finished in a separate process.
+    """
+
+    # clean_text stats that are summed into the run totals
+    SUMMED_KEYS = (
+        'lines_removed',
+        'duplicates_collapsed',
+        'empty_lines_removed',
+        'header_footer_removed',
+        'punctuation_lines_removed',
+        'dehyphenated_tokens',
+        'hyphens_kept',
+        'repeating_headers_footers_removed',
+        'merged_lines',
+    ) + TextCleaner.UNICODE_STAT_KEYS
+
+    def __init__(self):
+        import threading
+        self.lock = threading.Lock()
+        self.stats = {'files_processed': 0}
+        self.stats.update(dict.fromkeys(self.SUMMED_KEYS, 0))
+        self.stats.update(files_skipped_resume=0, files_streamed=0, files_cpu_capped=0,
+                          files_skipped_clean=0, incremental_bytes=0, incremental_lines=0)
+        self.undo_data: List[dict] = []
+
+    def add(self, stats: dict):
+        """Count one cleaned file and add its stats."""
+        with self.lock:
+            totals = self.stats
+            totals['files_processed'] += 1
+            for key in self.SUMMED_KEYS:
+                totals[key] += stats.get(key, 0)
+            if stats.get('cpu_cap_exceeded'):
+                totals['files_cpu_capped'] += 1
+
+    def count(self, key: str, amount: int = 1):
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + amount
+
+    def add_undo(self, entry: dict):
+        with self.lock:
+            self.undo_data.append(entry)
+
+    def merge(self, stats: dict, undo_data: Iterable[dict] = ()):
+        """Add another run's totals and undo records to this one."""
+        with self.lock:
+            for key, value in stats.items():
+                self.stats[key] = self.stats.get(key, 0) + value
+            self.undo_data.extend(undo_data)
+
+
+# Stdlib compression formats read transparently: name -> (magic bytes pattern, file suffix)
+COMPRESSION_FORMATS = {
+    'gzip': (rb'\x1f\x8b', '.gz'),
+    # "BZh" alone starts plenty of text: require the block size digit and the
+    # first block's (or, for an empty stream, the end-of-stream) signature
+    'bz2': (rb'BZh[1-9](?:1AY&SY|\x17rE8P\x90)', '.bz2'),
+    'xz': (rb'\xfd7zXZ\x00', '.xz'),
+}
+_MAGIC_LENGTH = 10
+
+
+def compression_of(head: bytes) -> Optional[str]:
+    """Name of the compression format the leading bytes of a stream announce, or None."""
+    for name, (magic, _) in COMPRESSION_FORMATS.items():
+        if re.match(magic, head):
+            return name
+    return None
+
+
+def detect_compression(file_path: Path) -> Optional[str]:
+    """Name of the compression format a file's magic bytes announce, or None."""
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(_MAGIC_LENGTH)
+    except OSError:
+        return None
+    return compression_of(head)
+
+
+def open_compressed(file, fmt: str, mode: str = 'rb', level: Optional[int] = None):
+    """Open a path or binary file object through the named compressor; streams in both directions."""
+    if fmt == 'gzip':
+        import gzip
+        return gzip.open(file, mode, compresslevel=9 if level is None else level)
+    if fmt == 'bz2':
+        import bz2
+        return bz2.open(file, mode, compresslevel=9 if level is None else level)
+    if fmt == 'xz':
+        import lzma
+        return lzma.open(file, mode, preset=level)
+    raise ValueError(f"unknown compression format {fmt!r}")
+
+
+def open_decompressed(file_path: Path):
+    """Open a file for binary reading, decompressing it on the fly if it is compressed."""
+    fmt = detect_compression(file_path)
+    return open(file_path, 'rb') if fmt is None else open_compressed(file_path, fmt)
+
+
+class _PageSplit:
+    """Page count and first/last candidate line counts over the pages of one page split."""
+
+    __slots__ = ('pages', 'first_counts', 'last_counts', 'first_found', 'last')
+
+    def __init__(self, pages: int = 1, first_counts: Optional[Dict[str, int]] = None,
+                 last_counts: Optional[Dict[str, int]] = None, first_found: bool = False,
+                 last: Optional[str] = None):
+        self.pages = pages
+        self.first_counts: Dict[str, int] = dict(first_counts or {})
+        self.last_counts: Dict[str, int] = dict(last_counts or {})
+        # Whether the open (last) page has its first candidate line, and its last one so far
+        self.first_found = first_found
+        self.last = last
+
+    def new_page(self):
+        if self.last is not None:
+            self.last_counts[self.last] = self.last_counts.get(self.last, 0) + 1
+        self.pages += 1
+        self.first_found = False
+        self.last = None
+
+    def add(self, stripped: str):
+        """Count a candidate line (non-empty, not a header pattern or page number)."""
+        if not self.first_found:
+            self.first_counts[stripped] = self.first_counts.get(stripped, 0) + 1
+            self.first_found = True
+        self.last = stripped
+
+    def repeating(self, cleaner: 'TextCleaner') -> Set[str]:
+        if self.pages < 2:
+            return set()
+        last_counts = dict(self.last_counts)
+        if self.last is not None:
+            last_counts[self.last] = last_counts.get(self.last, 0) + 1
+        return cleaner.repeating_from_counts(self.first_counts, last_counts, self.pages)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class PageCounts:
+    """
+    Running per-page counts for repeating-header detection, fed lines in order.
+
+    detect_pages splits at form feeds if the text has any, else at "Page N"
+    markers if there are two or more, else after runs of three or more
+    empty lines. Which split applies is only known once the text is
+    complete, so all three are counted and repeating() uses the one
+    detect_pages would pick for the lines added so far. The lines must be
+    those page detection sees: the output of the stages before 'pages'
+    (see TextCleaner.page_lines).
+    """
+
+    SPLITS = ('form_feed', 'markers', 'blank')
+
+    def __init__(self):
+        self.form_feeds = False
+        self.markers = 0
+        self.empty_run = 0
+        self.splits: Dict[str, _PageSplit] = {name: _PageSplit() for name in self.SPLITS}
+
+    def add_lines(self, cleaner: 'TextCleaner', lines: Iterable[str]):
+        splits = self.splits
         for line in lines:
-            original_line = line
             stripped = line.strip()
-            
-            # Skip empty or whitespace-only lines
+            if '\f' in line:
+                self.form_feeds = True
+                splits['form_feed'].new_page()
+            if cleaner._PAGE_MARKER.match(stripped):
+                self.markers += 1
+                # The first marker starts page 1; each later one starts a page
+                if self.markers > 1:
+                    splits['markers'].new_page()
             if not stripped:
-                local_stats['empty_lines_removed'] += 1
-                continue
-            
-            # Skip punctuation-only lines (---, ***, ===, etc.)
-            if self.is_punctuation_only(stripped):
-                local_stats['punctuation_lines_removed'] += 1
-                continue
-            
-            # Skip page numbers
-            if remove_headers and self.is_page_number(stripped):
-                local_stats['header_footer_removed'] += 1
-                continue
-            
-            # Skip headers/footers
-            if remove_headers and self.is_header_footer(stripped):
-                local_stats['header_footer_removed'] += 1
+                self.empty_run += 1
                 continue
-            
-            # Skip repeating headers/footers across pages
-            if remove_headers and stripped in repeating_headers_footers:
-                local_stats['repeating_headers_footers_removed'] += 1
-                continue
-            
-            # Skip consecutive duplicates
-            if prev_line is not None and stripped == prev_line.strip():
-                local_stats['duplicates_collapsed'] += 1
-                continue
-            
-            cleaned_lines.append(line)
-            prev_line = line
-        
-        cleaned_text = '\n'.join(cleaned_lines)
-        local_stats['lines_removed'] = len(lines) - len(cleaned_lines)
+            if self.empty_run >= 3:
+                splits['blank'].new_page()
+            self.empty_run = 0
+            if not cleaner.is_header_footer(stripped) and not cleaner.is_page_number(stripped):
+                for split in splits.values():
+                    split.add(stripped)
+
+    @property
+    def current(self) -> _PageSplit:
+        """The split detect_pages would use on the lines added so far."""
+        if self.form_feeds:
+            return self.splits['form_feed']
+        if self.markers > 1:
+            return self.splits['markers']
+        return self.splits['blank']
+
+    def repeating(self, cleaner: 'TextCleaner') -> Set[str]:
+        return self.current.repeating(cleaner)
+
+    def copy(self) -> 'PageCounts':
+        return self.from_dict(self.to_dict())
+
+    def to_dict(self) -> dict:
+        return {
+            'form_feeds': self.form_feeds,
+            'markers': self.markers,
+            'empty_run': self.empty_run,
+            'splits': {name: split.to_dict() for name, split in self.splits.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'PageCounts':
+        counts = cls()
+        counts.form_feeds = data['form_feeds']
+        counts.markers = data['markers']
+        counts.empty_run = data['empty_run']
+        counts.splits = {name: _PageSplit(**dict(data['splits'][name])) for name in cls.SPLITS}
+        return counts
+
+
+class IncrementalState:
+    """
+    Where incremental cleaning of one append-only file stopped (see
+    DocStripper.process_file_incremental), saved as JSON between runs.
+
+    offset is the number of source bytes consumed, always the end of a
+    complete line; head is a hash of the first HEAD_BYTES of them, so a
+    replaced or truncated source starts over. carry holds the raw lines
+    behind the last output line, which is held back because text appended
+    later may still merge into it; last_line is the last line written, for
+    duplicate collapse across appends; output_size is the length of the
+    output this state describes. pages counts pages and their first and
+    last lines over the text before carry, as page detection sees it.
+    """
+
+    FORMAT_VERSION = 2
+    HEAD_BYTES = 4096
+
+    def __init__(self, options: dict):
+        self.options = options
+        self.offset = 0
+        self.head = ''
+        self.carry: List[str] = []
+        self.last_line: Optional[str] = None
+        self.output_size = 0
+        self.pages = PageCounts()
+
+    def to_dict(self) -> dict:
+        return {
+            'version': self.FORMAT_VERSION,
+            'options': self.options,
+            'offset': self.offset,
+            'head': self.head,
+            'carry': self.carry,
+            'last_line': self.last_line,
+            'output_size': self.output_size,
+            'pages': self.pages.to_dict(),
+        }
+
+    def save(self, path: Path):
+        """Write the state as JSON, replacing the previous file atomically."""
+        import json
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional['IncrementalState']:
+        """Read a state written by save(); None if there is none or it cannot be used."""
+        import json
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.pop('version', None) != cls.FORMAT_VERSION:
+            return None
+        state = cls(data.pop('options', None))
+        try:
+            state.pages = PageCounts.from_dict(data.pop('pages'))
+        except (KeyError, TypeError):
+            return None
+        for key, value in data.items():
+            if hasattr(state, key):
+                setattr(state, key, value)
+        return state
+
+
+class DocStripper(TextCleaner):
+    """
+    Batch document cleaner: file reading and writing, backups, undo log and run totals.
+
+    process_file may be called from several threads at once (see
+    ThreadPoolRunner): totals and undo records go through a RunAccumulator.
+    """
+
+    # Configuration constants
+    PDF_EXTRACTION_TIMEOUT = 30  # Timeout in seconds for PDF extraction
+    MEMORY_AMPLIFICATION = 8  # Peak bytes clean_text holds per input byte (text plus working copies)
+    MIN_STREAM_CHUNK = 16 * 1024  # Smallest chunk, in characters, the streaming path cleans at once
+    COMPRESSION_RATIO = 8  # Assumed text bytes per compressed byte when the format does not record its size
+
+    def __init__(self, dry_run: bool = False,
+                 merge_lines: bool = True,
+                 dehyphenate: bool = True,
+                 normalize_ws: bool = True,
+                 normalize_unicode: bool = True,
+                 remove_headers: bool = True,
+                 stdout: bool = False,
+                 diff: Optional[str] = None,
+                 offset_map: bool = False,
+                 quiet: bool = False,
+                 memory_budget: Optional[int] = None,
+                 profile: bool = False,
+                 max_cpu_seconds: Optional[float] = None,
+                 cpu_cap_action: str = 'degrade',
+                 lexicon: Optional[Lexicon] = None,
+                 unicode_nfkc: bool = False,
+                 compress: Optional[str] = None,
+                 compress_level: Optional[int] = None,
+                 chunk_size: Optional[int] = None,
+                 chunk_overlap: int = 0,
+                 chunk_break: str = 'paragraph',
+                 incremental: bool = False,
+                 incremental_final: bool = False):
+        super().__init__(merge_lines=merge_lines, dehyphenate=dehyphenate, normalize_ws=normalize_ws,
+                         normalize_unicode=normalize_unicode, remove_headers=remove_headers,
+                         max_cpu_seconds=max_cpu_seconds, lexicon=lexicon, unicode_nfkc=unicode_nfkc)
+        self.dry_run = dry_run
+        self.stdout_opt = stdout
+        self.diff_mode = diff  # None, 'unified' or 'annotated'
+        self.offset_map_opt = offset_map
+        # Suppress per-file chatter (--progress and --quiet); errors still go to stderr
+        self.quiet_opt = quiet
+        # Files predicted to need more than this many bytes are cleaned in chunks
+        self.memory_budget = memory_budget
+        # Per-file wall time and tracemalloc peak (--profile)
+        self.profile_opt = profile
+        self.profile_records: List[dict] = []
+        # 'degrade' skips optional stages past the CPU cap, 'abort' leaves the file unchanged
+        if cpu_cap_action not in ('degrade', 'abort'):
+            raise ValueError(f"cpu_cap_action must be 'degrade' or 'abort', not {cpu_cap_action!r}")
+        self.cpu_cap_action = cpu_cap_action
+        # Compression for in-place writes; None keeps each file's own format
+        if compress is not None and compress not in COMPRESSION_FORMATS:
+            raise ValueError(f"compress must be one of {', '.join(COMPRESSION_FORMATS)}, not {compress!r}")
+        self.compress = compress
+        self.compress_level = compress_level
+        # --chunks: emit cleaned files as JSON-lines chunks on stdout instead of writing them
+        if chunk_size is not None:
+            self.check_chunk_options(chunk_size, chunk_overlap, chunk_break)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.chunk_break = chunk_break
+        # --incremental: clean only appended text into FILE.clean.txt; final also writes the held-back tail
+        self.incremental = incremental
+        self.incremental_final = incremental_final
+        self.log_file = Path('.strip-log')
+        # Run totals and undo records; stats and undo_data are views of the accumulator's
+        self.run = RunAccumulator()
+        self.stats = self.run.stats
+        self.undo_data = self.run.undo_data
+        # Checkpoint manifest for resumable runs (see enable_checkpoint)
+        self.checkpoint_file: Optional[Path] = None
+        self._checkpoint_entries: Dict[str, dict] = {}
+        self._checkpoint_lock: Optional['threading.Lock'] = None
+        # Called with the input path right before an in-place write; False skips the write (see WorkQueue)
+        self.write_guard: Optional[Callable[[Path], bool]] = None
+    
+    def extract_text_from_pdf(self, file_path: Path) -> Optional[str]:
+        """Extract text from PDF using pdftotext if available."""
+        import shutil
+        import subprocess
+        if shutil.which('pdftotext'):
+            try:
+                result = subprocess.run(
+                    ['pdftotext', '-layout', str(file_path), '-'],
+                    capture_output=True,
+                    text=True,
+                    timeout=self.PDF_EXTRACTION_TIMEOUT
+                )
+                if result.returncode == 0:
+                    return result.stdout
+            except (subprocess.TimeoutExpired, FileNotFoundError):
+                pass
         
-        return cleaned_text, local_stats
+        # Fallback: try antiword-style approach or return None
+        print(f"Warning: Could not extract text from PDF {file_path}. "
+              f"Install pdftotext (poppler-utils) for PDF support.", file=sys.stderr)
+        return None
     
-    def process_file(self, file_path: Path, label: Optional[str] = None) -> bool:
-        """Process a single file."""
-        if not file_path.exists():
-            print(f"Error: File not found: {file_path}", file=sys.stderr)
-            return False
+    DOCX_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+    def extract_text_from_docx(self, file_path: Path) -> Optional[str]:
+        """Extract the body text from DOCX, paragraphs separated by blank lines (stdlib only)."""
+        extracted = self.extract_docx(file_path)
+        return extracted[0] if extracted is not None else None
+
+    def extract_docx(self, file_path: Path) -> Optional[Tuple[str, Set[str]]]:
+        """
+        Extract a DOCX's body text and the lines of its header and footer parts.
+
+        The body keeps Word's paragraph boundaries: each w:p becomes one line,
+        its text runs joined without separators, and paragraphs are separated
+        by a blank line so that line merging never crosses them. The
+        header/footer parts (word/header*.xml, word/footer*.xml) are inflated
+        and parsed in a thread pool alongside the body; their non-empty lines
+        come back as a set for exact-match removal (see clean_text's headers).
+        """
+        try:
+            import xml.etree.ElementTree as ET
+            import zipfile
+
+            with zipfile.ZipFile(file_path, 'r') as zip_ref:
+                # Security: Validate ZIP file structure to prevent zip slip attacks
+                for zip_info in zip_ref.infolist():
+                    # Check for directory traversal attempts
+                    if zip_info.filename.startswith('/') or '..' in zip_info.filename:
+                        print(f"Warning: Potentially malicious DOCX file {file_path}: "
+                              f"invalid path '{zip_info.filename}'", file=sys.stderr)
+                        return None
+
+                parts = [name for name in zip_ref.namelist()
+                         if re.fullmatch(r'word/(header|footer)\d*\.xml', name)]
+
+                def paragraphs(name: str) -> List[str]:
+                    return self._docx_paragraphs(ET.fromstring(zip_ref.read(name)))
+
+                if parts:
+                    from concurrent.futures import ThreadPoolExecutor
+                    with ThreadPoolExecutor(max_workers=min(len(parts), 4)) as pool:
+                        futures = [pool.submit(paragraphs, name) for name in parts]
+                        body = paragraphs('word/document.xml')
+                        headers = {line.strip() for future in futures
+                                   for paragraph in future.result() for line in paragraph.split('\n')}
+                    headers.discard('')
+                else:
+                    body, headers = paragraphs('word/document.xml'), set()
+
+                return '\n\n'.join(body), headers
+        except zipfile.BadZipFile as e:
+            print(f"Warning: Invalid DOCX file {file_path}: {e}", file=sys.stderr)
+            return None
+        except KeyError as e:
+            print(f"Warning: DOCX file {file_path} missing required component: {e}", file=sys.stderr)
+            return None
+        except ET.ParseError as e:
+            print(f"Warning: Could not parse XML in DOCX {file_path}: {e}", file=sys.stderr)
+            return None
+        except Exception as e:
+            print(f"Warning: Unexpected error extracting text from DOCX {file_path}: {e}", file=sys.stderr)
+            return None
+
+    @classmethod
+    def _docx_paragraphs(cls, root: 'ET.Element') -> List[str]:
+        """Text of every w:p under root in document order; a nested (text box) paragraph follows its parent."""
+        w = cls.DOCX_NAMESPACE
+        paragraph_tag, text_tag = w + 'p', w + 't'
+        breaks = {w + 'tab': '\t', w + 'br': '\n', w + 'cr': '\n'}
+        paragraphs: List[str] = []
+
+        def collect(elem: 'ET.Element', parts: List[str], nested: List['ET.Element']) -> None:
+            for child in elem:
+                if child.tag == text_tag:
+                    parts.append(child.text or '')
+                elif child.tag in breaks:
+                    parts.append(breaks[child.tag])
+                elif child.tag == paragraph_tag:
+                    nested.append(child)
+                else:
+                    collect(child, parts, nested)
+
+        def visit(elem: 'ET.Element') -> None:
+            for child in elem:
+                if child.tag == paragraph_tag:
+                    paragraph(child)
+                else:
+                    visit(child)
+
+        def paragraph(elem: 'ET.Element') -> None:
+            parts: List[str] = []
+            nested: List['ET.Element'] = []
+            collect(elem, parts, nested)
+            paragraphs.append(''.join(parts))
+            for child in nested:
+                paragraph(child)
+
+        visit(root)
+        return paragraphs
+
+    @staticmethod
+    def input_suffix(file_path: Path) -> str:
+        """The suffix naming a file's content type: '.txt' for both a.txt and a.txt.gz."""
+        suffix = file_path.suffix.lower()
+        if any(suffix == ext for _, ext in COMPRESSION_FORMATS.values()):
+            return Path(file_path.stem).suffix.lower()
+        return suffix
+
+    def read_text_file(self, file_path: Path) -> Optional[str]:
+        """Read text from various file formats."""
+        suffix = self.input_suffix(file_path)
         
-        print(f"Processing: {file_path}")
+        if suffix == '.txt' and detect_compression(file_path):
+            return self.read_compressed_text(file_path)
         
-        # Read text (support '-' as stdin)
+        elif suffix == '.txt':
+            return self.read_plain_text(file_path)
+        
+        elif suffix == '.pdf':
+            return self.extract_text_from_pdf(file_path)
+        
+        elif suffix == '.docx':
+            return self.extract_text_from_docx(file_path)
+        
+        else:
+            print(f"Unsupported file type: {suffix or file_path.suffix}", file=sys.stderr)
+            return None
+
+    def read_plain_text(self, file_path: Path) -> Optional[str]:
+        """Read an uncompressed text file as UTF-8, else Latin-1."""
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        except UnicodeDecodeError:
+            try:
+                with open(file_path, 'r', encoding='latin-1') as f:
+                    return f.read()
+            except (OSError, IOError) as e:
+                print(f"Error reading {file_path}: {e}", file=sys.stderr)
+                return None
+        except (OSError, IOError, PermissionError) as e:
+            print(f"Error reading {file_path}: {e}", file=sys.stderr)
+            return None
+
+    def read_document(self, file_path: Path) -> Tuple[Optional[str], Optional[Set[str]]]:
+        """
+        Read a file's text plus any header/footer lines its format records exactly.
+
+        For DOCX the headers come from the header and footer parts; for every
+        other input (including '-' for stdin) they are None and the cleaner
+        falls back to detecting repeating headers across pages.
+        """
+        if str(file_path) != '-' and self.input_suffix(file_path) == '.docx':
+            extracted = self.extract_docx(file_path)
+            return extracted if extracted is not None else (None, None)
+        return self.read_input(file_path), None
+
+    def read_compressed_text(self, file_path: Path) -> Optional[str]:
+        """Decompress and decode a gzip, bz2 or xz text file as one stream (UTF-8, else Latin-1)."""
+        import io
+        for encoding in ('utf-8', 'latin-1'):
+            try:
+                with io.TextIOWrapper(open_decompressed(file_path), encoding=encoding) as f:
+                    return f.read()
+            except UnicodeDecodeError:
+                continue
+            except Exception as e:  # OSError, EOFError, lzma.LZMAError: corrupt or truncated data
+                print(f"Warning: cannot decompress {file_path} ({e}), reading it as plain text", file=sys.stderr)
+                return self.read_plain_text(file_path)
+        return None  # Not reached: Latin-1 decodes any bytes
+    
+    def cpu_cap_abort(self, file_path: Path, stats: dict) -> bool:
+        """True if a file hit the CPU cap and the run aborts such files instead of degrading."""
+        if not stats.get('cpu_cap_exceeded') or self.cpu_cap_action != 'abort':
+            return False
+        self.run.count('files_cpu_capped')
+        print(f"Error: {file_path} exceeded the CPU cap of {self.max_cpu_seconds}s; left unchanged",
+              file=sys.stderr)
+        return True
+
+    # --sweep toggle names -> CleaningOptions fields
+    SWEEP_TOGGLES = {
+        'merge-lines': 'merge_lines',
+        'dehyphenate': 'dehyphenate',
+        'normalize-ws': 'normalize_ws',
+        'normalize-unicode': 'normalize_unicode',
+        'headers': 'remove_headers',
+        'nfkc': 'unicode_nfkc',
+    }
+
+    def sweep_combinations(self, toggles: List[str]) -> List[CleaningOptions]:
+        """Every on/off combination of the named toggles; other options stay as configured."""
+        base = CleaningOptions(self.merge_lines_opt, self.normalize_ws_opt, self.normalize_unicode_opt,
+                               self.dehyphenate_opt, self.remove_headers_opt, self.unicode_nfkc_opt)
+        combos = [base]
+        for name in toggles:
+            field = self.SWEEP_TOGGLES[name]
+            combos = [combo._replace(**{field: value}) for combo in combos for value in (True, False)]
+        return combos
+
+    def sweep(self, file_paths: List[Path], combos: List[CleaningOptions]) -> List[dict]:
+        """
+        Clean every file with every option combination, without writing anything.
+
+        Each file is read once; stage outputs are memoized per file, so a
+        combination that differs from an earlier one only in late stages
+        reuses the earlier stages' work. Returns one totals row per combination.
+        """
+        rows: List[dict] = [dict(dict.fromkeys(STAT_KEYS, 0), options=combo, files=0,
+                                 chars_in=0, chars_out=0, stages_run=0, stages_reused=0)
+                            for combo in combos]
+        for file_path in file_paths:
+            self.say(f"Processing: {file_path}")
+            text, headers = self.read_document(file_path)
+            if text is None:
+                continue
+            memo: Dict[tuple, tuple] = {}
+            for combo, row in zip(combos, rows):
+                plan = self.compile_plan(combo)
+                # clean_text returns empty text without running any stage
+                reused = plan.cached_prefix(memo) if text else len(plan.stages)
+                cleaned, stats = self.clean_text(text, memo=memo, max_cpu_seconds=self.max_cpu_seconds,
+                                                 headers=headers, **combo._asdict())
+                for key, value in stats.items():
+                    row[key] = row.get(key, 0) + value
+                row['files'] += 1
+                row['chars_in'] += len(text)
+                row['chars_out'] += len(cleaned)
+                row['stages_reused'] += reused
+                row['stages_run'] += len(plan.stages) - reused
+        return rows
+
+    def print_sweep(self, rows: List[dict], toggles: List[str]):
+        """Print one row of stats and output size per option combination."""
+        names = list(toggles)
+        columns = [('removed', 'lines_removed'), ('merged', 'merged_lines'),
+                   ('dehyph', 'dehyphenated_tokens'), ('headers', 'header_footer_removed'),
+                   ('repeat', 'repeating_headers_footers_removed'), ('dups', 'duplicates_collapsed')]
+        header = ' '.join(f"{name:>{max(len(name), 3)}}" for name in names)
+        header += ' ' + ' '.join(f"{label:>8}" for label, _ in columns) + f" {'chars out':>11} {'kept':>6}"
+        print(header)
+        print('-' * len(header))
+        for row in rows:
+            options = row['options']
+            cells = [f"{'on' if getattr(options, self.SWEEP_TOGGLES[name]) else 'off':>{max(len(name), 3)}}"
+                     for name in names]
+            cells += [f"{row.get(key, 0):>8}" for _, key in columns]
+            kept = row['chars_out'] / row['chars_in'] * 100 if row['chars_in'] else 100.0
+            cells += [f"{row['chars_out']:>11}", f"{kept:>5.1f}%"]
+            print(' '.join(cells))
+        run = sum(row['stages_run'] for row in rows)
+        reused = sum(row['stages_reused'] for row in rows)
+        print(f"\nStages run: {run}, reused from shared prefixes: {reused}")
+
+    def read_input(self, file_path: Path) -> Optional[str]:
+        """Read text from a file path, or from stdin when the path is '-'."""
         if str(file_path) == '-':
+            import io
             try:
                 data = sys.stdin.buffer.read()
+                fmt = compression_of(data[:_MAGIC_LENGTH])
+                if fmt is not None:
+                    try:
+                        with open_compressed(io.BytesIO(data), fmt) as f:
+                            data = f.read()
+                    except Exception:  # Text that merely looks compressed is read as it is
+                        pass
                 try:
-                    text = data.decode('utf-8')
+                    return data.decode('utf-8')
                 except UnicodeDecodeError:
-                    text = data.decode('latin-1')
-            except (OSError, IOError) as e:
+                    return data.decode('latin-1')
+            except Exception as e:  # Also EOFError / lzma.LZMAError from a corrupt compressed stream
                 print(f"Error reading stdin: {e}", file=sys.stderr)
-                return False
+                return None
+        return self.read_text_file(file_path)
+
+    def predict_peak_memory(self, file_path: Path) -> int:
+        """Estimate clean_text's peak memory for a file from its (uncompressed) size."""
+        try:
+            size = file_path.stat().st_size
+            fmt = detect_compression(file_path)
+            if fmt == 'gzip':
+                # The trailer records the uncompressed size modulo 2**32
+                with open(file_path, 'rb') as f:
+                    f.seek(-4, os.SEEK_END)
+                    size = max(int.from_bytes(f.read(4), 'little'), size)
+            elif fmt is not None:
+                size *= self.COMPRESSION_RATIO
+            return size * self.MEMORY_AMPLIFICATION
+        except OSError:
+            return 0
+
+    def needs_streaming(self, file_path: Path) -> bool:
+        """True if a file should be cleaned in chunks to stay within the memory budget."""
+        if self.memory_budget is None or str(file_path) == '-':
+            return False
+        # DOCX XML is parsed whole, and diffs/offset maps/chunks need the full text
+        if (self.input_suffix(file_path) not in ('.txt', '.pdf') or self.diff_mode or self.offset_map_opt
+                or self.chunk_size is not None):
+            return False
+        return self.predict_peak_memory(file_path) > self.memory_budget
+
+    def iter_input_lines(self, file_path: Path) -> Iterator[str]:
+        """Yield the lines of a (possibly compressed) .txt file or of pdftotext output without reading it all."""
+        import io
+        if file_path.suffix.lower() == '.pdf':
+            yield from self._iter_pdftotext_lines(file_path)
+            return
+        encoding = self._detect_text_encoding(file_path)
+        with io.TextIOWrapper(open_decompressed(file_path), encoding=encoding) as f:
+            yield from f
+
+    def _detect_text_encoding(self, file_path: Path) -> str:
+        """Pick the encoding read_text_file would use, decoding in blocks instead of all at once."""
+        import codecs
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        try:
+            with open_decompressed(file_path) as f:
+                for block in iter(lambda: f.read(1 << 16), b''):
+                    decoder.decode(block)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            return 'latin-1'
+        return 'utf-8'
+
+    def _iter_pdftotext_lines(self, file_path: Path) -> Iterator[str]:
+        """Stream pdftotext output line by line; raises OSError if extraction fails."""
+        import io
+        import shutil
+        import subprocess
+        import threading
+        if not shutil.which('pdftotext'):
+            raise OSError("pdftotext not found. Install poppler-utils for PDF support.")
+        proc = subprocess.Popen(['pdftotext', '-layout', str(file_path), '-'],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        timer = threading.Timer(self.PDF_EXTRACTION_TIMEOUT, proc.kill)
+        timer.start()
+        try:
+            if proc.stdout is not None:
+                yield from io.TextIOWrapper(proc.stdout, encoding='utf-8', errors='replace')
+        finally:
+            timer.cancel()
+            if proc.poll() is None:
+                proc.kill()
+            returncode = proc.wait()
+        if returncode != 0:
+            raise OSError(f"pdftotext failed with exit status {returncode}")
+
+    def iter_chunks(self, lines: Iterable[str], chunk_chars: int) -> Iterator[str]:
+        """
+        Group lines into chunks of about chunk_chars characters.
+
+        A chunk only ends where cleaning cannot join across the cut: after a
+        blank line, or after a line that ends a sentence, is not a table row
+        candidate and is not followed by a list item (which would keep it
+        from merging into the line before). Once a chunk reaches the target
+        it ends at the next such boundary; at twice the target it ends at the
+        last one, and the partial paragraph after it starts the next chunk.
+        Only a stretch of twice the target with no boundary at all is cut
+        where it stands.
+        """
+        buf: List[str] = []
+        size = 0
+        # Lines before the last boundary in buf, and their size
+        safe = safe_size = 0
+        for line in lines:
+            if buf and self._chunk_boundary(buf[-1], line):
+                safe, safe_size = len(buf), size
+            if size >= chunk_chars and (safe == len(buf) or size >= 2 * chunk_chars):
+                cut, cut_size = (safe, safe_size) if safe else (len(buf), size)
+                chunk = ''.join(buf[:cut])
+                # The line break at the cut belongs to neither chunk
+                yield chunk[:-1] if chunk.endswith('\n') else chunk
+                del buf[:cut]
+                size -= cut_size
+                safe = safe_size = 0
+            buf.append(line)
+            size += len(line)
+        if buf:
+            yield ''.join(buf)
+
+    def _chunk_boundary(self, line: str, next_line: str) -> bool:
+        """Whether no cleaning stage joins line and next_line or looks across them (see iter_chunks)."""
+        stripped = line.strip()
+        if not stripped:
+            return True
+        return (stripped[-1] in '.!?' and '  ' not in line
+                and not (next_line.strip() and self.is_list_marker(next_line)))
+
+    def clean_chunks(self, chunks: Iterable[str], stats: dict, **options) -> Iterator[str]:
+        """
+        Clean chunks one at a time, yielding pieces that concatenate to the cleaned text.
+
+        Per-chunk stats are added to stats. Consecutive duplicates are still
+        collapsed across chunk boundaries, but repeating headers/footers are
+        detected among the pages of each chunk rather than the whole file.
+        """
+        last_line = None
+        for chunk in chunks:
+            cleaned, chunk_stats = self.clean_text(chunk, **options)
+            for key, value in chunk_stats.items():
+                stats[key] = stats.get(key, 0) + value
+            if not cleaned:
+                continue
+            if last_line is not None:
+                first, _, rest = cleaned.partition('\n')
+                if first.strip() == last_line:
+                    stats['duplicates_collapsed'] += 1
+                    stats['lines_removed'] += 1
+                    if not rest:
+                        continue
+                    cleaned = rest
+                yield '\n'
+            yield cleaned
+            last_line = cleaned[cleaned.rfind('\n') + 1:].strip()
+
+    def process_file_streaming(self, file_path: Path, label: Optional[str] = None) -> bool:
+        """Clean a file chunk by chunk so peak memory stays within the budget."""
+        import shutil
+        from hashlib import sha1
+        if self.memory_budget is None:
+            raise ValueError("process_file_streaming needs memory_budget to be set")
+        # A chunk can reach twice the target, and its lines are held as a list while it fills
+        chunk_chars = max(self.MIN_STREAM_CHUNK,
+                          self.memory_budget // (4 * self.MEMORY_AMPLIFICATION))
+        stats = dict.fromkeys(STAT_KEYS, 0)
+        source = sha1()
+
+        def hashed(lines):
+            for line in lines:
+                source.update(line.encode('utf-8'))
+                yield line
+
+        chunks = self.iter_chunks(hashed(self.iter_input_lines(file_path)), chunk_chars)
+        pieces = self.clean_chunks(chunks, stats, **self.cleaning_options())
+        output = sha1()
+        tmp_path = file_path.with_name(file_path.name + '.tmp')
+        output_path, fmt = self.output_target(file_path)
+        try:
+            if self.stdout_opt:
+                if self.stats['files_processed'] > 0:
+                    print("\n---\n")
+                for piece in pieces:
+                    sys.stdout.write(piece)
+                    output.update(piece.encode('utf-8'))
+                sys.stdout.write('\n')
+            elif self.dry_run:
+                for piece in pieces:
+                    output.update(piece.encode('utf-8'))
+                self.say(f"  [DRY RUN] Would clean {file_path}")
+            else:
+                if output_path != file_path and output_path.exists():
+                    raise OSError(f"{output_path} already exists")
+                # Clean into a temporary file first: the input is still being read
+                with self.open_output(tmp_path, fmt) as f:
+                    for piece in pieces:
+                        f.write(piece)
+                        output.update(piece.encode('utf-8'))
+                if self.cpu_cap_abort(file_path, stats) or not self.may_write(file_path):
+                    tmp_path.unlink()
+                    return False
+                backup_path = file_path.with_suffix(file_path.suffix + '.bak')
+                resumed = str(file_path.resolve()) in self._checkpoint_entries
+                if not resumed:
+                    shutil.copyfile(file_path, backup_path)
+                os.replace(tmp_path, output_path)
+                if output_path != file_path:
+                    file_path.unlink()
+                self._log_write(file_path, backup_path, stats, output.hexdigest(), resumed, output_path)
+                self.say(f"  ✓ Saved (backup: {backup_path.name})")
+        except OSError as e:
+            print(f"Error processing {file_path}: {e}", file=sys.stderr)
+            if tmp_path.exists():
+                tmp_path.unlink()
+            return False
+
+        self.run.count('files_streamed')
+        self.record_stats(stats, changed=source.digest() != output.digest())
+        return True
+
+    def say(self, message: str):
+        """Print a per-file progress message unless running quietly."""
+        if not self.quiet_opt:
+            print(message)
+
+    def record_result(self, text: str, cleaned_text: str, stats: dict):
+        """Add per-file stats to the run totals and report what changed."""
+        self.record_stats(stats, changed=text != cleaned_text)
+
+    def record_stats(self, stats: dict, changed: bool):
+        """Add per-file stats to the run totals; print them if the file changed."""
+        self.run.add(stats)
+        
+        # Show what would be changed
+        if changed and not self.quiet_opt:
+            print(f"  - Lines removed: {stats['lines_removed']}")
+            print(f"  - Duplicates collapsed: {stats['duplicates_collapsed']}")
+            print(f"  - Empty lines removed: {stats['empty_lines_removed']}")
+            print(f"  - Headers/footers removed: {stats['header_footer_removed']}")
+            if stats.get('punctuation_lines_removed', 0) > 0:
+                print(f"  - Punctuation lines removed: {stats['punctuation_lines_removed']}")
+            if stats.get('dehyphenated_tokens', 0) > 0:
+                print(f"  - Dehyphenated tokens: {stats['dehyphenated_tokens']}")
+            if stats.get('hyphens_kept', 0) > 0:
+                print(f"  - Line-end hyphens kept (compound words): {stats['hyphens_kept']}")
+            if stats.get('repeating_headers_footers_removed', 0) > 0:
+                print(f"  - Repeating headers/footers removed: {stats['repeating_headers_footers_removed']}")
+
+    def write_chunks(self, source: str, text: str, cleaned_text: str, edits: EditScript):
+        """Write one JSON line per chunk to stdout, flushed as each is produced."""
+        import json
+        if self.chunk_size is None:
+            raise ValueError("write_chunks needs chunk_size to be set")
+        for chunk in self.chunk_cleaned(text, cleaned_text, edits, self.chunk_size,
+                                        self.chunk_overlap, self.chunk_break):
+            record = {'source': source}
+            record.update(chunk._asdict())
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + '\n')
+            sys.stdout.flush()
+
+    def rewrite_is_noop(self, file_path: Path, text: str) -> bool:
+        """
+        Whether writing text in place would leave file_path as it is.
+
+        Only a .txt file staying in its compression format qualifies. For an
+        uncompressed one the size must also match the UTF-8 text, so files
+        read as Latin-1 or with CRLF line endings are still rewritten. A file
+        an interrupted run already cleaned is rewritten too, to log its undo
+        record.
+        """
+        if str(file_path) == '-' or self.input_suffix(file_path) != '.txt':
+            return False
+        if self.output_target(file_path)[0] != file_path:
+            return False
+        if str(file_path.resolve()) in self._checkpoint_entries:
+            return False
+        if detect_compression(file_path):
+            return True
+        try:
+            return file_path.stat().st_size == len(text.encode('utf-8'))
+        except OSError:
+            return False
+
+    def is_clean_in_place(self, file_path: Path, text: str, headers: Optional[Set[str]] = None) -> bool:
+        """Whether the pre-scan shows an in-place clean of file_path would change nothing at all."""
+        return (not self.stdout_opt and self.rewrite_is_noop(file_path, text)
+                and not self.needs_cleaning(text, headers))
+
+    def record_already_clean(self):
+        """Count a file skipped by the pre-scan: processed, but neither cleaned nor rewritten."""
+        self.run.add({})
+        self.run.count('files_skipped_clean')
+        self.say("  ✓ Already clean, left as is")
+
+    def output_target(self, file_path: Path) -> Tuple[Path, Optional[str]]:
+        """
+        Where an in-place clean writes, and compressed how.
+
+        Compressed inputs keep their format unless --compress names another;
+        converting renames the file (a.txt -> a.txt.xz, a.txt.gz -> a.txt.xz).
+        """
+        source_fmt = detect_compression(file_path)
+        fmt = self.compress or source_fmt
+        if fmt is None or fmt == source_fmt:
+            return file_path, fmt
+        base = file_path
+        if source_fmt is not None and file_path.suffix.lower() == COMPRESSION_FORMATS[source_fmt][1]:
+            base = file_path.with_suffix('')
+        return base.with_name(base.name + COMPRESSION_FORMATS[fmt][1]), fmt
+
+    def open_output(self, path: Path, fmt: Optional[str]):
+        """Open path for writing cleaned text, through the compressor when fmt is set."""
+        import io
+        if fmt is None:
+            return open(path, 'w', encoding='utf-8')
+        # The undo hash covers the text as written, so newlines are not translated
+        return io.TextIOWrapper(open_compressed(path, fmt, 'wb', self.compress_level),
+                                encoding='utf-8', newline='')
+
+    def write_output(self, file_path: Path, cleaned_text: str, stats: dict,
+                     label: Optional[str] = None, changed: bool = True) -> bool:
+        """
+        Emit cleaned text: stdout, dry-run notice, or in-place write with backup.
+
+        An in-place write is skipped, with no backup, when cleaning left the
+        text unchanged and rewriting would not change the file either.
+        """
+        from hashlib import sha1
+        if self.stdout_opt:
+            # Print to stdout; if multiple files, add a separator
             if label is None:
-                label = 'stdin'
+                label = str(file_path)
+            # Print separator only if multiple inputs indicated by files_processed > 0
+            if self.stats['files_processed'] > 0:
+                print("\n---\n")
+            print(cleaned_text, end='' if cleaned_text.endswith('\n') else '\n')
+        elif not changed and self.rewrite_is_noop(file_path, cleaned_text):
+            self.run.count('files_skipped_clean')
+            self.say("  ✓ Already clean, left as is")
+        elif not self.dry_run:
+            # Save original for undo
+            backup_path = file_path.with_suffix(file_path.suffix + '.bak')
+            # A file cleaned before an interrupted run already has its original
+            # in the backup; copying again would back up cleaned content
+            resumed = str(file_path.resolve()) in self._checkpoint_entries
+            output_path, fmt = self.output_target(file_path)
+            if output_path != file_path and output_path.exists():
+                print(f"Error writing {output_path}: file already exists", file=sys.stderr)
+                return False
+            if not self.may_write(file_path):
+                return False
+            try:
+                if not resumed:
+                    with open(file_path, 'rb') as src, open(backup_path, 'wb') as dst:
+                        dst.write(src.read())
+                
+                # Write cleaned text
+                with self.open_output(output_path, fmt) as f:
+                    f.write(cleaned_text)
+                if output_path != file_path:
+                    file_path.unlink()
+                
+                self._log_write(file_path, backup_path, stats,
+                                sha1(cleaned_text.encode('utf-8')).hexdigest(), resumed, output_path)
+                
+                self.say(f"  ✓ Saved (backup: {backup_path.name})")
+            except (OSError, IOError, PermissionError) as e:
+                print(f"Error writing {file_path}: {e}", file=sys.stderr)
+                return False
         else:
-            text = self.read_text_file(file_path)
+            self.say(f"  [DRY RUN] Would clean {file_path}")
+        
+        return True
+
+    def may_write(self, file_path: Path) -> bool:
+        """Ask the write guard, if any, whether an in-place write of file_path may go ahead."""
+        if self.write_guard is None or self.write_guard(file_path):
+            return True
+        print(f"Warning: not writing {file_path}: another worker has taken it over", file=sys.stderr)
+        return False
+
+    def _log_write(self, file_path: Path, backup_path: Path, stats: dict,
+                   digest: str, resumed: bool, output_path: Optional[Path] = None):
+        """Record an in-place write for undo and in the checkpoint manifest."""
+        from datetime import datetime
+        output_path = output_path or file_path
+        st = output_path.stat()
+        entry: dict = {
+            'file': str(file_path.resolve()) if self.checkpoint_file else str(file_path),
+            'backup': str(backup_path.resolve()) if self.checkpoint_file else str(backup_path),
+            'timestamp': datetime.now().isoformat(),
+            'stats': stats,
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'sha1': digest,
+        }
+        if output_path != file_path:
+            # Converted to another compression format under a new name
+            entry['output'] = str(output_path.resolve()) if self.checkpoint_file else str(output_path)
+        if resumed:
+            # Keep the original backup path; refresh the post-clean fingerprint
+            prior = self._checkpoint_entries[entry['file']]
+            entry['backup'] = prior['backup']
+            with self.run.lock:
+                prior.update(entry)
+        else:
+            self.run.add_undo(entry)
+        self._record_checkpoint(entry)
+
+    def enable_checkpoint(self, checkpoint_file: Path, resume: bool = False) -> int:
+        """
+        Record each completed in-place write to a checkpoint manifest.
+
+        The manifest is a JSON-lines file with one undo record per cleaned
+        file, keyed by path and carrying the post-clean size, mtime and
+        content hash. With resume=True, entries from an interrupted run are
+        loaded so completed files are skipped and their records become part
+        of this run's undo log entry. Otherwise a stale manifest is flushed
+        to the undo log as its own entry and a new one is started.
+
+        Returns the number of completed entries loaded.
+        """
+        import threading
+        self.checkpoint_file = checkpoint_file
+        self._checkpoint_lock = threading.Lock()
+        self._checkpoint_entries = {}
+
+        entries = self._read_checkpoint(checkpoint_file)
+        if entries and not resume:
+            print(f"Warning: Found checkpoint from an interrupted run ({len(entries)} file(s)). "
+                  f"Saving it to the undo log and starting fresh; use --resume to continue it.",
+                  file=sys.stderr)
+            self._append_log_entry(entries, {})
+            entries = []
+        if not resume or not entries:
+            if not self.dry_run and not self.stdout_opt:
+                checkpoint_file.write_text('', encoding='utf-8')
+            return 0
+
+        for entry in entries:
+            # Later records for the same file supersede earlier ones
+            self._checkpoint_entries[entry['file']] = entry
+        self.undo_data.extend(self._checkpoint_entries.values())
+        return len(self._checkpoint_entries)
+
+    @staticmethod
+    def _read_checkpoint(checkpoint_file: Path) -> List[dict]:
+        """Load checkpoint records, ignoring a torn final line from a crash."""
+        import json
+        entries: List[dict] = []
+        if not checkpoint_file.exists():
+            return entries
+        try:
+            with open(checkpoint_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if 'file' in entry and 'backup' in entry:
+                        entries.append(entry)
+        except (OSError, IOError) as e:
+            print(f"Warning: Could not read checkpoint {checkpoint_file}: {e}", file=sys.stderr)
+        return entries
+
+    def is_completed(self, file_path: Path) -> bool:
+        """Check whether a resumed run already cleaned this file, unchanged since."""
+        if not self._checkpoint_entries:
+            return False
+        entry = self._checkpoint_entries.get(str(file_path.resolve()))
+        if entry is None:
+            return False
+        file_path = Path(entry.get('output', file_path))
+        try:
+            st = file_path.stat()
+        except OSError:
+            return False
+        if st.st_size != entry.get('size'):
+            return False
+        if st.st_mtime_ns == entry.get('mtime_ns'):
+            return True
+        # Same size but touched since: fall back to the content hash
+        from hashlib import sha1
+        with open(file_path, 'rb') as f:
+            return sha1(f.read()).hexdigest() == entry.get('sha1')
+
+    def _record_checkpoint(self, entry: dict):
+        """Append one completed file to the checkpoint manifest."""
+        import json
+        if self.checkpoint_file is None or self._checkpoint_lock is None:
+            return
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._checkpoint_lock:
+            with open(self.checkpoint_file, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+
+    # Held-back text longer than this (in characters) is written anyway
+    INCREMENTAL_MAX_CARRY = 1 << 16
+    # Nothing is written before this many pages have started, so repeating headers are known from page 1
+    INCREMENTAL_MIN_PAGES = 3
+
+    @staticmethod
+    def incremental_paths(file_path: Path) -> Tuple[Path, Path]:
+        """Output and state files for incremental cleaning: a.txt -> a.clean.txt, a.txt.strip-state.json."""
+        return (file_path.with_name(f"{file_path.stem}.clean{file_path.suffix}"),
+                file_path.with_name(file_path.name + '.strip-state.json'))
+
+    def process_file_incremental(self, file_path: Path, final: bool = False) -> bool:
+        """
+        Clean what was appended to a growing text file since the last call.
+
+        The source is left alone; cleaned lines are appended to its
+        incremental output file, and an IncrementalState next to it records
+        where to resume, so runs can be repeated across process restarts.
+        Only complete lines are read. The last cleaned line is held back and
+        re-cleaned with the next appended text, so line merging and
+        dehyphenation work across appends; duplicate collapse continues from
+        the last line written, and repeating headers/footers are counted over
+        every page read so far, split as page detection would split it (lines
+        already written are not revisited when a line only starts or stops
+        repeating later, so only a single run matches a full clean exactly). final writes the held-back
+        line and an unterminated last line too. A source that no longer
+        starts with the bytes already read, changed cleaning options, or a
+        shortened output start the output over; output written after the
+        state was last saved (an interrupted run) is cut off and redone.
+        """
+        from hashlib import sha1
+        if self.input_suffix(file_path) != '.txt' or detect_compression(file_path):
+            print(f"Error: --incremental needs an uncompressed .txt file: {file_path}", file=sys.stderr)
+            return False
+        output_path, state_path = self.incremental_paths(file_path)
+        options = {key: value for key, value in self.cleaning_options().items() if key != 'max_cpu_seconds'}
+
+        try:
+            state = IncrementalState.load(state_path)
+            output_size = output_path.stat().st_size if output_path.exists() else 0
+            with open(file_path, 'rb') as src:
+                head = src.read(IncrementalState.HEAD_BYTES)
+                if (state is None or state.options != options or output_size < state.output_size
+                        or sha1(head[:state.offset]).hexdigest() != state.head
+                        or os.fstat(src.fileno()).st_size < state.offset):
+                    state = IncrementalState(options)
+                src.seek(state.offset)
+                data = src.read()
+            if output_size != state.output_size:
+                with open(output_path, 'ab') as out:
+                    out.truncate(state.output_size)
+        except (OSError, IOError) as e:
+            print(f"Error reading {file_path}: {e}", file=sys.stderr)
+            return False
+
+        # Only complete lines; a partial last line is read again next time
+        consumed = len(data) if final else data.rfind(b'\n') + 1
+        try:
+            text = data[:consumed].decode('utf-8')
+        except UnicodeDecodeError:
+            text = data[:consumed].decode('latin-1')
+        # Universal newlines, as when reading the whole file in text mode
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+        new_lines = text.split('\n')
+        if text.endswith('\n') or not text:
+            new_lines.pop()
+
+        lines = state.carry + new_lines
+        # Pages are counted on the lines page detection would see, as split by a full clean
+        page_lines: List[str] = []
+        page_origins: List[Tuple[int, int]] = []
+        pages = state.pages.copy()
+        if lines and self.remove_headers_opt:
+            page_lines, page_origins = self.page_lines('\n'.join(lines))
+            pages.add_lines(self, page_lines)
+        edits = EditScript()
+        cleaned, stats = self.clean_text('\n'.join(lines), edits=edits, headers=pages.repeating(self),
+                                         **self.cleaning_options()) if lines else ("", {})
+        stats = stats or dict.fromkeys(STAT_KEYS, 0)
+        out_lines = cleaned.split('\n') if cleaned else []
+        origins = edits.line_origins
+        if out_lines and state.last_line is not None and out_lines[0].strip() == state.last_line:
+            # Consecutive duplicate of the last line already written
+            out_lines.pop(0)
+            origins = origins[1:]
+            stats['duplicates_collapsed'] += 1
+            stats['lines_removed'] += 1
+
+        carry: List[str] = []
+        if out_lines and not final:
+            warming_up = not state.output_size and pages.current.pages < self.INCREMENTAL_MIN_PAGES
+            held = lines if warming_up else lines[origins[-1][0]:]
+            if sum(len(line) + 1 for line in held) <= self.INCREMENTAL_MAX_CARRY:
+                out_lines = [] if warming_up else out_lines[:-1]
+                carry = held
+
+        try:
+            if out_lines:
+                with open(output_path, 'ab') as out:
+                    if state.output_size:
+                        out.write(b'\n')
+                    out.write('\n'.join(out_lines).encode('utf-8'))
+                    state.output_size = out.tell()
+                state.last_line = out_lines[-1].strip()
+            # Only lines before the carry are final; the carry is counted again next time
+            kept = len(lines) - len(carry)
+            state.pages.add_lines(self, (line for line, (_, end) in zip(page_lines, page_origins)
+                                         if end <= kept))
+            state.carry = carry
+            state.offset += consumed
+            state.head = sha1(head[:state.offset]).hexdigest()
+            state.save(state_path)
+        except (OSError, IOError) as e:
+            print(f"Error writing {output_path}: {e}", file=sys.stderr)
+            return False
+
+        self.record_stats(stats, changed=bool(out_lines))
+        self.run.count('incremental_bytes', consumed)
+        self.run.count('incremental_lines', len(out_lines))
+        self.say(f"  - Appended {len(out_lines)} line(s) to {output_path} "
+                 f"({consumed} new bytes, {len(carry)} held back)")
+        return True
+
+    def process_file(self, file_path: Path, label: Optional[str] = None) -> bool:
+        """Process a single file."""
+        if not self.profile_opt:
+            return self._process_file(file_path, label)
+
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        ok = self._process_file(file_path, label)
+        record: dict = {
+            'file': str(file_path),
+            'seconds': time.perf_counter() - started,
+            'peak_bytes': max(0, tracemalloc.get_traced_memory()[1] - baseline),
+            'streamed': self.needs_streaming(file_path),
+        }
+        self.profile_records.append(record)
+        print(f"  profile: {record['seconds'] * 1000:.1f} ms, "
+              f"peak {record['peak_bytes'] / 1e6:.2f} MB"
+              f"{' (streamed)' if record['streamed'] else ''}", file=sys.stderr)
+        return ok
+
+    def _process_file(self, file_path: Path, label: Optional[str] = None) -> bool:
+        # Checked first: a file converted by --compress is gone under its old name
+        if self.is_completed(file_path):
+            self.run.count('files_skipped_resume')
+            return True
+        
+        if str(file_path) != '-' and not file_path.exists():
+            print(f"Error: File not found: {file_path}", file=sys.stderr)
+            return False
+        
+        self.say(f"Processing: {file_path}")
+        
+        if self.incremental:
+            return self.process_file_incremental(file_path, final=self.incremental_final)
+        
+        if self.needs_streaming(file_path):
+            return self.process_file_streaming(file_path, label)
+        
+        # Read text (support '-' as stdin)
+        text, headers = self.read_document(file_path)
         if text is None:
             return False
+        if str(file_path) == '-' and label is None:
+            label = 'stdin'
         
         # Clean text
-        cleaned_text, stats = self.clean_text(
-            text,
-            merge_lines=self.merge_lines_opt,
-            normalize_ws=self.normalize_ws_opt,
-            normalize_unicode=self.normalize_unicode_opt,
-            dehyphenate=self.dehyphenate_opt,
-            remove_headers=self.remove_headers_opt,
-        )
+        edits = EditScript() if self.diff_mode or self.offset_map_opt or self.chunk_size is not None else None
+        # An in-place clean of a file with nothing to change neither cleans, backs up nor rewrites it
+        if edits is None and self.is_clean_in_place(file_path, text, headers):
+            self.record_already_clean()
+            return True
+        cleaned_text, stats, changed = self.clean(text, edits=edits, headers=headers)
+        if self.cpu_cap_abort(file_path, stats):
+            return False
         
         # Update global stats
-        self.stats['files_processed'] += 1
-        self.stats['lines_removed'] += stats['lines_removed']
-        self.stats['duplicates_collapsed'] += stats['duplicates_collapsed']
-        self.stats['empty_lines_removed'] += stats['empty_lines_removed']
-        self.stats['header_footer_removed'] += stats['header_footer_removed']
-        self.stats['punctuation_lines_removed'] += stats.get('punctuation_lines_removed', 0)
-        self.stats['dehyphenated_tokens'] += stats.get('dehyphenated_tokens', 0)
-        self.stats['repeating_headers_footers_removed'] += stats.get('repeating_headers_footers_removed', 0)
-        self.stats['merged_lines'] += stats.get('merged_lines', 0)
+        self.record_stats(stats, changed)
         
-        # Show what would be changed
-        if text != cleaned_text:
-            print(f"  - Lines removed: {stats['lines_removed']}")
-            print(f"  - Duplicates collapsed: {stats['duplicates_collapsed']}")
-            print(f"  - Empty lines removed: {stats['empty_lines_removed']}")
-            print(f"  - Headers/footers removed: {stats['header_footer_removed']}")
-            if stats.get('punctuation_lines_removed', 0) > 0:
-                print(f"  - Punctuation lines removed: {stats['punctuation_lines_removed']}")
-            if stats.get('dehyphenated_tokens', 0) > 0:
-                print(f"  - Dehyphenated tokens: {stats['dehyphenated_tokens']}")
-            if stats.get('repeating_headers_footers_removed', 0) > 0:
-                print(f"  - Repeating headers/footers removed: {stats['repeating_headers_footers_removed']}")
+        if self.diff_mode and edits is not None:
+            name = label or str(file_path)
+            print(edits.render(text, cleaned_text, mode=self.diff_mode,
+                               fromfile=name, tofile=name), end='')
+            return True
         
-        # Save original for undo
-        if self.stdout_opt:
-            # Print to stdout; if multiple files, add a separator
-            if label is None:
-                label = str(file_path)
-            # Print separator only if multiple inputs indicated by files_processed > 0
-            if self.stats['files_processed'] > 0:
-                print("\n---\n")
-            print(cleaned_text, end='' if cleaned_text.endswith('\n') else '\n')
-        elif not self.dry_run:
-            backup_path = file_path.with_suffix(file_path.suffix + '.bak')
+        if edits is not None and self.chunk_size is not None:
+            self.write_chunks(label or str(file_path), text, cleaned_text, edits)
+            return True
+        
+        if not self.write_output(file_path, cleaned_text, stats, label, changed):
+            return False
+        
+        if edits is not None and self.offset_map_opt and str(file_path) != '-' and not self.dry_run:
+            map_path = file_path.with_name(file_path.name + '.offsets.json')
             try:
-                with open(file_path, 'rb') as src, open(backup_path, 'wb') as dst:
-                    dst.write(src.read())
-                
-                # Write cleaned text
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(cleaned_text)
-                
-                # Log operation
-                self.undo_data.append({
-                    'file': str(file_path),
-                    'backup': str(backup_path),
-                    'timestamp': datetime.now().isoformat(),
-                    'stats': stats
-                })
-                
-                print(f"  ✓ Saved (backup: {backup_path.name})")
-            except (OSError, IOError, PermissionError) as e:
-                print(f"Error writing {file_path}: {e}", file=sys.stderr)
+                OffsetMap.from_edits(text, cleaned_text, edits).save(map_path)
+            except (OSError, IOError) as e:
+                print(f"Error writing offset map {map_path}: {e}", file=sys.stderr)
                 return False
-        else:
-            print(f"  [DRY RUN] Would clean {file_path}")
         
         return True
     
     def save_log(self):
         """Save operation log for undo capability."""
         if not self.dry_run and self.undo_data:
-            log_entry = {
-                'timestamp': datetime.now().isoformat(),
-                'operations': self.undo_data,
-                'stats': self.stats
-            }
-            
-            # Append to log file
-            log_entries = []
-            if self.log_file.exists():
-                try:
-                    with open(self.log_file, 'r', encoding='utf-8') as f:
-                        log_entries = json.load(f)
-                except (OSError, IOError, json.JSONDecodeError):
-                    log_entries = []
-            
-            log_entries.append(log_entry)
-            
-            with open(self.log_file, 'w', encoding='utf-8') as f:
-                json.dump(log_entries, f, indent=2, ensure_ascii=False)
+            self._append_log_entry(self.undo_data, self.stats)
+        # The undo log now covers everything the checkpoint recorded
+        if self.checkpoint_file is not None and self.checkpoint_file.exists():
+            try:
+                self.checkpoint_file.unlink()
+            except OSError as e:
+                print(f"Warning: Could not remove checkpoint {self.checkpoint_file}: {e}", file=sys.stderr)
+
+    def _append_log_entry(self, operations: List[dict], stats: dict):
+        """Append one undoable run to the log file."""
+        from datetime import datetime
+        log_entry = {
+            'timestamp': datetime.now().isoformat(),
+            'operations': operations,
+            'stats': stats
+        }
+        UndoLog(self.log_file).append(log_entry)
     
     def print_stats(self):
         """Print final statistics."""
@@ -724,60 +3276,1093 @@ class DocStripper:
             print(f"Punctuation lines removed: {self.stats['punctuation_lines_removed']}")
         if self.stats.get('dehyphenated_tokens', 0) > 0:
             print(f"Dehyphenated tokens: {self.stats['dehyphenated_tokens']}")
+        if self.stats.get('hyphens_kept', 0) > 0:
+            print(f"Line-end hyphens kept (compound words): {self.stats['hyphens_kept']}")
         if self.stats.get('repeating_headers_footers_removed', 0) > 0:
             print(f"Repeating headers/footers removed: {self.stats['repeating_headers_footers_removed']}")
-        if not self.dry_run:
+        unicode_counts = {key[len('unicode_'):].replace('_', ' '): self.stats[key]
+                          for key in self.UNICODE_STAT_KEYS if self.stats[key]}
+        if unicode_counts:
+            detail = ', '.join(f"{name} {count}" for name, count in unicode_counts.items())
+            print(f"Unicode characters normalized: {sum(unicode_counts.values())} ({detail})")
+        if self.stats.get('files_skipped_resume', 0) > 0:
+            print(f"Files skipped (already done before resume): {self.stats['files_skipped_resume']}")
+        if self.stats.get('files_skipped_clean', 0) > 0:
+            print(f"Files already clean (not rewritten): {self.stats['files_skipped_clean']}")
+        if self.stats.get('files_cpu_capped', 0) > 0:
+            action = 'left unchanged' if self.cpu_cap_action == 'abort' else 'cleaned in degraded mode'
+            print(f"Files over the CPU cap ({action}): {self.stats['files_cpu_capped']}")
+        if self.stats.get('files_streamed', 0) > 0:
+            print(f"Files cleaned in chunks (over memory budget): {self.stats['files_streamed']}")
+        if self.incremental:
+            print(f"Appended source read: {self.stats['incremental_bytes']} bytes, "
+                  f"{self.stats['incremental_lines']} cleaned lines written")
+        if self.profile_records:
+            peak = max(self.profile_records, key=lambda r: r['peak_bytes'])
+            print(f"Peak memory per file: {peak['peak_bytes'] / 1e6:.2f} MB ({peak['file']})")
+        if not self.dry_run and not self.incremental:
             print(f"\nLog saved to: {self.log_file}")
             print("Backup files created with .bak extension")
         print("="*50)
 
 
-def undo_last_operation():
-    """Restore files from last operation using log."""
-    log_file = Path('.strip-log')
+# Per-process state for AsyncPipeline's clean_text worker pool
+_WORKER_CLEANER: Optional['TextCleaner'] = None
+_WORKER_OPTIONS: dict = {}
+
+
+def _init_clean_worker(options: dict, custom_stages: list, lexicon: Optional[Lexicon] = None):
+    """Build the TextCleaner used by a clean_text worker process."""
+    global _WORKER_CLEANER, _WORKER_OPTIONS
+    _WORKER_CLEANER = TextCleaner(lexicon=lexicon)
+    for stage, before, after in custom_stages:
+        _WORKER_CLEANER.register_stage(stage, before=before, after=after)
+    _WORKER_OPTIONS = options
+
+
+def _clean_in_worker(text: str, headers: Optional[Set[str]] = None) -> Tuple[str, dict]:
+    """Run clean_text inside a worker process."""
+    if _WORKER_CLEANER is None:
+        raise RuntimeError("clean worker used before _init_clean_worker ran")
+    return _WORKER_CLEANER.clean_text(text, headers=headers, **_WORKER_OPTIONS)
+
+
+class ProgressReporter:
+    """
+    Rate-limited batch status line on stderr.
+
+    Shows files/sec, MB/sec, an ETA from the bytes still to process and
+    the number of failed files. Input sizes are taken once in start(), so
+    files rewritten in place still count with their original size. On a
+    terminal the line is redrawn in place; otherwise a full line is
+    written at a slower interval so logs stay readable.
+    """
+
+    TTY_INTERVAL = 0.5   # Seconds between redraws on a terminal
+    LOG_INTERVAL = 10.0  # Seconds between lines when stderr is redirected
+
+    def __init__(self, stream=None, interval: Optional[float] = None):
+        self._clock = time.monotonic
+        self.stream = stream if stream is not None else sys.stderr
+        self.is_tty = hasattr(self.stream, 'isatty') and self.stream.isatty()
+        if interval is None:
+            interval = self.TTY_INTERVAL if self.is_tty else self.LOG_INTERVAL
+        self.interval = interval
+        self.sizes: Dict[str, int] = {}
+        self.total_files = 0
+        self.total_bytes = 0
+        self.done_files = 0
+        self.done_bytes = 0
+        self.errors = 0
+        self.started = self._clock()
+        self._last_render = float('-inf')
+        self._width = 0
+
+    def start(self, file_paths: List[Path]):
+        """Record the batch size; sizes are read once here for the ETA."""
+        for file_path in file_paths:
+            try:
+                size = file_path.stat().st_size
+            except OSError:
+                size = 0
+            self.sizes[str(file_path)] = size
+        self.total_files = len(file_paths)
+        self.total_bytes = sum(self.sizes.values())
+        self.started = self._clock()
+
+    def advance(self, file_path: Path, ok: bool = True):
+        """Count one finished file and redraw if the interval has passed."""
+        self.done_files += 1
+        self.done_bytes += self.sizes.get(str(file_path), 0)
+        if not ok:
+            self.errors += 1
+        now = self._clock()
+        if now - self._last_render >= self.interval:
+            self._last_render = now
+            self.render(now)
+
+    def status(self, now: Optional[float] = None) -> str:
+        """Current status line text."""
+        elapsed = max((self._clock() if now is None else now) - self.started, 1e-9)
+        files_rate = self.done_files / elapsed
+        bytes_rate = self.done_bytes / elapsed
+        remaining = self.total_bytes - self.done_bytes
+        if self.done_files >= self.total_files:
+            eta = "done"
+        elif bytes_rate > 0:
+            eta = "ETA " + self._format_seconds(remaining / bytes_rate)
+        else:
+            eta = "ETA --"
+        return (f"{self.done_files}/{self.total_files} files  "
+                f"{files_rate:.1f} files/s  {bytes_rate / 1e6:.2f} MB/s  "
+                f"{eta}  errors: {self.errors}")
+
+    def render(self, now: Optional[float] = None):
+        line = self.status(now)
+        if self.is_tty:
+            # Pad over the tail of a longer previous line
+            self.stream.write('\r' + line.ljust(self._width))
+            self._width = len(line)
+        else:
+            self.stream.write(line + '\n')
+        self.stream.flush()
+
+    def finish(self):
+        """Draw the final status and end the line."""
+        self.render()
+        if self.is_tty:
+            self.stream.write('\n')
+            self.stream.flush()
+
+    @staticmethod
+    def _format_seconds(seconds: float) -> str:
+        seconds = int(seconds)
+        hours, rest = divmod(seconds, 3600)
+        minutes, seconds = divmod(rest, 60)
+        if hours:
+            return f"{hours}h{minutes:02d}m"
+        return f"{minutes}m{seconds:02d}s" if minutes else f"{seconds}s"
+
+
+class AsyncPipeline:
+    """
+    Batch runner that overlaps reading, extraction, cleaning and writing.
+
+    Files flow through three stages connected by bounded queues:
+    read/extract (thread pool, async pdftotext subprocesses), clean
+    (process pool) and write (thread pool). A full queue blocks the
+    stage feeding it, so memory stays bounded by the queue sizes.
+    """
+
+    STAGES = ('read', 'clean', 'write')
+    QUEUE_SAMPLE_INTERVAL = 0.05  # Seconds between queue-depth samples
+
+    def __init__(self, stripper: DocStripper,
+                 queue_size: int = 16,
+                 io_workers: int = 4,
+                 cpu_workers: Optional[int] = None,
+                 progress: Optional[ProgressReporter] = None):
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+        if io_workers < 1:
+            raise ValueError("io_workers must be at least 1")
+        self.stripper = stripper
+        self.queue_size = queue_size
+        self.io_workers = io_workers
+        # 0 cleans in the event loop thread (no process pool)
+        self.cpu_workers = (os.cpu_count() or 1) if cpu_workers is None else cpu_workers
+        self.progress = progress
+        # Files over the stripper's memory budget, cleaned in chunks after the pipeline drains
+        self.deferred: List[Path] = []
+        self.success_count = 0
+        self.failure_count = 0
+        self._depth_samples = {stage: [0, 0, 0] for stage in self.STAGES}  # [sum, max, count]
+
+    def run(self, file_paths: List[Path]) -> int:
+        """Process all files; returns the number processed successfully."""
+        import asyncio
+        return asyncio.run(self._run(file_paths))
+
+    def queue_stats(self) -> dict:
+        """Mean and max depth observed for each stage's input queue."""
+        result = {}
+        for stage, (total, peak, count) in self._depth_samples.items():
+            result[stage] = {
+                'mean': total / count if count else 0.0,
+                'max': peak,
+                'capacity': self.queue_size,
+            }
+        return result
+
+    def print_queue_stats(self):
+        """Print per-stage queue depths; the fullest queue feeds the bottleneck."""
+        print("Queue depth (mean/max of capacity):", file=sys.stderr)
+        for stage, depth in self.queue_stats().items():
+            print(f"  {stage:<6} {depth['mean']:6.1f} / {depth['max']} of {depth['capacity']}",
+                  file=sys.stderr)
+
+    async def _run(self, file_paths: List[Path]) -> int:
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+        queues: Dict[str, 'asyncio.Queue'] = {stage: asyncio.Queue(maxsize=self.queue_size) for stage in self.STAGES}
+        io_pool = ThreadPoolExecutor(max_workers=self.io_workers)
+        cpu_pool = None
+        if self.cpu_workers > 0:
+            cpu_pool = ProcessPoolExecutor(
+                max_workers=self.cpu_workers,
+                initializer=_init_clean_worker,
+                # Custom stages travel by pickle, so they must be module-level objects
+                initargs=(self.stripper.cleaning_options(), self.stripper._custom_stages,
+                          self.stripper.lexicon),
+            )
+        clean_workers = max(1, self.cpu_workers)
+
+        try:
+            monitor = asyncio.ensure_future(self._monitor(queues))
+            readers = [asyncio.ensure_future(self._read_stage(queues['read'], queues['clean'], io_pool))
+                       for _ in range(self.io_workers)]
+            cleaners = [asyncio.ensure_future(self._clean_stage(queues['clean'], queues['write'],
+                                                                cpu_pool, io_pool))
+                        for _ in range(clean_workers)]
+            writers = [asyncio.ensure_future(self._write_stage(queues['write'], io_pool))
+                       for _ in range(self.io_workers)]
+
+            for file_path in file_paths:
+                await queues['read'].put(file_path)
+
+            # Shut stages down in order: one sentinel per consumer
+            for workers, queue in ((readers, queues['read']),
+                                   (cleaners, queues['clean']),
+                                   (writers, queues['write'])):
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+
+            # One at a time, so oversized files never share the memory budget
+            for file_path in self.deferred:
+                self.stripper.say(f"Processing: {file_path}")
+                self._finish_file(file_path, self.stripper.process_file_streaming(file_path))
+
+            monitor.cancel()
+            try:
+                await monitor
+            except asyncio.CancelledError:
+                pass
+        finally:
+            io_pool.shutdown(wait=True)
+            if cpu_pool is not None:
+                cpu_pool.shutdown(wait=True)
+
+        return self.success_count
+
+    def _finish_file(self, file_path: Path, ok: bool):
+        if ok:
+            self.success_count += 1
+        else:
+            self.failure_count += 1
+        if self.progress is not None:
+            self.progress.advance(file_path, ok)
+
+    async def _monitor(self, queues: dict):
+        import asyncio
+        while True:
+            for stage, queue in queues.items():
+                depth = queue.qsize()
+                sample = self._depth_samples[stage]
+                sample[0] += depth
+                sample[1] = max(sample[1], depth)
+                sample[2] += 1
+            await asyncio.sleep(self.QUEUE_SAMPLE_INTERVAL)
+
+    async def _read_stage(self, inbox, outbox, io_pool):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        while True:
+            file_path = await inbox.get()
+            if file_path is None:
+                return
+            if self.stripper.is_completed(file_path):
+                self.stripper.run.count('files_skipped_resume')
+                self._finish_file(file_path, True)
+                continue
+            if self.stripper.needs_streaming(file_path):
+                self.deferred.append(file_path)
+                continue
+            self.stripper.say(f"Processing: {file_path}")
+            headers = None
+            try:
+                if file_path.suffix.lower() == '.pdf':
+                    text = await self._extract_pdf(file_path, io_pool)
+                else:
+                    text, headers = await loop.run_in_executor(io_pool, self.stripper.read_document, file_path)
+            except Exception as e:
+                print(f"Error reading {file_path}: {e}", file=sys.stderr)
+                text = None
+            if text is None:
+                self._finish_file(file_path, False)
+                continue
+            await outbox.put((file_path, text, headers))
+
+    async def _extract_pdf(self, file_path: Path, io_pool) -> Optional[str]:
+        """Run pdftotext as an async subprocess so extraction overlaps other stages."""
+        import asyncio
+        import shutil
+        if not shutil.which('pdftotext'):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(io_pool, self.stripper.extract_text_from_pdf, file_path)
+
+        proc = await asyncio.create_subprocess_exec(
+            'pdftotext', '-layout', str(file_path), '-',
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            out, _ = await asyncio.wait_for(proc.communicate(),
+                                            timeout=self.stripper.PDF_EXTRACTION_TIMEOUT)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            out = None
+        if out is not None and proc.returncode == 0:
+            return out.decode('utf-8', errors='replace')
+
+        print(f"Warning: Could not extract text from PDF {file_path}. "
+              f"Install pdftotext (poppler-utils) for PDF support.", file=sys.stderr)
+        return None
+
+    async def _clean_stage(self, inbox, outbox, cpu_pool, io_pool):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        options = self.stripper.cleaning_options()
+        while True:
+            item = await inbox.get()
+            if item is None:
+                return
+            file_path, text, headers = item
+            # The pre-scan stats the file, so it runs off the event loop; its stats are recorded on it
+            if await loop.run_in_executor(io_pool, self.stripper.is_clean_in_place, file_path, text, headers):
+                self.stripper.record_already_clean()
+                self._finish_file(file_path, True)
+                continue
+            try:
+                if cpu_pool is None:
+                    cleaned_text, stats = self.stripper.clean_text(text, headers=headers, **options)
+                else:
+                    cleaned_text, stats = await loop.run_in_executor(cpu_pool, _clean_in_worker, text, headers)
+            except Exception as e:
+                print(f"Error cleaning {file_path}: {e}", file=sys.stderr)
+                self._finish_file(file_path, False)
+                continue
+            await outbox.put((file_path, text, cleaned_text, stats))
+
+    async def _write_stage(self, inbox, io_pool):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await inbox.get()
+            if item is None:
+                return
+            file_path, text, cleaned_text, stats = item
+            # Stats are only touched from the event loop thread
+            if self.stripper.cpu_cap_abort(file_path, stats):
+                self._finish_file(file_path, False)
+                continue
+            self.stripper.record_result(text, cleaned_text, stats)
+            ok = await loop.run_in_executor(io_pool, self.stripper.write_output,
+                                            file_path, cleaned_text, stats, None, cleaned_text != text)
+            self._finish_file(file_path, ok)
+
+
+class ThreadPoolRunner:
+    """
+    Batch runner calling process_file on one shared DocStripper from a thread pool.
+
+    On free-threaded Python builds the cleaning itself runs in parallel;
+    with the GIL, threads still overlap file reads, pdftotext and writes.
+    Results are reported from the submitting thread, so the progress
+    reporter is never called concurrently.
+    """
+
+    def __init__(self, stripper: DocStripper, workers: Optional[int] = None,
+                 progress: Optional[ProgressReporter] = None):
+        if workers is not None and workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.stripper = stripper
+        self.workers = workers or (os.cpu_count() or 1)
+        self.progress = progress
+        self.success_count = 0
+        self.failure_count = 0
+
+    def run(self, file_paths: List[Path]) -> int:
+        """Process all files; returns the number processed successfully."""
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.stripper.process_file, path): path for path in file_paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    ok = future.result()
+                except Exception as e:
+                    print(f"Error processing {path}: {e}", file=sys.stderr)
+                    ok = False
+                if ok:
+                    self.success_count += 1
+                else:
+                    self.failure_count += 1
+                if self.progress is not None:
+                    self.progress.advance(path, ok)
+        return self.success_count
+
+
+
+class WorkQueue:
+    """
+    Work queue in a shared directory, for workers on any number of hosts.
+
+    Layout under the queue root:
+        pending/<task>             one JSON task ({"file": absolute path}) per file
+        leased/<task>@<worker>[#n] a claimed task; its mtime is the lease heartbeat
+        done/<task>                the task's result (file, ok, worker, finished)
+        workers/<worker>.json      per-worker run totals, merged by print_report()
+
+    Every state change is a single rename, so exactly one worker wins each
+    claim, reclaim or completion even over a network filesystem. A lease
+    whose mtime is older than lease_seconds belongs to a dead worker and is
+    renamed back to pending/ by whichever worker notices first; live
+    workers touch their lease every lease_seconds / 3. A worker that stalled
+    past its lease may find it reclaimed, so right before writing it renames
+    the lease once more (confirm) and skips the write if that fails. Hosts
+    must keep their clocks in sync (NTP) for expiry to be judged fairly.
+    """
+
+    def __init__(self, root: Path, lease_seconds: float = 300.0, worker_id: Optional[str] = None):
+        if lease_seconds <= 0:
+            raise ValueError("lease_seconds must be positive")
+        import socket
+        self.root = root
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id or f"{socket.gethostname()}.{os.getpid()}"
+        self.pending = root / 'pending'
+        self.leased = root / 'leased'
+        self.done = root / 'done'
+        self.workers = root / 'workers'
+        for directory in (self.pending, self.leased, self.done, self.workers):
+            directory.mkdir(parents=True, exist_ok=True)
+        self.success_count = 0
+        self.failure_count = 0
+        self._lease: Optional[Path] = None  # The lease of the file being processed
+
+    @staticmethod
+    def task_name(file_path: Path) -> str:
+        from hashlib import sha1
+        return sha1(str(file_path).encode('utf-8')).hexdigest()[:20]
+
+    def add(self, file_paths: Iterable[Path]) -> int:
+        """Queue files not already pending, leased or done; returns how many were added."""
+        import json
+        added = 0
+        # One listing per batch rather than a glob per file; os.link still settles races
+        leased = {lease.name.split('@', 1)[0] for lease in self.leased.iterdir()}
+        for file_path in file_paths:
+            file_path = file_path.resolve()
+            task = self.task_name(file_path)
+            if task in leased or (self.pending / task).exists() or (self.done / task).exists():
+                continue
+            tmp_path = self.root / f".{task}.{self.worker_id}.tmp"
+            tmp_path.write_text(json.dumps({'file': str(file_path)}, ensure_ascii=False), encoding='utf-8')
+            try:
+                os.link(tmp_path, self.pending / task)  # Fails if another host queued it first
+                added += 1
+            except FileExistsError:
+                pass
+            finally:
+                tmp_path.unlink()
+        return added
+
+    def claim(self) -> Optional[Tuple[Path, Path]]:
+        """Lease one pending task; returns (lease path, file path) or None if nothing is pending."""
+        import json
+        for entry in sorted(self.pending.iterdir()):
+            lease = self.leased / f"{entry.name}@{self.worker_id}"
+            try:
+                os.utime(entry)  # Start the lease fresh: rename keeps the old mtime
+                os.rename(entry, lease)
+            except FileNotFoundError:
+                continue  # Another worker got there first
+            task = json.loads(lease.read_text(encoding='utf-8'))
+            return lease, Path(task['file'])
+        return None
+
+    def reclaim_expired(self) -> int:
+        """Move leases whose holder stopped renewing them back to pending/."""
+        reclaimed = 0
+        deadline = time.time() - self.lease_seconds
+        for lease in self.leased.iterdir():
+            try:
+                if lease.stat().st_mtime >= deadline:
+                    continue
+                os.rename(lease, self.pending / lease.name.split('@', 1)[0])
+            except FileNotFoundError:
+                continue
+            reclaimed += 1
+        return reclaimed
+
+    def confirm(self, lease: Path) -> Optional[Path]:
+        """
+        Re-take a lease right before writing; returns its new path, or None if it was reclaimed.
+
+        A reclaim racing with this renames the same path, so exactly one of
+        the two renames succeeds.
+        """
+        renewed = lease.with_name(f"{lease.name.split('#', 1)[0]}#{time.time_ns()}")
+        try:
+            os.utime(lease)  # The renamed lease starts fresh: rename keeps the old mtime
+            os.rename(lease, renewed)
+        except FileNotFoundError:
+            return None
+        return renewed
+
+    def _confirm_held(self, file_path: Path) -> bool:
+        """DocStripper write guard: confirm the lease of the file being processed."""
+        renewed = self.confirm(self._lease) if self._lease is not None else None
+        if renewed is None:
+            return False
+        self._lease = renewed
+        return True
+
+    def complete(self, lease: Path, file_path: Path, ok: bool) -> bool:
+        """Record a result; False if the lease had expired and been reclaimed meanwhile."""
+        import json
+        from datetime import datetime
+        task = lease.name.split('@', 1)[0]
+        try:
+            os.rename(lease, self.done / task)
+        except FileNotFoundError:
+            return False
+        result = {'file': str(file_path), 'ok': ok, 'worker': self.worker_id,
+                  'finished': datetime.now().isoformat()}
+        (self.done / task).write_text(json.dumps(result, ensure_ascii=False), encoding='utf-8')
+        return True
+
+    def _hold(self, stop) -> None:
+        """Heartbeat thread body: renew the current lease until stop is set."""
+        while not stop.wait(self.lease_seconds / 3):
+            if self._lease is None:
+                return
+            try:
+                os.utime(self._lease)
+            except FileNotFoundError:
+                continue  # Renamed by confirm (the next beat renews the new path) or reclaimed
+
+    def save_stats(self, stats: dict):
+        """Publish this worker's totals for print_report()."""
+        import json
+        record = {'worker': self.worker_id, 'stats': stats,
+                  'succeeded': self.success_count, 'failed': self.failure_count}
+        path = self.workers / f"{self.worker_id}.json"
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_text(json.dumps(record), encoding='utf-8')
+        os.replace(tmp_path, path)
+
+    def run(self, stripper: DocStripper) -> int:
+        """Claim and process files until the queue is drained; returns the number processed successfully."""
+        import threading
+        poll = min(1.0, self.lease_seconds / 10)
+        while True:
+            claimed = self.claim()
+            if claimed is None:
+                if self.reclaim_expired():
+                    continue
+                if not any(self.leased.iterdir()) and not any(self.pending.iterdir()):
+                    break
+                time.sleep(poll)  # Others still hold leases; one may die and need reclaiming
+                continue
+            self._lease, file_path = claimed
+            stripper.write_guard = self._confirm_held
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=self._hold, args=(stop,), daemon=True)
+            heartbeat.start()
+            try:
+                if file_path.exists():
+                    ok = stripper.process_file(file_path)
+                else:
+                    print(f"Warning: File not found: {file_path}", file=sys.stderr)
+                    ok = False
+            except Exception as e:
+                print(f"Error processing {file_path}: {e}", file=sys.stderr)
+                ok = False
+            finally:
+                stop.set()
+                heartbeat.join()
+                stripper.write_guard = None
+            lease, self._lease = self._lease, None
+            if lease is None or not self.complete(lease, file_path, ok):
+                print(f"Warning: lease on {file_path} expired before it finished; it may be processed again",
+                      file=sys.stderr)
+            if ok:
+                self.success_count += 1
+            else:
+                self.failure_count += 1
+            self.save_stats(stripper.stats)
+        self.save_stats(stripper.stats)
+        return self.success_count
+
+    def print_report(self):
+        """Print totals merged from every worker that has used this queue."""
+        import json
+        totals = RunAccumulator()
+        records = []
+        for path in sorted(self.workers.glob('*.json')):
+            try:
+                record = json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                continue
+            records.append(record)
+            totals.merge(record['stats'])
+        failed = 0
+        for path in self.done.iterdir():
+            try:
+                failed += not json.loads(path.read_text(encoding='utf-8')).get('ok')
+            except (OSError, ValueError):
+                continue  # Result still being written
+        print("\n" + "="*50)
+        print(f"QUEUE REPORT ({len(records)} worker(s))")
+        print("="*50)
+        for record in records:
+            print(f"  {record['worker']}: {record['succeeded']} cleaned, {record['failed']} failed")
+        print(f"Files processed: {totals.stats['files_processed']}")
+        print(f"Lines removed: {totals.stats['lines_removed']}")
+        print(f"Duplicates collapsed: {totals.stats['duplicates_collapsed']}")
+        print(f"Headers/footers removed: {totals.stats['header_footer_removed']}")
+        print(f"Files failed: {failed}")
+        remaining = sum(1 for _ in self.pending.iterdir()) + sum(1 for _ in self.leased.iterdir())
+        if remaining:
+            print(f"Files still queued or leased: {remaining}")
+        print("="*50)
+
+
+class DirectoryWatcher:
+    """
+    Long-lived loop cleaning files in a directory tree as they arrive or change.
+
+    Each poll lists the tree with os.scandir and compares every candidate
+    file's (mtime_ns, size) with an index of the state it was last seen
+    processed in. A new or changed file is processed once its stat has
+    stayed the same for settle seconds, so a copy still in progress is not
+    picked up half-written. After processing, the files the run wrote
+    itself (the cleaned file, a --compress rename, an --incremental output)
+    are re-indexed so they do not count as changes; a file that failed is
+    indexed too and retried only when it changes again. The index is saved
+    as INDEX_NAME in the directory, so a restarted watcher processes only
+    what changed while it was down.
+
+    One DocStripper (compiled plans, lexicon) and, with workers > 1, one
+    thread pool stay warm for the life of the watcher. Each batch of writes
+    is saved to the undo log as its own entry. Every metrics_interval
+    seconds a summary line goes to stderr and, with metrics_path, a JSON
+    snapshot is written there.
+    """
+
+    INDEX_NAME = '.strip-watch-index.json'
+    SUFFIXES = ('.txt', '.pdf', '.docx')
+
+    def __init__(self, root: Path, stripper: DocStripper, interval: float = 2.0, settle: float = 2.0,
+                 workers: int = 1, metrics_interval: float = 60.0, metrics_path: Optional[Path] = None):
+        if not root.is_dir():
+            raise ValueError(f"not a directory: {root}")
+        if interval <= 0 or settle < 0 or metrics_interval <= 0:
+            raise ValueError("interval and metrics interval must be positive and settle not negative")
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.root = root.resolve()
+        self.stripper = stripper
+        self.interval = interval
+        self.settle = settle
+        self.workers = workers
+        self.metrics_interval = metrics_interval
+        self.metrics_path = metrics_path
+        self.index_path = self.root / self.INDEX_NAME
+        self.index: Dict[str, Tuple[int, int]] = self._load_index()
+        # Changed files waiting to settle: path -> (stat key, monotonic time first seen so)
+        self.pending: Dict[str, Tuple[Tuple[int, int], float]] = {}
+        self.metrics = {'polls': 0, 'batches': 0, 'files_ok': 0, 'files_failed': 0, 'bytes': 0,
+                        'last_batch_seconds': 0.0, 'busy_seconds': 0.0}
+        self.started = time.monotonic()
+        self._pool: Optional['ThreadPoolExecutor'] = None  # Started by the first batch when workers > 1
+        import threading
+        self._stop = threading.Event()
+
+    def _load_index(self) -> Dict[str, Tuple[int, int]]:
+        import json
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return {path: tuple(key) for path, key in json.load(f).items()}
+        except (OSError, ValueError, AttributeError, TypeError):
+            return {}
+
+    def save_index(self):
+        """Write the index atomically (a crash leaves the previous one)."""
+        import json
+        tmp_path = self.index_path.with_name(self.index_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def is_candidate(self, path: Path) -> bool:
+        """A document the stripper reads, excluding hidden files and --incremental outputs."""
+        if path.name.startswith('.') or self.stripper.input_suffix(path) not in self.SUFFIXES:
+            return False
+        return not (self.stripper.incremental and path.stem.endswith('.clean'))
+
+    def scan(self) -> Dict[str, Tuple[int, int]]:
+        """(mtime_ns, size) of every candidate file under the root."""
+        found = {}
+        stack = [self.root]
+        while stack:
+            try:
+                entries = list(os.scandir(stack.pop()))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith('.'):
+                            stack.append(Path(entry.path))
+                    elif entry.is_file() and self.is_candidate(Path(entry.path)):
+                        st = entry.stat()
+                        found[entry.path] = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    continue  # Removed between listing and stat
+        return found
+
+    def poll(self, now: Optional[float] = None) -> List[Path]:
+        """Scan once; return the changed files that have settled, removing them from pending."""
+        now = time.monotonic() if now is None else now
+        self.metrics['polls'] += 1
+        found = self.scan()
+        for path in list(self.index):
+            if path not in found:
+                del self.index[path]
+        ready = []
+        for path, key in found.items():
+            if self.index.get(path) == key:
+                self.pending.pop(path, None)
+                continue
+            seen = self.pending.get(path)
+            if seen is None or seen[0] != key:
+                self.pending[path] = (key, now)
+            elif now - seen[1] >= self.settle:
+                del self.pending[path]
+                ready.append(Path(path))
+        for path in list(self.pending):
+            if path not in found:
+                del self.pending[path]
+        return sorted(ready)
+
+    def _outputs(self, file_path: Path) -> List[Path]:
+        """Files processing file_path may write that are candidates themselves."""
+        if self.stripper.incremental:
+            return [file_path]
+        return [file_path, self.stripper.output_target(file_path)[0]]
+
+    def process(self, file_paths: List[Path]) -> int:
+        """Process a batch, re-index what it wrote and log it for undo; returns the number that succeeded."""
+        started = time.monotonic()
+        outputs = {path: self._outputs(path) for path in file_paths}
+        before = {path: self.index_key(path) for path in file_paths}
+        if self.workers > 1:
+            if self._pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            results = list(self._pool.map(self._process_one, file_paths))
+        else:
+            results = [self._process_one(path) for path in file_paths]
+        for path, ok in zip(file_paths, results):
+            for output in outputs[path]:
+                key = self.index_key(output)
+                if key is not None and self.is_candidate(output):
+                    self.index[str(output)] = key
+            self.metrics['files_ok' if ok else 'files_failed'] += 1
+            self.metrics['bytes'] += (before[path] or (0, 0))[1]
+        self.stripper.save_log()
+        del self.stripper.undo_data[:]
+        self.save_index()
+        elapsed = time.monotonic() - started
+        self.metrics['batches'] += 1
+        self.metrics['last_batch_seconds'] = elapsed
+        self.metrics['busy_seconds'] += elapsed
+        return sum(results)
+
+    def _process_one(self, file_path: Path) -> bool:
+        try:
+            return self.stripper.process_file(file_path)
+        except Exception as e:
+            print(f"Error processing {file_path}: {e}", file=sys.stderr)
+            return False
+
+    @staticmethod
+    def index_key(path: Path) -> Optional[Tuple[int, int]]:
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def metrics_snapshot(self) -> dict:
+        uptime = time.monotonic() - self.started
+        return dict(self.metrics, uptime_seconds=round(uptime, 1), watched_files=len(self.index),
+                    pending_files=len(self.pending),
+                    busy_fraction=round(self.metrics['busy_seconds'] / uptime, 4) if uptime else 0.0)
+
+    def report_metrics(self):
+        """Print a one-line summary to stderr and write the JSON snapshot if configured."""
+        import json
+        snapshot = self.metrics_snapshot()
+        print(f"[watch] up {snapshot['uptime_seconds']:.0f}s, {snapshot['watched_files']} files watched, "
+              f"{snapshot['files_ok']} cleaned, {snapshot['files_failed']} failed, "
+              f"{snapshot['pending_files']} settling, busy {snapshot['busy_fraction']:.1%}", file=sys.stderr)
+        if self.metrics_path is not None:
+            tmp_path = self.metrics_path.with_name(self.metrics_path.name + '.tmp')
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f, indent=2)
+                os.replace(tmp_path, self.metrics_path)
+            except OSError as e:
+                print(f"Warning: Could not write metrics to {self.metrics_path}: {e}", file=sys.stderr)
+
+    def stop(self):
+        """Make run() return after the batch in progress (safe from a signal handler or another thread)."""
+        self._stop.set()
+
+    def run(self, duration: Optional[float] = None) -> int:
+        """
+        Poll and process until stop(), KeyboardInterrupt or duration seconds have passed.
+
+        Returns the number of files processed successfully.
+        """
+        succeeded = 0
+        next_report = time.monotonic() + self.metrics_interval
+        deadline = None if duration is None else time.monotonic() + duration
+        try:
+            while not self._stop.is_set() and (deadline is None or time.monotonic() < deadline):
+                ready = self.poll()
+                if ready:
+                    succeeded += self.process(ready)
+                if time.monotonic() >= next_report:
+                    self.report_metrics()
+                    next_report = time.monotonic() + self.metrics_interval
+                self._stop.wait(self.interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+            self.report_metrics()
+        return succeeded
+
+
+class UndoLog:
+    """
+    Append-only undo journal: one JSON line per run.
+
+    Only the last entry is ever read back, so it is found by scanning line
+    offsets rather than parsing the whole journal, and removed by truncating
+    the file at its offset. A journal in the old single-JSON-array format is
+    converted the first time it is touched.
+    """
+
+    COPY_CHUNK = 1024 * 1024
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _migrate_legacy(self):
+        """Rewrite a JSON-array journal as JSON lines."""
+        import json
+        with open(self.path, 'rb') as f:
+            head = f.read(64).lstrip()
+        if not head.startswith(b'['):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+
+    def append(self, entry: dict):
+        import json
+        if self.path.exists():
+            try:
+                self._migrate_legacy()
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Warning: Could not convert old undo log {self.path}: {e}", file=sys.stderr)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def __iter__(self) -> Iterator[dict]:
+        import json
+        if not self.path.exists():
+            return
+        self._migrate_legacy()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def last(self) -> Tuple[int, Optional[dict]]:
+        """Byte offset and contents of the last entry, or (0, None) when empty."""
+        import json
+        if not self.path.exists():
+            return 0, None
+        self._migrate_legacy()
+        offset = last_offset = 0
+        last_line = None
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    last_offset, last_line = offset, line
+                offset += len(line)
+        if last_line is None:
+            return 0, None
+        return last_offset, json.loads(last_line)
+
+    def replace_last(self, offset: int, entry: Optional[dict]):
+        """Drop the entry starting at offset, writing entry in its place if given."""
+        import json
+        with open(self.path, 'r+b') as f:
+            f.truncate(offset)
+            f.seek(offset)
+            if entry is not None:
+                f.write((json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8'))
+
+    @staticmethod
+    def matches_post_clean(file_path: Path, op: dict) -> bool:
+        """
+        Check that a file still holds what cleaning wrote, so undo cannot
+        clobber later edits. Entries from logs without a hash are trusted.
+        """
+        from hashlib import sha1
+        digest: Optional[str] = op.get('sha1')
+        if digest is None:
+            return True
+        h = sha1()
+        try:
+            if detect_compression(file_path):
+                # Compressed output is written without newline translation
+                with open_decompressed(file_path) as f:
+                    for block in iter(lambda: f.read(UndoLog.COPY_CHUNK), b''):
+                        h.update(block)
+            elif os.linesep == '\n':
+                with open(file_path, 'rb') as f:
+                    for block in iter(lambda: f.read(UndoLog.COPY_CHUNK), b''):
+                        h.update(block)
+            else:
+                # The hash covers the text before newline translation
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    for block in iter(lambda: f.read(UndoLog.COPY_CHUNK), ''):
+                        h.update(block.encode('utf-8'))
+        except (OSError, EOFError, UnicodeDecodeError):
+            return False
+        return h.hexdigest() == digest
+
+    @staticmethod
+    def restore(op: dict, force: bool = False, dry_run: bool = False) -> Tuple[str, str]:
+        """
+        Restore one file from its backup.
+
+        Returns (status, detail) where status is 'restored', 'modified'
+        (file changed since cleaning; left alone unless force) or 'error'.
+        """
+        import shutil
+        backup_path = Path(op['backup'])
+        file_path = Path(op['file'])
+        # Where cleaning wrote: a --compress conversion moved the file to a new name
+        output_path = Path(op.get('output', op['file']))
+        if not backup_path.exists():
+            return 'error', f"Backup not found: {backup_path}"
+        if not force and output_path.exists() and not UndoLog.matches_post_clean(output_path, op):
+            return 'modified', f"Modified since cleaning, left in place: {output_path}"
+        if dry_run:
+            return 'restored', f"Would restore: {file_path}"
+        tmp_path = file_path.with_name(file_path.name + '.undo.tmp')
+        try:
+            with open(backup_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, UndoLog.COPY_CHUNK)
+            if output_path.exists():
+                shutil.copymode(output_path, tmp_path)
+            os.replace(tmp_path, file_path)
+            if output_path != file_path and output_path.exists():
+                output_path.unlink()
+        except OSError as e:
+            if tmp_path.exists():
+                tmp_path.unlink()
+            return 'error', f"Error restoring {file_path}: {e}"
+        return 'restored', f"Restored: {file_path}"
+
+
+def undo_last_operation(patterns: Optional[List[str]] = None, dry_run: bool = False,
+                        force: bool = False, workers: int = 8,
+                        log_file: Path = Path('.strip-log')) -> bool:
+    """
+    Restore files from last operation using log.
+
+    patterns limits the undo to files matching any of the globs; the rest of
+    the entry stays in the log. Files edited since cleaning are skipped (and
+    stay in the log) unless force is set; files that fail to restore, e.g.
+    because the backup is missing, also stay in the log for a later retry.
+    Only restored files are removed. dry_run only reports what would happen. Restores run in a pool of `workers` threads.
+    """
+    import json
+    from fnmatch import fnmatch
+    log = UndoLog(log_file)
     if not log_file.exists():
         print("No log file found. Nothing to undo.", file=sys.stderr)
         return False
     
     try:
-        with open(log_file, 'r', encoding='utf-8') as f:
-            log_entries = json.load(f)
+        offset, last_entry = log.last()
         
-        if not log_entries:
+        if last_entry is None:
             print("Log file is empty. Nothing to undo.", file=sys.stderr)
             return False
         
-        last_entry = log_entries[-1]
         operations = last_entry.get('operations', [])
         
         if not operations:
             print("No operations in last log entry.", file=sys.stderr)
             return False
         
-        print(f"Restoring {len(operations)} file(s) from {last_entry['timestamp']}...")
+        def selected(op):
+            if not patterns:
+                return True
+            path = op['file']
+            resolved = str(Path(path).resolve())
+            return any(fnmatch(path, pattern) or fnmatch(resolved, pattern) for pattern in patterns)
+
+        chosen = [op for op in operations if selected(op)]
+        if not chosen:
+            print("No files in the last operation match the given patterns.", file=sys.stderr)
+            return False
+        
+        verb = "Would restore" if dry_run else "Restoring"
+        print(f"{verb} {len(chosen)} file(s) from {last_entry['timestamp']}...")
+        
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            results = list(pool.map(lambda op: UndoLog.restore(op, force, dry_run), chosen))
         
+        remaining = [op for op in operations if not selected(op)]
         restored = 0
-        for op in operations:
-            backup_path = Path(op['backup'])
-            file_path = Path(op['file'])
-            
-            if backup_path.exists():
-                try:
-                    with open(backup_path, 'rb') as src, open(file_path, 'wb') as dst:
-                        dst.write(src.read())
-                    print(f"  ✓ Restored: {file_path}")
-                    restored += 1
-                except (OSError, IOError, PermissionError) as e:
-                    print(f"  ✗ Error restoring {file_path}: {e}", file=sys.stderr)
+        for op, (status, detail) in zip(chosen, results):
+            if status == 'restored':
+                print(f"  ✓ {detail}")
+                restored += 1
             else:
-                print(f"  ✗ Backup not found: {backup_path}", file=sys.stderr)
+                print(f"  ✗ {detail}", file=sys.stderr)
+                remaining.append(op)
+        
+        if dry_run:
+            print(f"\n[DRY RUN] Would restore {restored} file(s).")
+            return True
         
-        # Remove last entry from log
-        log_entries.pop()
-        with open(log_file, 'w', encoding='utf-8') as f:
-            json.dump(log_entries, f, indent=2, ensure_ascii=False)
+        # Remove restored files from the last entry; drop it once empty
+        if remaining:
+            last_entry['operations'] = remaining
+            log.replace_last(offset, last_entry)
+        else:
+            log.replace_last(offset, None)
         
         print(f"\nRestored {restored} file(s).")
+        skipped = sum(1 for status, _ in results if status == 'modified')
+        if skipped:
+            print(f"{skipped} file(s) changed since cleaning were kept; use --force to restore them anyway.")
+        failed = sum(1 for status, _ in results if status == 'error')
+        if failed:
+            print(f"{failed} file(s) could not be restored and stay in the log.")
         return True
 
     except (OSError, IOError, json.JSONDecodeError, KeyError) as e:
@@ -787,6 +4372,7 @@ def undo_last_operation():
 
 def main():
     """Main CLI entry point."""
+    import argparse
     parser = argparse.ArgumentParser(
         description='DocStripper - Batch document cleaner. Removes noise from text documents.',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -814,55 +4400,322 @@ Examples:
     parser.add_argument(
         '--undo',
         action='store_true',
-        help='Restore files from last operation'
+        help='Restore files from last operation (file arguments act as globs for a partial undo; '
+             'combine with --dry-run to preview)'
+    )
+    
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='With --undo, also restore files that were edited after cleaning'
+    )
+    
+    parser.add_argument(
+        '--undo-workers',
+        type=int,
+        default=8,
+        metavar='N',
+        help='Threads used to restore backups with --undo (default: 8)'
     )
 
     # Cleaning options (defaults ON; use flags to disable)
     parser.add_argument('--no-merge-lines', action='store_true', help='Disable merging of broken lines')
     parser.add_argument('--no-dehyphenate', action='store_true', help='Disable de-hyphenation across line breaks')
+    parser.add_argument('--lexicon', metavar='PATH',
+                        help='Word list (one word per line, compiled to PATH.dslex on first use) deciding whether '
+                             'a line-end hyphen is joined, kept as a compound, or left alone')
     parser.add_argument('--no-normalize-ws', action='store_true', help='Disable whitespace normalization')
     parser.add_argument('--no-normalize-unicode', action='store_true', help='Disable Unicode punctuation normalization')
+    parser.add_argument('--unicode-nfkc', action='store_true',
+                        help='Also apply NFKC compatibility normalization (full-width letters, superscripts, ...)')
     parser.add_argument('--keep-headers', action='store_true', help='Keep headers/footers/page numbers (do not remove)')
     parser.add_argument('--stdout', action='store_true', help='Write cleaned text to stdout instead of modifying files')
+    parser.add_argument('--diff', action='store_const', const='unified',
+                        help='Show changes as a unified diff without modifying files')
+    parser.add_argument('--annotated-diff', dest='diff', action='store_const', const='annotated',
+                        help='Show every original line tagged with why it was dropped or changed')
+    parser.add_argument('--offset-map', action='store_true',
+                        help='Write FILE.offsets.json mapping cleaned offsets back to the original text')
+    parser.add_argument('--chunks', action='store_true',
+                        help='Write cleaned text to stdout as JSON lines of chunks with page numbers '
+                             '(files are not modified; statistics go to stderr)')
+    parser.add_argument('--chunk-size', type=int, default=2000, metavar='N',
+                        help='Maximum characters per chunk (default: 2000)')
+    parser.add_argument('--chunk-overlap', type=int, default=0, metavar='N',
+                        help='Characters of the previous chunk repeated at the start of the next (default: 0)')
+    parser.add_argument('--chunk-break', choices=TextCleaner.CHUNK_BREAKS, default='paragraph',
+                        help="'page' also starts a new chunk at every page break (default: paragraph)")
+    parser.add_argument('--compress', choices=tuple(COMPRESSION_FORMATS),
+                        help='Write cleaned files compressed in this format (FILE.txt -> FILE.txt.gz, ...); '
+                             'without it, compressed inputs keep their own format')
+    parser.add_argument('--compress-level', type=int, default=None, metavar='N',
+                        help='Compression level (1-9) for written compressed files (default: 9, xz: 6)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='For growing .txt files: clean only text appended since the last run and append it '
+                             'to FILE.clean.txt (the source is not modified; progress is kept in '
+                             'FILE.txt.strip-state.json)')
+    parser.add_argument('--final', action='store_true',
+                        help='With --incremental: the source is complete, also write the held-back last line')
+
+    # Batch pipeline options
+    parser.add_argument('--threads', type=int, metavar='N',
+                        help='Process files in N threads sharing one cleaner (parallel on free-threaded Python)')
+    parser.add_argument('--async', dest='async_pipeline', action='store_true',
+                        help='Overlap reading, cleaning and writing across files (asyncio pipeline)')
+    parser.add_argument('--queue-size', type=int, default=16, metavar='N',
+                        help='Max files waiting between pipeline stages (default: 16)')
+    parser.add_argument('--io-workers', type=int, default=4, metavar='N',
+                        help='Threads for file reads and writes in --async mode (default: 4)')
+    parser.add_argument('--cpu-workers', type=int, default=None, metavar='N',
+                        help='Processes for cleaning in --async mode (default: CPU count, 0 = inline)')
+    parser.add_argument('--queue-stats', action='store_true',
+                        help='Print per-stage queue depths after an --async run')
+    parser.add_argument('--queue', metavar='DIR',
+                        help='Share files with workers on other processes or hosts through a queue directory; '
+                             'FILES are added to the queue, then this worker processes it until drained')
+    parser.add_argument('--lease', type=float, default=300.0, metavar='S',
+                        help='Seconds without a heartbeat before a --queue worker is presumed dead (default: 300)')
+    parser.add_argument('--watch', metavar='DIR',
+                        help='Keep running and clean documents in DIR (recursively) as they arrive or change')
+    parser.add_argument('--watch-interval', type=float, default=2.0, metavar='S',
+                        help='Seconds between --watch scans (default: 2)')
+    parser.add_argument('--settle', type=float, default=2.0, metavar='S',
+                        help='Seconds a changed file must stay unchanged before --watch cleans it (default: 2)')
+    parser.add_argument('--metrics-interval', type=float, default=60.0, metavar='S',
+                        help='Seconds between --watch metrics summaries (default: 60)')
+    parser.add_argument('--metrics-file', metavar='PATH',
+                        help='Also write each --watch metrics summary to PATH as JSON')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted run, skipping files it already cleaned')
+    parser.add_argument('--checkpoint', default='.strip-checkpoint', metavar='PATH',
+                        help='Checkpoint manifest for resumable runs (default: .strip-checkpoint)')
+
+    # Output verbosity
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument('--progress', action='store_true',
+                           help='Show a status line (files/s, MB/s, ETA, errors) on stderr instead of per-file output')
+    verbosity.add_argument('--quiet', action='store_true',
+                           help='Print only the final statistics')
+
+    # Memory
+    parser.add_argument('--memory-budget', type=float, default=None, metavar='MB',
+                        help='Clean files predicted to need more memory than this in chunks')
+    parser.add_argument('--profile', action='store_true',
+                        help='Report time and peak traced memory for each file (stderr)')
+    parser.add_argument('--sweep', metavar='TOGGLES',
+                        help='Compare every on/off combination of these comma-separated options without writing '
+                             f"files ({', '.join(DocStripper.SWEEP_TOGGLES)}, or 'all')")
+    parser.add_argument('--max-cpu-seconds', type=float, default=None, metavar='S',
+                        help='CPU-time cap per file; past it, line merging and repeating-header detection are skipped')
+    parser.add_argument('--cpu-cap-action', choices=('degrade', 'abort'), default='degrade',
+                        help='What to do with a file over --max-cpu-seconds (default: degrade)')
     
     args = parser.parse_args()
     
     # Handle undo
     if args.undo:
-        success = undo_last_operation()
+        success = undo_last_operation(patterns=args.files, dry_run=args.dry_run, force=args.force,
+                                      workers=args.undo_workers)
         sys.exit(0 if success else 1)
     
     # Check for files or stdin
-    if not args.files:
+    if not args.files and not args.queue and not args.watch:
         parser.print_help()
         sys.exit(1)
+    if args.watch and (args.files or args.async_pipeline or args.queue or args.sweep or args.diff or args.chunks
+                       or args.resume or args.progress):
+        parser.error("--watch takes no FILES and cannot be combined with --async, --queue, --sweep, --diff, "
+                     "--chunks, --resume or --progress")
+    
+    if args.threads is not None:
+        if args.threads < 1:
+            parser.error("--threads must be at least 1")
+        if args.async_pipeline or args.stdout or args.diff or args.profile:
+            parser.error("--threads cannot be combined with --async, --stdout, --diff or --profile")
+    if args.queue and (args.async_pipeline or args.threads is not None or args.stdout or args.diff
+                       or args.sweep or args.resume or args.progress):
+        parser.error("--queue cannot be combined with --async, --threads, --stdout, --diff, --sweep, "
+                     "--resume or --progress")
+    if (args.diff or args.offset_map or args.stdout) and args.async_pipeline:
+        # Writes finish in completion order on the I/O pool, so stdout output would not follow the input order
+        parser.error("--diff, --offset-map and --stdout cannot be combined with --async")
+    if args.profile and args.async_pipeline:
+        parser.error("--profile cannot be combined with --async (worker memory is not traced)")
+    if args.chunks:
+        if args.async_pipeline or args.threads is not None or args.stdout or args.diff or args.sweep or args.queue:
+            parser.error("--chunks cannot be combined with --async, --threads, --stdout, --diff, --sweep or --queue")
+        try:
+            TextCleaner.check_chunk_options(args.chunk_size, args.chunk_overlap, args.chunk_break)
+        except ValueError as e:
+            parser.error(str(e).replace('max_chars', '--chunk-size').replace('overlap', '--chunk-overlap', 1))
+    if args.incremental and (args.async_pipeline or args.stdout or args.diff or args.sweep or args.queue
+                             or args.chunks or args.compress or args.offset_map or args.dry_run or args.resume):
+        parser.error("--incremental cannot be combined with --async, --stdout, --diff, --sweep, --queue, "
+                     "--chunks, --compress, --offset-map, --dry-run or --resume")
+    if args.final and not args.incremental:
+        parser.error("--final requires --incremental")
+    if args.compress and (args.stdout or args.diff):
+        parser.error("--compress cannot be combined with --stdout or --diff (pipe the output through a compressor)")
+    if args.compress_level is not None and not 1 <= args.compress_level <= 9:
+        parser.error("--compress-level must be between 1 and 9")
+    if args.memory_budget is not None and args.memory_budget <= 0:
+        parser.error("--memory-budget must be positive")
+    if args.max_cpu_seconds is not None and args.max_cpu_seconds <= 0:
+        parser.error("--max-cpu-seconds must be positive")
+    sweep_toggles = []
+    if args.sweep:
+        if args.async_pipeline or args.diff or args.offset_map or args.stdout:
+            parser.error("--sweep cannot be combined with --async, --diff, --offset-map or --stdout")
+        sweep_toggles = (list(DocStripper.SWEEP_TOGGLES) if args.sweep == 'all'
+                         else [name.strip() for name in args.sweep.split(',') if name.strip()])
+        unknown = [name for name in sweep_toggles if name not in DocStripper.SWEEP_TOGGLES]
+        if unknown or not sweep_toggles:
+            parser.error(f"--sweep expects names from: {', '.join(DocStripper.SWEEP_TOGGLES)}")
     
     # Process files
+    lexicon = None
+    if args.lexicon:
+        try:
+            lexicon = Lexicon.load(Path(args.lexicon))
+        except (OSError, UnicodeDecodeError) as e:
+            parser.error(f"could not load --lexicon {args.lexicon}: {e}")
+    
     stripper = DocStripper(
-        dry_run=args.dry_run,
+        dry_run=args.dry_run or bool(args.diff) or bool(args.sweep) or args.chunks,
         merge_lines=not args.no_merge_lines,
         dehyphenate=not args.no_dehyphenate,
         normalize_ws=not args.no_normalize_ws,
         normalize_unicode=not args.no_normalize_unicode,
         remove_headers=not args.keep_headers,
         stdout=args.stdout,
+        diff=args.diff,
+        offset_map=args.offset_map,
+        quiet=args.progress or args.quiet or args.chunks,
+        memory_budget=int(args.memory_budget * 1024 * 1024) if args.memory_budget else None,
+        profile=args.profile,
+        max_cpu_seconds=args.max_cpu_seconds,
+        cpu_cap_action=args.cpu_cap_action,
+        lexicon=lexicon,
+        unicode_nfkc=args.unicode_nfkc,
+        compress=args.compress,
+        compress_level=args.compress_level,
+        chunk_size=args.chunk_size if args.chunks else None,
+        chunk_overlap=args.chunk_overlap,
+        chunk_break=args.chunk_break,
+        incremental=args.incremental,
+        incremental_final=args.final,
     )
+    if sweep_toggles:
+        rows = stripper.sweep([Path(p) for p in args.files], stripper.sweep_combinations(sweep_toggles))
+        stripper.print_sweep(rows, sweep_toggles)
+        sys.exit(0 if rows and rows[0]['files'] else 1)
+    
+    if not stripper.dry_run and not args.stdout and not args.queue and not args.incremental and not args.watch:
+        resumed = stripper.enable_checkpoint(Path(args.checkpoint), resume=args.resume)
+        if resumed:
+            stripper.say(f"Resuming: {resumed} file(s) already cleaned in the interrupted run")
+    elif args.resume:
+        print("Warning: --resume has no effect with --dry-run or --stdout", file=sys.stderr)
     success_count = 0
+    progress = ProgressReporter() if args.progress else None
     
-    for file_pattern in args.files:
-        file_path = Path(file_pattern)
-        
-        if file_path.exists():
-            if stripper.process_file(file_path):
-                success_count += 1
-        else:
-            print(f"Warning: File not found: {file_path}", file=sys.stderr)
+    if args.watch:
+        try:
+            watcher = DirectoryWatcher(Path(args.watch), stripper, interval=args.watch_interval,
+                                       settle=args.settle, workers=args.threads or 1,
+                                       metrics_interval=args.metrics_interval,
+                                       metrics_path=Path(args.metrics_file) if args.metrics_file else None)
+        except ValueError as e:
+            parser.error(str(e))
+        import signal
+        # Finish the batch in progress, then report and exit
+        signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+        stripper.say(f"Watching {watcher.root} (Ctrl-C to stop)")
+        watcher.run()
+        stripper.print_stats()
+        sys.exit(0)
+    elif args.async_pipeline:
+        file_paths = []
+        for file_pattern in args.files:
+            file_path = Path(file_pattern)
+            if file_path.exists():
+                file_paths.append(file_path)
+            else:
+                print(f"Warning: File not found: {file_path}", file=sys.stderr)
+        try:
+            pipeline = AsyncPipeline(stripper,
+                                     queue_size=args.queue_size,
+                                     io_workers=args.io_workers,
+                                     cpu_workers=args.cpu_workers,
+                                     progress=progress)
+        except ValueError as e:
+            parser.error(str(e))
+        if progress is not None:
+            progress.start(file_paths)
+        success_count = pipeline.run(file_paths)
+        if progress is not None:
+            progress.finish()
+        if args.queue_stats:
+            pipeline.print_queue_stats()
+    elif args.queue:
+        try:
+            queue = WorkQueue(Path(args.queue), lease_seconds=args.lease)
+        except ValueError as e:
+            parser.error(str(e))
+        file_paths = []
+        for file_pattern in args.files:
+            file_path = Path(file_pattern)
+            if file_path.exists():
+                file_paths.append(file_path)
+            else:
+                print(f"Warning: File not found: {file_path}", file=sys.stderr)
+        added = queue.add(file_paths)
+        if file_paths:
+            stripper.say(f"Queued {added} file(s) in {args.queue} ({len(file_paths) - added} already queued)")
+        success_count = queue.run(stripper)
+    elif args.threads is not None:
+        file_paths = []
+        for file_pattern in args.files:
+            file_path = Path(file_pattern)
+            if file_path.exists():
+                file_paths.append(file_path)
+            else:
+                print(f"Warning: File not found: {file_path}", file=sys.stderr)
+        if progress is not None:
+            progress.start(file_paths)
+        success_count = ThreadPoolRunner(stripper, workers=args.threads, progress=progress).run(file_paths)
+        if progress is not None:
+            progress.finish()
+    else:
+        file_paths = [Path(file_pattern) for file_pattern in args.files]
+        if progress is not None:
+            progress.start(file_paths)
+        for file_path in file_paths:
+            if str(file_path) == '-' or file_path.exists():
+                ok = stripper.process_file(file_path)
+                if ok:
+                    success_count += 1
+            else:
+                print(f"Warning: File not found: {file_path}", file=sys.stderr)
+                ok = False
+            if progress is not None:
+                progress.advance(file_path, ok)
+        if progress is not None:
+            progress.finish()
     
     # Save log
     stripper.save_log()
     
-    # Print statistics
-    stripper.print_stats()
+    # Print statistics (to stderr when stdout carries chunk records)
+    if args.chunks:
+        import contextlib
+        with contextlib.redirect_stdout(sys.stderr):
+            stripper.print_stats()
+    else:
+        stripper.print_stats()
+    if args.queue:
+        queue.print_report()
+        sys.exit(1 if queue.failure_count else 0)
     
     # Exit with appropriate code
     if success_count == 0: